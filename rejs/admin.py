@@ -2,8 +2,20 @@ from django import forms
 from django.contrib import admin
 from django.contrib.admin import widgets
 from django.http import HttpResponse
-from rejs.reports import generate_rejs_report
-from .models import Ogloszenie, Rejs, Wachta, Wplata, Zgloszenie, Dane_Dodatkowe
+from .miejsca import przelicz_miejsca, uzupelnij_z_listy_rezerwowej
+from .models import (
+	Ogloszenie,
+	PrzelewBankowy,
+	Rejs,
+	Wachta,
+	Wplata,
+	Zgloszenie,
+	Dane_Dodatkowe,
+)
+from .postgres import PelnotekstoweMixin
+from .przypomnienia import MAKS_NOWYCH_W_ADMINIE, wyslij_linki_reszty
+from .wyciagi import zaksieguj
+from .zwroty import odwolaj_rejs
 
 
 @admin.action(description="Generuj raport Excel dla rejsu")
@@ -16,10 +28,56 @@ def generate_report(modeladmin, request, queryset):
 		)
 		return
 
+	# raport (openpyxl) ładowany dopiero przy eksporcie, nie przy starcie procesu
+	from rejs.reports import generate_rejs_report
+
 	rejs = queryset.first()
 	return generate_rejs_report(rejs, request.user)
 
 
+@admin.action(description="Przelicz zajęte miejsca")
+def przelicz_zajete_miejsca(modeladmin, request, queryset):
+	przelicz_miejsca(queryset)
+	modeladmin.message_user(request, "Przeliczono zajęte miejsca.")
+
+
+@admin.action(description="Odwołaj rejs i przygotuj zwroty PayU")
+def odwolaj_rejsy(modeladmin, request, queryset):
+	zwroty = sum(odwolaj_rejs(rejs) for rejs in queryset)
+	modeladmin.message_user(
+		request,
+		f"Odwołano rejsy: {queryset.count()}. Zwroty do zlecenia: {zwroty} "
+		"- zleca je komenda zwroty_payu.",
+	)
+
+
+@admin.action(description="Wyślij linki PayU do dopłaty")
+def wyslij_linki_doplaty(modeladmin, request, queryset):
+	if queryset.count() != 1:
+		modeladmin.message_user(
+			request,
+			"Wybierz dokładnie jeden rejs.",
+			level="error"
+		)
+		return
+
+	rejs = queryset.first()
+	wynik = wyslij_linki_reszty(rejs, limit=MAKS_NOWYCH_W_ADMINIE)
+	modeladmin.message_user(
+		request,
+		f"Wysłane maile: {wynik['maile']}. Nowe zamówienia PayU: {wynik['nowe']}, "
+		f"ponownie wysłane linki: {wynik['ponowione']}, błędy: {wynik['bledy']}.",
+		level="warning" if wynik["bledy"] else "info",
+	)
+	if wynik["pozostalo"]:
+		modeladmin.message_user(
+			request,
+			f"Osoby wciąż bez linku: {wynik['pozostalo']} - uruchom akcję ponownie "
+			f"albo komendę: python manage.py wyslij_linki_doplaty {rejs.pk}",
+			level="warning",
+		)
+
+
 class OgloszenieInline(admin.StackedInline):
 	model = Ogloszenie
 	extra = 0
@@ -79,10 +137,13 @@ class WachtaForm(forms.ModelForm):
 		return instance
 
 
+# osobne strony wacht w panelu - na nie prowadzi show_change_link w WachtaInline
+@admin.register(Wachta)
 class WachtaAdmin(admin.ModelAdmin):
 	form = WachtaForm
 	list_display = ("nazwa", "rejs")
 	list_filter = ("rejs",)
+	list_select_related = ("rejs",)
 
 
 class WachtaInline(admin.TabularInline):
@@ -105,19 +166,54 @@ class ZgloszenieInline(admin.TabularInline):
 	#readonly_fields = ["imie", "nazwisko", "email", "telefon"]
 	show_change_link = True
 
+	def formfield_for_foreignkey(self, db_field, request, **kwargs):
+		if db_field.name == "wachta":
+			kwargs["queryset"] = Wachta.objects.select_related("rejs")
+		field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+		if db_field.name == "wachta":
+			# lista wacht liczona raz na stronę, nie raz na każdy wiersz zgłoszenia
+			if not hasattr(request, "_wybor_wachty"):
+				# bez list(): ten pyta najpierw o COUNT(*)
+				request._wybor_wachty = [wybor for wybor in field.choices]
+			field.choices = request._wybor_wachty
+		return field
+
 
 @admin.register(Rejs)
 class RejsyAdmin(admin.ModelAdmin):
-	list_display = ["nazwa", "od", "do", "start", "koniec"]
-	actions = [generate_report]
+	list_display = [
+		"nazwa",
+		"od",
+		"do",
+		"start",
+		"koniec",
+		"liczba_miejsc",
+		"zajete_miejsca",
+		"odwolany",
+	]
+	readonly_fields = ["zajete_miejsca", "odwolany"]
+	actions = [
+		generate_report,
+		przelicz_zajete_miejsca,
+		odwolaj_rejsy,
+		wyslij_linki_doplaty,
+	]
 	inlines = [ZgloszenieInline, WachtaInline, OgloszenieInline]
 
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		# zwiększony limit - wolne miejsca od razu dla listy rezerwowej
+		if change and "liczba_miejsc" in form.changed_data:
+			uzupelnij_z_listy_rezerwowej(obj.pk)
+
 
 @admin.register(Zgloszenie)
-class ZgloszenieAdmin(admin.ModelAdmin):
+class ZgloszenieAdmin(PelnotekstoweMixin, admin.ModelAdmin):
 	list_display = [field.name for field in Zgloszenie._meta.fields]
 	list_filter = ("rejs",)
+	list_select_related = ("rejs", "wachta__rejs")
 	search_fields = ("imie", "nazwisko")
+	pola_pelnotekstowe = ("imie", "nazwisko")
 	readonly_fields = ("rejs_cena", "do_zaplaty", "suma_wplat")
 	inlines = [WplataInline]
 	fieldsets = (
@@ -142,6 +238,88 @@ class ZgloszenieAdmin(admin.ModelAdmin):
 		),
 	)
 
+	def formfield_for_foreignkey(self, db_field, request, **kwargs):
+		if db_field.name == "wachta":
+			# etykieta wachty zawiera rejs
+			kwargs["queryset"] = Wachta.objects.select_related("rejs")
+		return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+class PowtorzoneDaneFilter(admin.SimpleListFilter):
+	title = "powtórzony PESEL lub dokument"
+	parameter_name = "powtorzone"
+
+	def lookups(self, request, model_admin):
+		return [("tak", "tak")]
+
+	def queryset(self, request, queryset):
+		if self.value() == "tak":
+			return queryset.powtorzone()
+		return queryset
+
+
 @admin.register(Dane_Dodatkowe)
 class Dane_DodatkoweAdmin(admin.ModelAdmin):
-	list_display = ('zgloszenie', 'poz1', 'poz2', 'poz3')
\ No newline at end of file
+	list_display = ('zgloszenie', 'poz1', 'poz2', 'poz3')
+	list_select_related = ("zgloszenie",)
+	list_filter = (PowtorzoneDaneFilter,)
+	# szukanie po dokładnym PESEL-u lub numerze dokumentu
+	# (ślepe indeksy, get_search_results)
+	search_fields = ("zgloszenie__nazwisko",)
+	search_help_text = "Nazwisko albo dokładny PESEL lub numer dokumentu."
+
+	def get_search_results(self, request, queryset, search_term):
+		wyniki, duplikaty = super().get_search_results(request, queryset, search_term)
+		if search_term:
+			wyniki |= queryset.po_peselu(search_term)
+			wyniki |= queryset.po_dokumencie(search_term)
+		return wyniki, duplikaty
+
+
+@admin.action(description="Zaksięguj przypisane przelewy")
+def zaksieguj_przelewy(modeladmin, request, queryset):
+	liczba = zaksieguj(queryset.filter(status=PrzelewBankowy.STATUS_DO_SPRAWDZENIA))
+	modeladmin.message_user(request, f"Zaksięgowane wpłaty: {liczba}.")
+
+
+@admin.action(description="Pomiń (nie dotyczy zgłoszeń)")
+def pomin_przelewy(modeladmin, request, queryset):
+	liczba = queryset.filter(status=PrzelewBankowy.STATUS_DO_SPRAWDZENIA).update(
+		status=PrzelewBankowy.STATUS_POMINIETY
+	)
+	modeladmin.message_user(request, f"Pominięte przelewy: {liczba}.")
+
+
+@admin.register(PrzelewBankowy)
+class PrzelewBankowyAdmin(PelnotekstoweMixin, admin.ModelAdmin):
+	list_display = ("data", "kwota", "nadawca", "tytul", "status", "zgloszenie")
+	list_filter = ("status",)
+	list_select_related = ("zgloszenie",)
+	search_fields = ("tytul", "nadawca")
+	pola_pelnotekstowe = ("tytul", "nadawca")
+	raw_id_fields = ("zgloszenie",)
+	fields = (
+		"id_transakcji",
+		"data",
+		"kwota",
+		"tytul",
+		"nadawca",
+		"status",
+		"wplata",
+		"pasujace_zgloszenia",
+		"zgloszenie",
+	)
+	readonly_fields = fields[:-1]
+	actions = [zaksieguj_przelewy, pomin_przelewy]
+
+	@admin.display(description="pasujące zgłoszenia")
+	def pasujace_zgloszenia(self, obj):
+		zgloszenia = Zgloszenie.objects.filter(pk__in=obj.kandydaci).select_related(
+			"rejs"
+		)
+		return ", ".join(f"{z.pk}: {z} ({z.rejs})" for z in zgloszenia) or "-"
+
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		# przypisane ręcznie zgłoszenie - od razu wpłata
+		if obj.status == PrzelewBankowy.STATUS_DO_SPRAWDZENIA:
+			zaksieguj([obj])
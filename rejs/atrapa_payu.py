@@ -0,0 +1,346 @@
+"""
+Atrapa PayU do testów end-to-end i obciążeniowych (``PAYU_ENV=local``).
+
+Obsługuje to, czego używa ``PayUClient``: token OAuth, założenie zamówienia,
+pobranie zamówienia i zwroty. Zamiast strony płatności jest ``/pay/<orderId>``, skąd
+wynik płatności wybiera się linkiem (albo atrapa opłaca zamówienia sama po
+``auto_zaplata`` sekundach). Zmiana statusu wysyła podpisane powiadomienia na
+``notifyUrl`` - w formacie, który sprawdza ``verify_payu_signature``.
+
+Opóźnienia, odsetek awarii (503) i duplikaty powiadomień pozwalają sprawdzić
+ścieżkę płatności w warunkach gorszych niż sandbox PayU. Tylko do użytku
+lokalnego - serwer nie ma żadnych zabezpieczeń.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+STATUS_NEW = "NEW"
+STATUS_PENDING = "PENDING"
+STATUS_COMPLETED = "COMPLETED"
+STATUS_CANCELED = "CANCELED"
+
+
+def _blad_wartosci(kod):
+	return {"status": {"statusCode": "ERROR_VALUE_INVALID", "codeLiteral": kod}}
+
+
+def podpis(sekret, body):
+	"""Nagłówek OpenPayU-Signature dla treści powiadomienia."""
+	wartosc = hmac.new(sekret.encode(), body, hashlib.sha256).hexdigest()
+	return (
+		f"sender=checkout;signature=sha256={wartosc};"
+		"algorithm=SHA-256;content=DOCUMENT"
+	)
+
+
+class AtrapaPayU:
+	def __init__(
+		self,
+		sekret,
+		opoznienie=0.0,
+		awarie=0.0,
+		duplikaty=0.0,
+		auto_zaplata=None,
+		ziarno=None,
+	):
+		self.sekret = sekret
+		self.opoznienie = opoznienie
+		self.awarie = awarie
+		self.duplikaty = duplikaty
+		self.auto_zaplata = auto_zaplata
+		self.los = random.Random(ziarno)
+		self.zamowienia = {}
+		self.tokeny = set()
+		self.blokada = threading.Lock()
+		self.serwer = None
+		self.adres = ""
+
+	# --- serwer HTTP ---
+
+	def uruchom(self, host="127.0.0.1", port=8001):
+		"""Startuje serwer w wątku w tle i zwraca jego adres."""
+		Obsluga = type("Obsluga", (_Obsluga,), {"atrapa": self})
+		self.serwer = ThreadingHTTPServer((host, port), Obsluga)
+		self.serwer.daemon_threads = True
+		self.adres = f"http://{host}:{self.serwer.server_address[1]}"
+		threading.Thread(target=self.serwer.serve_forever, daemon=True).start()
+		return self.adres
+
+	def zatrzymaj(self):
+		if self.serwer:
+			self.serwer.shutdown()
+			self.serwer.server_close()
+
+	def _czy_awaria(self):
+		with self.blokada:
+			return self.los.random() < self.awarie
+
+	def _czy_duplikat(self):
+		with self.blokada:
+			return self.los.random() < self.duplikaty
+
+	# --- logika PayU ---
+
+	def wydaj_token(self):
+		token = uuid.uuid4().hex
+		with self.blokada:
+			self.tokeny.add(token)
+		return {
+			"access_token": token,
+			"token_type": "bearer",
+			"expires_in": 43199,
+			"grant_type": "client_credentials",
+		}
+
+	def czy_token(self, naglowek):
+		token = (naglowek or "").removeprefix("Bearer ")
+		with self.blokada:
+			return token in self.tokeny
+
+	def utworz_zamowienie(self, dane):
+		order_id = uuid.uuid4().hex[:20].upper()
+		zamowienie = {
+			"orderId": order_id,
+			"status": STATUS_NEW,
+			"notifyUrl": dane.get("notifyUrl"),
+			"continueUrl": dane.get("continueUrl"),
+			"description": dane.get("description", ""),
+			"currencyCode": dane.get("currencyCode", "PLN"),
+			"totalAmount": str(dane.get("totalAmount", 0)),
+			"buyer": dane.get("buyer", {}),
+			"orderCreateDate": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		}
+		with self.blokada:
+			self.zamowienia[order_id] = zamowienie
+		if self.auto_zaplata is not None:
+			threading.Timer(
+				self.auto_zaplata, self.zmien_status, (order_id, STATUS_COMPLETED)
+			).start()
+		return {
+			"status": {"statusCode": "SUCCESS"},
+			"redirectUri": f"{self.adres}/pay/{order_id}",
+			"orderId": order_id,
+		}
+
+	def utworz_zwrot(self, order_id, dane):
+		"""Zwraca (kod HTTP, odpowiedź).
+
+		extRefundId nie może się powtórzyć - jak w PayU.
+		"""
+		dane = dane.get("refund", {})
+		with self.blokada:
+			zamowienie = self.zamowienia.get(order_id)
+			if not zamowienie:
+				return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+			if zamowienie["status"] != STATUS_COMPLETED:
+				return 400, _blad_wartosci("ORDER_NOT_COMPLETED")
+			zwroty = zamowienie.setdefault("refunds", [])
+			if any(z["extRefundId"] == dane.get("extRefundId") for z in zwroty):
+				return 400, _blad_wartosci("DUPLICATED_REFUND")
+			zwrot = {
+				"refundId": uuid.uuid4().hex[:10],
+				"extRefundId": dane.get("extRefundId"),
+				"amount": str(dane.get("amount", zamowienie["totalAmount"])),
+				"currencyCode": zamowienie["currencyCode"],
+				"description": dane.get("description", ""),
+				"status": "PENDING",
+			}
+			zwroty.append(zwrot)
+		return 200, {
+			"orderId": order_id,
+			"refund": zwrot,
+			"status": {"statusCode": "SUCCESS"},
+		}
+
+	def pobierz_zwroty(self, order_id):
+		with self.blokada:
+			zamowienie = self.zamowienia.get(order_id)
+			if not zamowienie:
+				return None
+			return [dict(z) for z in zamowienie.get("refunds", [])]
+
+	def pobierz_zamowienie(self, order_id):
+		with self.blokada:
+			zamowienie = self.zamowienia.get(order_id)
+			return dict(zamowienie) if zamowienie else None
+
+	def zmien_status(self, order_id, status):
+		"""Zmienia status zamówienia i wysyła powiadomienia w tle."""
+		with self.blokada:
+			zamowienie = self.zamowienia.get(order_id)
+			if not zamowienie or zamowienie["status"] in (
+				STATUS_COMPLETED, STATUS_CANCELED
+			):
+				return False
+			if zamowienie["status"] == STATUS_NEW:
+				statusy = [STATUS_PENDING, status]
+			else:
+				statusy = [status]
+			zamowienie["status"] = status
+		threading.Thread(
+			target=self._powiadom, args=(order_id, statusy), daemon=True
+		).start()
+		return True
+
+	def powiadomienie(self, order_id, status):
+		"""Treść i nagłówki powiadomienia, tak jak wysyła je PayU."""
+		zamowienie = self.pobierz_zamowienie(order_id)
+		zamowienie["status"] = status
+		for pole in ("notifyUrl", "continueUrl", "refunds"):
+			zamowienie.pop(pole, None)
+		body = json.dumps({"order": zamowienie, "localReceiptDateTime": None}).encode()
+		return body, {
+			"Content-Type": "application/json",
+			"OpenPayU-Signature": podpis(self.sekret, body),
+		}
+
+	def _powiadom(self, order_id, statusy):
+		url = self.pobierz_zamowienie(order_id)["notifyUrl"]
+		if not url:
+			return
+		for status in statusy:
+			body, naglowki = self.powiadomienie(order_id, status)
+			for _ in range(2 if self._czy_duplikat() else 1):
+				# PayU ponawia powiadomienie, dopóki nie dostanie 200
+				for proba in range(5):
+					try:
+						r = requests.post(url, data=body, headers=naglowki, timeout=5)
+						if r.status_code == 200:
+							break
+					except requests.RequestException as e:
+						logger.warning(
+							"Atrapa PayU: powiadomienie %s nieudane: %s", order_id, e
+						)
+					time.sleep(0.5 * 2 ** proba)
+
+
+class _Obsluga(BaseHTTPRequestHandler):
+	atrapa = None
+
+	def log_message(self, format, *args):
+		logger.debug("Atrapa PayU: " + format, *args)
+
+	def _odpowiedz(self, status, dane=None, naglowki=None):
+		body = json.dumps(dane).encode() if dane is not None else b""
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		for nazwa, wartosc in (naglowki or {}).items():
+			self.send_header(nazwa, wartosc)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _html(self, tresc):
+		body = tresc.encode()
+		self.send_response(200)
+		self.send_header("Content-Type", "text/html; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _tresc(self):
+		return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+	def _przygotuj(self):
+		"""Opóźnienie i losowa awaria. Zwraca False, gdy odpowiedziano błędem."""
+		if self.atrapa.opoznienie:
+			time.sleep(self.atrapa.opoznienie)
+		if self.atrapa.awarie and self._api() and self.atrapa._czy_awaria():
+			self._odpowiedz(503, {"status": {"statusCode": "SERVICE_NOT_AVAILABLE"}})
+			return False
+		return True
+
+	def _api(self):
+		return not self.path.startswith("/pay/")
+
+	def do_POST(self):
+		tresc = self._tresc()
+		if not self._przygotuj():
+			return
+		sciezka = urlparse(self.path).path
+
+		if sciezka == "/pl/standard/user/oauth/authorize":
+			self._odpowiedz(200, self.atrapa.wydaj_token())
+		elif sciezka == "/api/v2_1/orders":
+			if not self.atrapa.czy_token(self.headers.get("Authorization")):
+				self._odpowiedz(401, {"error": "invalid_token"})
+				return
+			wynik = self.atrapa.utworz_zamowienie(json.loads(tresc or b"{}"))
+			# jak PayU: 302 z adresem płatności i JSON-em w treści
+			self._odpowiedz(302, wynik, {"Location": wynik["redirectUri"]})
+		elif sciezka.startswith("/api/v2_1/orders/") and sciezka.endswith("/refunds"):
+			if not self.atrapa.czy_token(self.headers.get("Authorization")):
+				self._odpowiedz(401, {"error": "invalid_token"})
+				return
+			order_id = sciezka.split("/")[4]
+			dane = json.loads(tresc or b"{}")
+			self._odpowiedz(*self.atrapa.utworz_zwrot(order_id, dane))
+		else:
+			self._odpowiedz(404, {"status": {"statusCode": "DATA_NOT_FOUND"}})
+
+	def do_GET(self):
+		if not self._przygotuj():
+			return
+		adres = urlparse(self.path)
+		czesci = adres.path.strip("/").split("/")
+
+		if adres.path.startswith("/api/v2_1/orders/") and len(czesci) == 4:
+			if not self.atrapa.czy_token(self.headers.get("Authorization")):
+				self._odpowiedz(401, {"error": "invalid_token"})
+				return
+			zamowienie = self.atrapa.pobierz_zamowienie(czesci[3])
+			if not zamowienie:
+				self._odpowiedz(404, {"status": {"statusCode": "DATA_NOT_FOUND"}})
+				return
+			for pole in ("notifyUrl", "continueUrl", "refunds"):
+				zamowienie.pop(pole, None)
+			self._odpowiedz(
+				200, {"orders": [zamowienie], "status": {"statusCode": "SUCCESS"}}
+			)
+		elif (
+			adres.path.startswith("/api/v2_1/orders/")
+			and len(czesci) == 5
+			and czesci[4] == "refunds"
+		):
+			if not self.atrapa.czy_token(self.headers.get("Authorization")):
+				self._odpowiedz(401, {"error": "invalid_token"})
+				return
+			zwroty = self.atrapa.pobierz_zwroty(czesci[3])
+			if zwroty is None:
+				self._odpowiedz(404, {"status": {"statusCode": "DATA_NOT_FOUND"}})
+				return
+			self._odpowiedz(200, {"refunds": zwroty})
+		elif czesci[0] == "pay" and len(czesci) == 2:
+			wynik = parse_qs(adres.query).get("wynik", [""])[0]
+			self._strona_platnosci(czesci[1], wynik)
+		else:
+			self._odpowiedz(404, {"status": {"statusCode": "DATA_NOT_FOUND"}})
+
+	def _strona_platnosci(self, order_id, wynik):
+		zamowienie = self.atrapa.pobierz_zamowienie(order_id)
+		if not zamowienie:
+			self._odpowiedz(404, {"status": {"statusCode": "DATA_NOT_FOUND"}})
+			return
+		if wynik in (STATUS_COMPLETED, STATUS_CANCELED):
+			self.atrapa.zmien_status(order_id, wynik)
+			self._odpowiedz(302, None, {"Location": zamowienie["continueUrl"]})
+			return
+		kwota = int(zamowienie["totalAmount"]) / 100
+		self._html(
+			f"<h1>Atrapa PayU</h1><p>{zamowienie['description']}: {kwota:.2f} PLN</p>"
+			f'<p><a href="?wynik={STATUS_COMPLETED}">Zapłać</a> | '
+			f'<a href="?wynik={STATUS_CANCELED}">Anuluj</a></p>'
+		)
@@ -0,0 +1,50 @@
+"""
+Ponawianie zapisów przerwanych blokadą bazy.
+
+SQLite pozwala na jednego piszącego naraz. Profil produkcyjny
+(``SQLITE_PRODUCTION``) każe transakcji czekać na blokadę do busy_timeout;
+gdy i to nie wystarczy, ``ponawiaj_przy_blokadzie`` powtarza całą operację
+z rosnącą, losowaną przerwą zamiast zwracać użytkownikowi błąd 500.
+"""
+
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+
+def blokada_bazy(blad):
+	return isinstance(blad, OperationalError) and "locked" in str(blad)
+
+
+def ponawiaj_przy_blokadzie(funkcja=None, *, proby=None, pauza=0.05):
+	"""
+	Dekorator: powtarza funkcję po błędzie "database is locked".
+
+	Tylko poza transakcją - wewnątrz ``atomic`` transakcja jest już wycofana
+	i powtórzyć trzeba ją całą, więc błąd idzie wyżej. ``proby`` domyślnie
+	z ``DB_LOCK_RETRIES``.
+	"""
+	if funkcja is None:
+		return functools.partial(ponawiaj_przy_blokadzie, proby=proby, pauza=pauza)
+
+	@functools.wraps(funkcja)
+	def opakowana(*args, **kwargs):
+		limit = settings.DB_LOCK_RETRIES if proby is None else proby
+		proba = 0
+		while True:
+			try:
+				return funkcja(*args, **kwargs)
+			except OperationalError as blad:
+				if (
+					not blokada_bazy(blad)
+					or proba >= limit
+					or transaction.get_connection().in_atomic_block
+				):
+					raise
+			time.sleep(pauza * 2 ** proba * random.uniform(0.5, 1.5))
+			proba += 1
+
+	return opakowana
@@ -1,6 +1,8 @@
 from django import forms
 from django.core.validators import RegexValidator
+from django.db import IntegrityError, transaction
 
+from .miejsca import zajmij_miejsce
 from .models import Zgloszenie, Dane_Dodatkowe
 
 telefon_validator = RegexValidator(
@@ -15,6 +17,8 @@ kod_pocztowy_validator = RegexValidator(
 
 
 class ZgloszenieForm(forms.ModelForm):
+	BLAD_DUPLIKATU = "Na ten rejs istnieje już zgłoszenie dla tej osoby."
+
 	class Meta:
 		model = Zgloszenie
 		fields = ["imie", "nazwisko", "plec", "email", "telefon", "data_urodzenia", "adres", "kod_pocztowy", "miejscowosc", "wzrok", "obecnosc", "rozmiar_koszulki", "uwagi", "rodo"]
@@ -153,20 +157,43 @@ class ZgloszenieForm(forms.ModelForm):
 		rejs = self.initial.get("rejs") or self.instance.rejs
 
 		if rejs:
-			istnieje = Zgloszenie.objects.filter(
-				rejs=rejs,
-				imie__iexact=imie,
-				nazwisko__iexact=nazwisko,
-				email__iexact=email,
+			istnieje = Zgloszenie.objects.duplikaty(
+				rejs, imie, nazwisko, email
 			).exists()
 
 			if istnieje:
-				raise forms.ValidationError(
-					"Na ten rejs istnieje już zgłoszenie dla tej osoby."
-				)
+				raise forms.ValidationError(self.BLAD_DUPLIKATU)
 
 		return cleaned
 
+	def zapisz(self, rejs, token=None):
+		"""
+		Zapisuje zgłoszenie na rejs, zajmując miejsce albo wpisując na listę rezerwową.
+
+		Zwraca zgłoszenie lub None, gdy równoległe zgłoszenie tej samej osoby
+		zostało zapisane pierwsze - wtedy błąd trafia do formularza.
+		"""
+		zgl = self.save(commit=False)
+		zgl.rejs = rejs
+		if token is not None:
+			zgl.token = token
+		try:
+			with transaction.atomic():
+				if zajmij_miejsce(rejs.id):
+					zgl._miejsce_przydzielone = True
+				else:
+					zgl.status = Zgloszenie.STATUS_REZERWOWA
+				zgl.save()
+		except IntegrityError:
+			# równoległe zgłoszenie tej samej osoby przeszło clean() przed nami
+			if not Zgloszenie.objects.duplikaty(
+				rejs, zgl.imie, zgl.nazwisko, zgl.email
+			).exists():
+				raise
+			self.add_error(None, self.BLAD_DUPLIKATU)
+			return None
+		return zgl
+
 	def clean_telefon(self):
 		telefon = self.cleaned_data.get("telefon", "")
 		cleaned = (
@@ -275,3 +302,24 @@ class Dane_DodatkoweForm(forms.ModelForm):
 				field.widget.attrs["aria-invalid"] = "true"
 			if describedby:
 				field.widget.attrs["aria-describedby"] = " ".join(describedby)
+
+	def clean(self):
+		cleaned = super().clean()
+		zgloszenie_id = self.instance.zgloszenie_id
+		if zgloszenie_id is None:
+			return cleaned
+
+		# ten sam PESEL lub dokument w innym zgłoszeniu na ten rejs -
+		# szukane po ślepym indeksie
+		inne = Dane_Dodatkowe.objects.filter(
+			zgloszenie__rejs_id=self.instance.zgloszenie.rejs_id
+		).exclude(zgloszenie_id=zgloszenie_id)
+		if cleaned.get("poz1") and inne.po_peselu(cleaned["poz1"]).exists():
+			self.add_error(
+				"poz1", "Ten PESEL podano już w innym zgłoszeniu na ten rejs."
+			)
+		if cleaned.get("poz3") and inne.po_dokumencie(cleaned["poz3"]).exists():
+			self.add_error(
+				"poz3", "Ten numer dokumentu podano już w innym zgłoszeniu na ten rejs."
+			)
+		return cleaned
@@ -0,0 +1,214 @@
+"""
+Syntetyczne dane do pomiarów wydajności (komendy generuj_dane i benchmark).
+
+``generuj`` zakłada rejsy z wachtami i ogłoszeniami, a w nich zgłoszenia
+z wpłatami, zamówieniami PayU i zaszyfrowanymi danymi dodatkowymi - w takich
+proporcjach, jakie widać na produkcji. Wszystko idzie przez ``bulk_create``
+partiami, z pominięciem sygnałów, więc wpisy kanału zmian dopisuje
+``zapisz_zmiany``, a liczniki miejsc ``przelicz_miejsca``.
+
+To samo ziarno daje te same dane (poza znacznikami czasu ``auto_now_add``).
+Tokeny zgłoszeń i numery zamówień też pochodzą z ziarna, więc drugi przebieg
+z tym samym ziarnem na tej samej bazie skończy się błędem unikalności.
+"""
+
+import random
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from .miejsca import przelicz_miejsca
+from .models import (
+	Dane_Dodatkowe,
+	Ogloszenie,
+	PlatnoscPayU,
+	Rejs,
+	Wachta,
+	Wplata,
+	Zgloszenie,
+	indeks_slepy,
+)
+from .zmiany import zapisz_zmiany
+
+IMIONA = [
+	"Anna", "Maria", "Katarzyna", "Zofia", "Jan",
+	"Piotr", "Tomasz", "Paweł", "Marek", "Ewa",
+]
+NAZWISKA = [
+	"Nowak", "Kowalski", "Wiśniewski", "Wójcik", "Kowalczyk",
+	"Kamiński", "Lewandowski", "Zieliński", "Szymański", "Woźniak",
+]
+MIASTA = [
+	"Gdańsk", "Gdynia", "Sopot", "Warszawa", "Kraków",
+	"Poznań", "Wrocław", "Łódź", "Szczecin",
+]
+PORTY = ["Gdynia", "Gdańsk", "Świnoujście", "Kołobrzeg", "Sztokholm", "Kopenhaga"]
+WACHTY = ["Dziobowa", "Rufowa", "Kambuzowa"]
+# rozkład statusów zgłoszeń
+STATUSY = [
+	(Zgloszenie.STATUS_ZAKWALIFIKOWANY, 60),
+	(Zgloszenie.STATUS_NIEZAKWALIFIKOWANY, 25),
+	(Zgloszenie.STATUS_REZERWOWA, 10),
+	(Zgloszenie.STATUS_ODRZUCONE, 5),
+]
+
+
+def _token(los):
+	return uuid.UUID(int=los.getrandbits(128), version=4)
+
+
+def _zgloszenie(los, rejs, wachty, nr):
+	token = _token(los)
+	status = los.choices([s for s, _ in STATUSY], [w for _, w in STATUSY])[0]
+	return Zgloszenie(
+		imie=los.choice(IMIONA),
+		nazwisko=los.choice(NAZWISKA),
+		email=f"uczestnik{nr}-{token.hex[:8]}@example.com",
+		telefon=f"{los.randrange(500000000, 800000000)}",
+		data_urodzenia=date(1950, 1, 1) + timedelta(days=los.randrange(365 * 55)),
+		plec=los.choice(Zgloszenie.plec_pola)[0],
+		adres=f"ul. Morska {los.randrange(1, 200)}",
+		kod_pocztowy=f"{los.randrange(10, 99)}-{los.randrange(100, 999)}",
+		miejscowosc=los.choice(MIASTA),
+		obecnosc=los.choice(Zgloszenie.obecnosc_pola)[0],
+		rodo=True,
+		status=status,
+		wzrok=los.choice(Zgloszenie.wzrok_statusy)[0],
+		rejs=rejs,
+		wachta=(
+			los.choice(wachty)
+			if status == Zgloszenie.STATUS_ZAKWALIFIKOWANY
+			else None
+		),
+		token=token,
+	)
+
+
+def _dane_dodatkowe(los, zgl):
+	pesel = f"{los.randrange(10**10, 10**11)}"
+	seria = los.choice("ABCDEFGH") + los.choice("ABCDEFGH")
+	dokument = f"{seria}{los.randrange(10**6, 10**7)}"
+	return Dane_Dodatkowe(
+		zgloszenie=zgl,
+		poz1=pesel,
+		poz2=los.choice(Dane_Dodatkowe.typ_dokumentu)[0],
+		poz3=dokument,
+		pos4=los.choice(MIASTA),
+		pos5="polskie",
+		pos6=localdate() + timedelta(days=los.randrange(30, 3650)),
+		# bulk_create omija save(), który liczy ślepe indeksy
+		poz1_indeks=indeks_slepy("pesel", pesel),
+		poz3_indeks=indeks_slepy("dokument", dokument),
+	)
+
+
+def _rozliczenie(los, zgl, rejs):
+	"""
+	Wpłaty i zamówienia PayU zakwalifikowanego: zaliczka zawsze, potem
+	pełna dopłata, otwarte zamówienie PayU na dopłatę albo nic.
+	"""
+	wplaty, platnosci = [], []
+	zaliczka = f"{zgl.token.hex[:24]}Z"
+	if los.random() < 0.5:
+		platnosci.append(PlatnoscPayU(
+			zgloszenie=zgl,
+			typ="zaliczka",
+			kwota=rejs.zaliczka,
+			payu_order_id=zaliczka,
+			status=PlatnoscPayU.STATUS_COMPLETED,
+		))
+		wplaty.append(Wplata(
+			zgloszenie=zgl, kwota=rejs.zaliczka, rodzaj=Wplata.RODZAJ_PAYU,
+			zrodlo_id=zaliczka, opis="PayU – zaliczka",
+		))
+	else:
+		wplaty.append(Wplata(zgloszenie=zgl, kwota=rejs.zaliczka, rodzaj="wplata"))
+
+	los_reszty = los.random()
+	if los_reszty < 0.4:
+		wplaty.append(
+			Wplata(zgloszenie=zgl, kwota=rejs.cena - rejs.zaliczka, rodzaj="wplata")
+		)
+		if los.random() < 0.05:
+			wplaty.append(Wplata(zgloszenie=zgl, kwota=Decimal("100"), rodzaj="zwrot"))
+	elif los_reszty < 0.7:
+		platnosci.append(PlatnoscPayU(
+			zgloszenie=zgl,
+			typ="reszta",
+			kwota=rejs.cena - rejs.zaliczka,
+			payu_order_id=f"{zgl.token.hex[:24]}R",
+			redirect_uri=f"https://example.com/payu/{zgl.token.hex}",
+			status=PlatnoscPayU.STATUS_PENDING,
+		))
+	return wplaty, platnosci
+
+
+def generuj(rejsy=10, zgloszenia=100, ziarno=0, partia=2000):
+	"""
+	Zakłada ``rejsy`` rejsów po ``zgloszenia`` zgłoszeń. Zwraca Counter
+	z liczbą wierszy na model.
+	"""
+	los = random.Random(ziarno)
+	wynik = Counter()
+	dzis = localdate()
+	with transaction.atomic():
+		nowe_rejsy = Rejs.objects.bulk_create([
+			Rejs(
+				nazwa=f"Rejs {ziarno}-{nr + 1}",
+				od=dzis + timedelta(days=30 + 14 * nr),
+				do=dzis + timedelta(days=37 + 14 * nr),
+				start=los.choice(PORTY),
+				koniec=los.choice(PORTY),
+				cena=Decimal(los.choice([1500, 1800, 2200, 2600])),
+				zaliczka=Decimal(500),
+			)
+			for nr in range(rejsy)
+		])
+		wynik["rejs"] = len(nowe_rejsy)
+
+		for rejs in nowe_rejsy:
+			wachty = Wachta.objects.bulk_create(
+				[Wachta(rejs=rejs, nazwa=n) for n in WACHTY]
+			)
+			zapisz_zmiany(Wachta, [w.pk for w in wachty])
+			wynik["wachta"] += len(wachty)
+			wynik["ogloszenie"] += len(Ogloszenie.objects.bulk_create([
+				Ogloszenie(
+					rejs=rejs,
+					tytul=f"Informacja {nr + 1}",
+					text="Zbiórka w porcie o 9:00.",
+				)
+				for nr in range(2)
+			]))
+
+			for start in range(0, zgloszenia, partia):
+				nowe = Zgloszenie.objects.bulk_create([
+					_zgloszenie(los, rejs, wachty, nr)
+					for nr in range(start, min(start + partia, zgloszenia))
+				])
+				zakwalifikowane = [
+					z for z in nowe if z.status == Zgloszenie.STATUS_ZAKWALIFIKOWANY
+				]
+				dane = [_dane_dodatkowe(los, z) for z in zakwalifikowane]
+				wplaty, platnosci = [], []
+				for zgl in zakwalifikowane:
+					w, p = _rozliczenie(los, zgl, rejs)
+					wplaty += w
+					platnosci += p
+
+				Dane_Dodatkowe.objects.bulk_create(dane, batch_size=partia)
+				Wplata.objects.bulk_create(wplaty, batch_size=partia)
+				PlatnoscPayU.objects.bulk_create(platnosci, batch_size=partia)
+				for model, obiekty in (
+					(Zgloszenie, nowe), (Wplata, wplaty), (PlatnoscPayU, platnosci)
+				):
+					zapisz_zmiany(model, [o.pk for o in obiekty])
+					wynik[model._meta.model_name] += len(obiekty)
+				wynik["dane_dodatkowe"] += len(dane)
+
+		przelicz_miejsca(Rejs.objects.filter(pk__in=[r.pk for r in nowe_rejsy]))
+	return wynik
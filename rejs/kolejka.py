@@ -0,0 +1,243 @@
+"""
+Kolejka zgłoszeń na czas otwarcia popularnej rekrutacji (``Rejs.tryb_kolejki``).
+
+W trybie kolejki formularz tylko waliduje dane i zapisuje je jako plik JSON
+w katalogu ``SURGE_QUEUE_DIR`` - bez zapisu do bazy, więc równoległe
+zgłoszenia nie walczą o blokadę zapisu SQLite. Komenda ``przetworz_kolejke``
+zamienia pliki na zgłoszenia partiami, każdą partię w jednej transakcji.
+
+Katalogi kolejki (plik zawsze ``<token>.json``, więc ``stan`` sprawdza
+istnienie trzech plików zamiast listować katalogi):
+  nowe/       - przyjęte zgłoszenia; kolejność przyjęcia to czas modyfikacji
+  w_toku/     - pliki zajęte przez proces przetwarzający (os.replace jest
+                atomowe, więc dwa procesy nie wezmą tego samego pliku); czas
+                zajęcia to czas dostępu, czas modyfikacji zostaje bez zmian
+  odrzucone/  - zgłoszenia, których nie dało się zapisać, z powodem
+                (i błędem, gdy zapis przerwał nieoczekiwany wyjątek)
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .baza import blokada_bazy, ponawiaj_przy_blokadzie
+from .forms import ZgloszenieForm
+from .models import Rejs, Zgloszenie
+
+logger = logging.getLogger(__name__)
+
+NOWE = "nowe"
+W_TOKU = "w_toku"
+ODRZUCONE = "odrzucone"
+
+POWOD_BLEDU = (
+	"Nie udało się zapisać zgłoszenia. Spróbuj ponownie "
+	"albo skontaktuj się z organizatorem."
+)
+
+
+def _katalog(nazwa):
+	katalog = Path(settings.SURGE_QUEUE_DIR) / nazwa
+	katalog.mkdir(parents=True, exist_ok=True)
+	return katalog
+
+
+def _zapisz_atomowo(sciezka, dane):
+	tmp = sciezka.with_name(f".{sciezka.name}.tmp")
+	with open(tmp, "w", encoding="utf-8") as f:
+		json.dump(dane, f, ensure_ascii=False)
+		f.flush()
+		os.fsync(f.fileno())
+	# dokładny czas przyjęcia - znacznik z systemu plików bywa zgrubny (jiffy)
+	teraz = time.time_ns()
+	os.utime(tmp, ns=(teraz, teraz))
+	os.replace(tmp, sciezka)
+
+
+def dodaj(rejs, form):
+	"""Dopisuje zwalidowane zgłoszenie do kolejki i zwraca jego token."""
+	token = uuid.uuid4()
+	wpis = {
+		"token": str(token),
+		"rejs_id": rejs.id,
+		"dane": {nazwa: form.data.get(nazwa) for nazwa in form.fields},
+		"przyjeto": timezone.now().isoformat(),
+	}
+	_zapisz_atomowo(_katalog(NOWE) / f"{token}.json", wpis)
+	return token
+
+
+def stan(token):
+	"""Stan zgłoszenia, którego nie ma jeszcze w bazie.
+
+	None, gdy nie ma go w kolejce.
+	"""
+	nazwa = f"{token}.json"
+	for katalog in (NOWE, W_TOKU):
+		if (_katalog(katalog) / nazwa).exists():
+			return {"token": token, "odrzucone": False}
+	try:
+		wpis = json.loads((_katalog(ODRZUCONE) / nazwa).read_text(encoding="utf-8"))
+	except FileNotFoundError:
+		return None
+	return {"token": token, "odrzucone": True, "powod": wpis.get("powod", "")}
+
+
+def dlugosc():
+	return sum(1 for _ in _katalog(NOWE).glob("*.json"))
+
+
+def przywroc_porzucone(starsze_niz=600):
+	"""Oddaje do kolejki pliki zajęte przez proces, który nie dokończył pracy."""
+	granica = time.time() - starsze_niz
+	przywrocone = 0
+	for plik in _katalog(W_TOKU).glob("*.json"):
+		try:
+			if plik.stat().st_atime < granica:
+				os.replace(plik, _katalog(NOWE) / plik.name)
+				przywrocone += 1
+		except FileNotFoundError:
+			continue
+	return przywrocone
+
+
+def _w_kolejnosci(katalog):
+	"""Pliki zgłoszeń z ``katalog`` w kolejności przyjęcia, z czasem modyfikacji."""
+	pliki = []
+	with os.scandir(katalog) as wpisy:
+		for wpis in wpisy:
+			if not wpis.name.endswith(".json"):
+				continue
+			try:
+				pliki.append((wpis.stat().st_mtime_ns, wpis.name))
+			except FileNotFoundError:
+				continue
+	return [(katalog / nazwa, mtime) for mtime, nazwa in sorted(pliki)]
+
+
+def _zajmij(limit):
+	zajete = []
+	w_toku = _katalog(W_TOKU)
+	for plik, mtime in _w_kolejnosci(_katalog(NOWE)):
+		cel = w_toku / plik.name
+		try:
+			os.replace(plik, cel)
+		except FileNotFoundError:
+			# wziął go inny proces
+			continue
+		# czas zajęcia dla przywroc_porzucone; mtime zostaje - oddany plik
+		# wraca na swoje miejsce w kolejce
+		os.utime(cel, ns=(time.time_ns(), mtime))
+		zajete.append(cel)
+		if len(zajete) >= limit:
+			break
+	return zajete
+
+
+def _oddaj(pliki):
+	"""Oddaje zajęte pliki z powrotem do kolejki."""
+	for plik in pliki:
+		try:
+			os.replace(plik, _katalog(NOWE) / plik.name)
+		except FileNotFoundError:
+			continue
+
+
+def _zapisz_wpis(wpis, rejsy):
+	"""Zapisuje jedno zgłoszenie. Zwraca powód odrzucenia albo None."""
+	token = uuid.UUID(wpis["token"])
+
+	# plik mógł zostać przywrócony po awarii już po zapisie do bazy
+	if Zgloszenie.objects.filter(token=token).exists():
+		return None
+
+	if wpis["rejs_id"] not in rejsy:
+		rejsy[wpis["rejs_id"]] = Rejs.objects.filter(pk=wpis["rejs_id"]).first()
+	rejs = rejsy[wpis["rejs_id"]]
+	if rejs is None:
+		return "Rejs został usunięty."
+
+	form = ZgloszenieForm(wpis["dane"], initial={"rejs": rejs})
+	if form.is_valid() and form.zapisz(rejs, token=token) is not None:
+		return None
+	return " ".join(str(blad) for bledy in form.errors.values() for blad in bledy)
+
+
+@ponawiaj_przy_blokadzie
+def _zapisz_partie(pliki):
+	"""
+	Zapisuje partię w jednej transakcji, każdy wpis w osobnym punkcie zapisu.
+
+	Wpis, na którym poleci nieoczekiwany błąd, jest wycofany i odrzucony,
+	a reszta partii idzie dalej. Blokada bazy wycofuje całą partię -
+	ponawia ją dekorator.
+	"""
+	gotowe = []
+	odrzucone = []
+	rejsy = {}
+	with transaction.atomic():
+		for plik in pliki:
+			tekst = plik.read_text(encoding="utf-8", errors="replace")
+			try:
+				wpis = json.loads(tekst)
+			except ValueError as blad:
+				odrzucone.append((plik, {"tresc": tekst}, POWOD_BLEDU, repr(blad)))
+				continue
+			if not isinstance(wpis, dict):
+				wpis = {"tresc": wpis}
+
+			try:
+				with transaction.atomic():
+					powod = _zapisz_wpis(wpis, rejsy)
+			except Exception as blad:
+				if blokada_bazy(blad):
+					raise
+				logger.exception("Błąd zapisu zgłoszenia z kolejki %s", plik.name)
+				odrzucone.append((plik, wpis, POWOD_BLEDU, repr(blad)))
+				continue
+			if powod is None:
+				gotowe.append(plik)
+			else:
+				odrzucone.append((plik, wpis, powod, ""))
+	return gotowe, odrzucone
+
+
+def przetworz(rozmiar_partii=100):
+	"""
+	Zapisuje do bazy jedną partię zgłoszeń z kolejki, w kolejności przyjęcia.
+
+	Zwraca krotkę (zapisane, odrzucone). Dane są walidowane ponownie tym samym
+	formularzem, więc duplikaty z tej samej partii też zostaną wychwycone.
+	Gdy baza jest zablokowana dłużej niż pozwalają ponowienia, pliki wracają
+	do kolejki, a błąd idzie wyżej.
+	"""
+	pliki = _zajmij(rozmiar_partii)
+	if not pliki:
+		return 0, 0
+
+	try:
+		gotowe, odrzucone = _zapisz_partie(pliki)
+	except Exception:
+		_oddaj(pliki)
+		raise
+
+	# dopiero po zatwierdzeniu transakcji - przy błędzie pliki zostają w w_toku
+	for plik in gotowe:
+		plik.unlink(missing_ok=True)
+	for plik, wpis, powod, blad in odrzucone:
+		token = wpis.get("token", plik.name)
+		logger.warning("Odrzucono zgłoszenie z kolejki %s: %s", token, blad or powod)
+		wpis["powod"] = powod
+		if blad:
+			wpis["blad"] = blad
+		_zapisz_atomowo(_katalog(ODRZUCONE) / plik.name, wpis)
+		plik.unlink(missing_ok=True)
+
+	return len(gotowe), len(odrzucone)
@@ -0,0 +1,86 @@
+"""
+Limity zapytań dla publicznych adresów (token bucket w cache Django).
+
+Limity ustawia się w ``settings.RATE_LIMITS`` dla nazw URL-i, osobno na
+adres IP i na token zgłoszenia::
+
+	RATE_LIMITS = {
+		"zaplac": {"ip": (10, 60), "token": (5, 300)},
+	}
+
+(10, 60) oznacza kubełek na 10 żetonów, uzupełniany w tempie 10 na 60 sekund.
+Middleware działa po rozpoznaniu URL-a, a przed widokiem, więc odrzucone
+zapytanie nie dotyka bazy ani PayU.
+
+Odczyt i zapis kubełka nie są atomowe - przy wielu procesach limit jest
+przybliżony, co wystarcza do zatrzymania bota. Przy kilku procesach
+potrzebny jest wspólny cache (CACHE_BACKEND), inaczej każdy liczy osobno.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def pobierz_zeton(klucz, pojemnosc, okres):
+	"""Pobiera żeton z kubełka. Zwraca 0 albo liczbę sekund do następnego żetonu."""
+	teraz = time.time()
+	tempo = pojemnosc / okres
+	stan = cache.get(klucz)
+	if stan is None:
+		zetony, ostatnio = pojemnosc, teraz
+	else:
+		zetony, ostatnio = stan
+	zetony = min(pojemnosc, zetony + (teraz - ostatnio) * tempo)
+
+	if zetony < 1:
+		return (1 - zetony) / tempo
+
+	cache.set(klucz, (zetony - 1, teraz), timeout=math.ceil(okres) + 1)
+	return 0
+
+
+def adres_ip(request):
+	naglowek = getattr(settings, "RATE_LIMIT_IP_HEADER", "")
+	if naglowek and request.META.get(naglowek):
+		# ostatni wpis dopisało nasze proxy, wcześniejsze mógł podać klient
+		return request.META[naglowek].split(",")[-1].strip()
+	return request.META.get("REMOTE_ADDR", "")
+
+
+class LimitZapytanMiddleware:
+	def __init__(self, get_response):
+		self.get_response = get_response
+
+	def __call__(self, request):
+		return self.get_response(request)
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		dopasowanie = request.resolver_match
+		limity = getattr(settings, "RATE_LIMITS", {}).get(
+			dopasowanie.url_name if dopasowanie else None
+		)
+		if not limity:
+			return None
+
+		klucze = {"ip": adres_ip(request)}
+		if view_kwargs.get("token"):
+			klucze["token"] = str(view_kwargs["token"])
+
+		for rodzaj, (pojemnosc, okres) in limity.items():
+			if rodzaj not in klucze:
+				continue
+			klucz = f"limit:{dopasowanie.url_name}:{rodzaj}:{klucze[rodzaj]}"
+			czekaj = pobierz_zeton(klucz, pojemnosc, okres)
+			if czekaj:
+				response = HttpResponse(
+					"Zbyt wiele zapytań. Spróbuj ponownie za chwilę.",
+					status=429,
+					content_type="text/plain; charset=utf-8",
+				)
+				response["Retry-After"] = str(math.ceil(czekaj))
+				return response
+		return None
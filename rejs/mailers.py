@@ -1,7 +1,7 @@
 import logging
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 
 logger = logging.getLogger(__name__)
@@ -9,10 +9,10 @@ logger = logging.getLogger(__name__)
 FROM = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@zobaczyc.morze")
 
 
-def send_simple_mail(subject, to_mail, template_base, context):
+def build_simple_mail(subject, to_mail, template_base, context):
     """
-    Wysyła emaila w formacie HTML i TXT jako fallback.
-    Wymaga template_base.html i/lub template_base.txt
+    Buduje emaila w formacie HTML i TXT jako fallback, bez wysyłania.
+    Zwraca None, gdy brak obu szablonów.
     """
     txt_content = None
     html_content = None
@@ -31,9 +31,7 @@ def send_simple_mail(subject, to_mail, template_base, context):
         logger.error(
             "Brak szablonów email dla %s - email nie zostanie wysłany", template_base
         )
-        return
-
-    logger.debug("Wysyłanie emaila do %s: %s", to_mail, subject)
+        return None
 
     email = EmailMultiAlternatives(
         subject=subject,
@@ -43,6 +41,19 @@ def send_simple_mail(subject, to_mail, template_base, context):
     )
     if html_content:
         email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def send_simple_mail(subject, to_mail, template_base, context):
+    """
+    Wysyła emaila w formacie HTML i TXT jako fallback.
+    Wymaga template_base.html i/lub template_base.txt
+    """
+    email = build_simple_mail(subject, to_mail, template_base, context)
+    if email is None:
+        return
+
+    logger.debug("Wysyłanie emaila do %s: %s", to_mail, subject)
 
     try:
         email.send(fail_silently=False)
@@ -50,3 +61,21 @@ def send_simple_mail(subject, to_mail, template_base, context):
     except Exception:
         logger.exception("Błąd wysyłania emaila do %s", to_mail)
         raise
+
+
+def send_mass_simple_mail(emails):
+    """
+    Wysyła wiele emaili (z build_simple_mail) przez jedno połączenie SMTP.
+    Zwraca liczbę wysłanych.
+    """
+    emails = [e for e in emails if e is not None]
+    if not emails:
+        return 0
+    try:
+        with get_connection(fail_silently=False) as connection:
+            wyslane = connection.send_messages(emails) or 0
+    except Exception:
+        logger.exception("Błąd wysyłania %s emaili", len(emails))
+        raise
+    logger.info("Wysłano %s emaili", wyslane)
+    return wyslane
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rejs.atrapa_payu import AtrapaPayU
+
+
+class Command(BaseCommand):
+	help = (
+		"Uruchamia lokalną atrapę PayU (OAuth, zamówienia, podpisane powiadomienia) "
+		"do testów i pomiarów. Aplikacja musi mieć PAYU_ENV=local."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--host", default="127.0.0.1")
+		parser.add_argument("--port", type=int, default=8001)
+		parser.add_argument(
+			"--opoznienie",
+			type=int,
+			default=0,
+			help="Opóźnienie każdej odpowiedzi w ms.",
+		)
+		parser.add_argument(
+			"--awarie",
+			type=float,
+			default=0.0,
+			help="Odsetek zapytań API kończących się 503 (0-1).",
+		)
+		parser.add_argument(
+			"--duplikaty",
+			type=float,
+			default=0.0,
+			help="Odsetek powiadomień wysyłanych dwa razy (0-1).",
+		)
+		parser.add_argument(
+			"--auto-zaplata",
+			type=float,
+			default=None,
+			help=(
+				"Opłać każde zamówienie po tylu sekundach, "
+				"bez wchodzenia na stronę płatności."
+			),
+		)
+		parser.add_argument(
+			"--ziarno",
+			type=int,
+			default=None,
+			help="Ziarno losowania awarii i duplikatów.",
+		)
+
+	def handle(self, *args, **options):
+		if not settings.PAYU.get("WEBHOOK_SECRET"):
+			self.stderr.write(
+				"Brak WEBHOOK_SECRET - powiadomienia nie przejdą weryfikacji podpisu."
+			)
+		atrapa = AtrapaPayU(
+			settings.PAYU.get("WEBHOOK_SECRET") or "",
+			opoznienie=options["opoznienie"] / 1000,
+			awarie=options["awarie"],
+			duplikaty=options["duplikaty"],
+			auto_zaplata=options["auto_zaplata"],
+			ziarno=options["ziarno"],
+		)
+		adres = atrapa.uruchom(options["host"], options["port"])
+		self.stdout.write(f"Atrapa PayU działa pod {adres} (Ctrl+C kończy).")
+		try:
+			while True:
+				time.sleep(3600)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			atrapa.zatrzymaj()
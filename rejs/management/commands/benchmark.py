@@ -0,0 +1,254 @@
+import hashlib
+import hmac
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+	CaptureQueriesContext,
+	setup_test_environment,
+	teardown_test_environment,
+)
+from django.urls import reverse
+
+from rejs import payu, powiadomienia
+from rejs.atrapa_payu import AtrapaPayU
+from rejs.generator import generuj
+from rejs.models import PlatnoscPayU, Rejs, Zgloszenie
+from rejs.przypomnienia import wyslij_linki_reszty
+
+
+def _pomiar(funkcja):
+	with CaptureQueriesContext(connection) as zapytania:
+		poczatek = time.perf_counter()
+		funkcja()
+		czas = (time.perf_counter() - poczatek) * 1000
+	return czas, len(zapytania)
+
+
+def _podsumowanie(pomiary):
+	"""Czasy w ms z listy (czas, zapytania) i liczba zapytań ostatniego pomiaru."""
+	czasy = [czas for czas, _ in pomiary]
+	return {
+		"powtorzenia": len(czasy),
+		"min_ms": round(min(czasy), 2),
+		"mediana_ms": round(statistics.median(czasy), 2),
+		"max_ms": round(max(czasy), 2),
+		"zapytania": pomiary[-1][1],
+	}
+
+
+def _czas(funkcja, powtorzenia):
+	return _podsumowanie([_pomiar(funkcja) for _ in range(powtorzenia)])
+
+
+def _powiadomienie(klient, order_id, status):
+	body = json.dumps({"order": {"orderId": order_id, "status": status}}).encode()
+	podpis = hmac.new(
+		settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+	).hexdigest()
+	return klient.post(
+		reverse("payu_webhook"),
+		data=body,
+		content_type="application/json",
+		HTTP_OPENPAYU_SIGNATURE=f"sender=payu;signature=sha256={podpis}",
+	)
+
+
+def zmierz(rejsy=5, zgloszenia=400, ziarno=0, powtorzenia=5, powiadomienia_na_probe=50):
+	"""
+	Zakłada dane z ``generuj`` w bieżącej bazie i mierzy kluczowe ścieżki:
+	strony publiczne i panelu, raport rejsu, webhook PayU z przetwarzaniem
+	powiadomień i wysyłkę linków do dopłaty (PayU - lokalna atrapa, maile -
+	bieżący EMAIL_BACKEND). Zwraca słownik wyników.
+	"""
+	wyniki = {}
+	poczatek = time.perf_counter()
+	wiersze = generuj(rejsy=rejsy, zgloszenia=zgloszenia, ziarno=ziarno)
+	wyniki["generowanie"] = {
+		"wiersze": sum(wiersze.values()),
+		"s": round(time.perf_counter() - poczatek, 2),
+	}
+
+	rejs = Rejs.objects.order_by("pk").first()
+	zgl = (
+		Zgloszenie.objects
+		.filter(
+			rejs=rejs,
+			status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+			dane_dodatkowe__isnull=False,
+		)
+		.first()
+	)
+	admin = User.objects.create_superuser("benchmark", "benchmark@example.com", None)
+	klient = Client()
+	panel = Client()
+	panel.force_login(admin)
+
+	strony = {
+		"index": lambda: klient.get(reverse("index")),
+		"zgloszenie_details": lambda: klient.get(
+			reverse("zgloszenie_details", args=[zgl.token])
+		),
+		"admin_zgloszenia": lambda: panel.get(
+			reverse("admin:rejs_zgloszenie_changelist"), {"rejs__id__exact": rejs.pk}
+		),
+		"admin_rejs": lambda: panel.get(
+			reverse("admin:rejs_rejs_change", args=[rejs.pk])
+		),
+		"raport": lambda: panel.post(
+			reverse("admin:rejs_rejs_changelist"),
+			{"action": "generate_report", "_selected_action": [rejs.pk]},
+		),
+	}
+	for nazwa, strona in strony.items():
+		wyniki[nazwa] = _czas(strona, powtorzenia)
+
+	# webhook: za każdym razem inne otwarte zamówienia, potem ich przetworzenie
+	otwarte = iter(
+		PlatnoscPayU.objects
+		.filter(status=PlatnoscPayU.STATUS_PENDING)
+		.order_by("pk")
+		.values_list("payu_order_id", flat=True)
+	)
+
+	def webhooki():
+		for order_id in [next(otwarte, None) for _ in range(powiadomienia_na_probe)]:
+			if order_id:
+				_powiadomienie(klient, order_id, "COMPLETED")
+
+	def przetwarzanie():
+		powiadomienia.przetworz(rozmiar_partii=powiadomienia_na_probe)
+
+	pomiary = {"webhook": [], "przetworz_powiadomienia": []}
+	for _ in range(powtorzenia):
+		pomiary["webhook"].append(_pomiar(webhooki))
+		pomiary["przetworz_powiadomienia"].append(_pomiar(przetwarzanie))
+	for nazwa, lista in pomiary.items():
+		wyniki[nazwa] = {
+			"powiadomienia": powiadomienia_na_probe,
+			**_podsumowanie(lista),
+		}
+
+	# pierwsza wysyłka zakłada zamówienia PayU, kolejne wysyłają te same linki
+	atrapa = AtrapaPayU(settings.PAYU["WEBHOOK_SECRET"], ziarno=ziarno)
+	adres = atrapa.uruchom(port=0)
+	payu.wyczysc_pamiec()
+	try:
+		with override_settings(
+			PAYU={**settings.PAYU, "ENV": "local", "LOCAL_URL": adres, "RETRIES": 0}
+		):
+			def wysylka():
+				wyslij_linki_reszty(rejs, na_sekunde=0)
+
+			wyniki["linki_doplaty_nowe"] = _czas(wysylka, 1)
+			wyniki["linki_doplaty"] = _czas(wysylka, powtorzenia)
+	finally:
+		atrapa.zatrzymaj()
+		payu.wyczysc_pamiec()
+	return wyniki
+
+
+def commit():
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"],
+			capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return ""
+
+
+class Command(BaseCommand):
+	help = (
+		"Mierzy kluczowe widoki, raport, webhook PayU z przetwarzaniem i wysyłkę "
+		"linków do dopłaty na syntetycznych danych (generuj_dane) w tymczasowej "
+		"bazie testowej. Wynik zapisuje jako JSON do porównań między commitami."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--rejsy", type=int, default=5, help="Liczba rejsów.")
+		parser.add_argument(
+			"--zgloszenia", type=int, default=400, help="Zgłoszeń na rejs."
+		)
+		parser.add_argument("--ziarno", type=int, default=0, help="Ziarno generatora.")
+		parser.add_argument(
+			"--powtorzenia", type=int, default=5, help="Pomiarów każdej ścieżki."
+		)
+		parser.add_argument(
+			"--powiadomienia",
+			type=int,
+			default=50,
+			help="Powiadomień PayU w jednej próbie.",
+		)
+		parser.add_argument(
+			"--katalog",
+			default=str(settings.BASE_DIR / "benchmarks"),
+			help="Katalog wyników.",
+		)
+		parser.add_argument(
+			"--porownaj", help="Wcześniejszy plik wyników do porównania."
+		)
+
+	def handle(self, *args, **options):
+		setup_test_environment()
+		stara_baza = connection.creation.create_test_db(
+			verbosity=0, autoclobber=True, serialize=False
+		)
+		try:
+			with override_settings(RATE_LIMITS={}):
+				wyniki = zmierz(
+					rejsy=options["rejsy"],
+					zgloszenia=options["zgloszenia"],
+					ziarno=options["ziarno"],
+					powtorzenia=options["powtorzenia"],
+					powiadomienia_na_probe=options["powiadomienia"],
+				)
+		finally:
+			connection.creation.destroy_test_db(stara_baza, verbosity=0)
+			teardown_test_environment()
+
+		sha = commit()
+		raport = {
+			"commit": sha,
+			"data": datetime.now().isoformat(timespec="seconds"),
+			"baza": connection.vendor,
+			"parametry": {
+				nazwa: options[nazwa]
+				for nazwa in (
+					"rejsy", "zgloszenia", "ziarno", "powtorzenia", "powiadomienia"
+				)
+			},
+			"wyniki": wyniki,
+		}
+		katalog = Path(options["katalog"])
+		katalog.mkdir(parents=True, exist_ok=True)
+		przyrostek = f"-{sha}" if sha else ""
+		plik = katalog / f"{datetime.now():%Y%m%d-%H%M%S}{przyrostek}.json"
+		plik.write_text(json.dumps(raport, indent=2, ensure_ascii=False))
+
+		poprzednie = {}
+		if options["porownaj"]:
+			poprzednie = json.loads(Path(options["porownaj"]).read_text())["wyniki"]
+		self.stdout.write(
+			f"{'ścieżka':<26}{'mediana [ms]':>14}{'zapytania':>11}{'zmiana':>9}"
+		)
+		for nazwa, wynik in wyniki.items():
+			if "mediana_ms" not in wynik:
+				continue
+			zmiana = ""
+			if poprzednie.get(nazwa, {}).get("mediana_ms"):
+				wzgledna = wynik["mediana_ms"] / poprzednie[nazwa]["mediana_ms"] - 1
+				zmiana = f"{wzgledna:+.0%}"
+			self.stdout.write(
+				f"{nazwa:<26}{wynik['mediana_ms']:>14}{wynik['zapytania']:>11}{zmiana:>9}"
+			)
+		self.stdout.write(f"Wyniki: {plik}")
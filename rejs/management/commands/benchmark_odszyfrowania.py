@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from rejs.szyfry import odszyfruj_wiele, szyfruj
+
+from .benchmark_szyfrowania import WIERSZ
+
+
+def zmierz(wiersze, procesy, partia=2000):
+	"""Odszyfrowanie ``wiersze`` wierszy Dane_Dodatkowe po kolei i w puli procesów."""
+	szyfrogramy = [szyfruj(wartosc) for wartosc in WIERSZ] * wiersze
+	wynik = {"wiersze": wiersze, "wartosci": len(szyfrogramy), "procesy": procesy}
+	for nazwa, liczba in (("po_kolei_s", 1), ("pula_s", procesy)):
+		poczatek = time.perf_counter()
+		odszyfruj_wiele(szyfrogramy, procesy=liczba, partia=partia, minimum=0)
+		wynik[nazwa] = round(time.perf_counter() - poczatek, 3)
+	return wynik
+
+
+class Command(BaseCommand):
+	help = (
+		"Mierzy hurtowe odszyfrowanie danych wrażliwych do raportów: po kolei "
+		"i w puli procesów (odszyfruj_wiele), bieżącym szyfrem z DJANGO_FIELD_CIPHER."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--wiersze",
+			type=int,
+			nargs="+",
+			default=[10000, 100000],
+			help="Liczby wierszy.",
+		)
+		parser.add_argument(
+			"--procesy", type=int, default=os.cpu_count() or 1, help="Procesy w puli."
+		)
+		parser.add_argument(
+			"--partia", type=int, default=2000, help="Wartości w jednej partii."
+		)
+		parser.add_argument("--json", action="store_true", help="Wynik jako JSON.")
+
+	def handle(self, *args, **options):
+		wyniki = [
+			zmierz(wiersze, options["procesy"], options["partia"])
+			for wiersze in options["wiersze"]
+		]
+		if options["json"]:
+			self.stdout.write(json.dumps(wyniki, indent=2))
+			return
+		self.stdout.write(
+			f"{'wiersze':>10}{'wartości':>10}{'po kolei [s]':>14}{'pula [s]':>10}"
+		)
+		for wynik in wyniki:
+			self.stdout.write(
+				f"{wynik['wiersze']:>10}{wynik['wartosci']:>10}"
+				f"{wynik['po_kolei_s']:>14}{wynik['pula_s']:>10}"
+			)
@@ -0,0 +1,157 @@
+import json
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+
+from rejs.baza import blokada_bazy, ponawiaj_przy_blokadzie
+
+PROFILE = {
+	"domyslny": {},
+	"produkcyjny": settings.SQLITE_PRODUCTION_OPTIONS,
+}
+
+
+def _polaczenie(sciezka, opcje):
+	# osobne połączenie na wątek, poza connections - nie dotyka bazy aplikacji
+	return DatabaseWrapper(connections.configure_settings({"default": {
+		"ENGINE": "django.db.backends.sqlite3", "NAME": str(sciezka), "OPTIONS": opcje,
+	}})["default"], alias="benchmark_sqlite")
+
+
+def zmierz(opcje, piszace=8, czytajace=4, transakcje=50, ponawiaj=False):
+	"""
+	Obciążenie jak przy zapisach zgłoszeń: ``piszace`` wątków wykonuje po
+	``transakcje`` transakcji (odczyt licznika miejsc, INSERT, UPDATE), a
+	``czytajace`` w tym czasie liczą wiersze. Zwraca licznik wyników.
+	"""
+	wynik = Counter()
+	with tempfile.TemporaryDirectory() as katalog:
+		sciezka = Path(katalog) / "stres.sqlite3"
+		polaczenie = _polaczenie(sciezka, opcje)
+		with polaczenie.cursor() as kursor:
+			kursor.execute(
+				"CREATE TABLE miejsca (id INTEGER PRIMARY KEY, zajete INTEGER)"
+			)
+			kursor.execute(
+				"CREATE TABLE zgloszenia (id INTEGER PRIMARY KEY, dane TEXT)"
+			)
+			kursor.execute("INSERT INTO miejsca VALUES (1, 0)")
+		polaczenie.close()
+		koniec = threading.Event()
+
+		def transakcja(polaczenie, nr):
+			with polaczenie.cursor() as kursor:
+				# tak jak atomic() na SQLite: BEGIN [IMMEDIATE] w trybie autocommit
+				kursor.execute(f"BEGIN {polaczenie.transaction_mode or ''}")
+				try:
+					kursor.execute("SELECT zajete FROM miejsca WHERE id = 1")
+					kursor.fetchone()
+					kursor.execute(
+						"INSERT INTO zgloszenia (dane) VALUES (%s)",
+						[f"zgłoszenie {nr}"],
+					)
+					kursor.execute(
+						"UPDATE miejsca SET zajete = zajete + 1 WHERE id = 1"
+					)
+					kursor.execute("COMMIT")
+				except BaseException:
+					kursor.execute("ROLLBACK")
+					raise
+
+		if ponawiaj:
+			transakcja = ponawiaj_przy_blokadzie(transakcja)
+
+		def pisz():
+			polaczenie = _polaczenie(sciezka, opcje)
+			try:
+				for nr in range(transakcje):
+					try:
+						transakcja(polaczenie, nr)
+						wynik["zapisy"] += 1
+					except OperationalError as blad:
+						if not blokada_bazy(blad):
+							raise
+						wynik["blokady"] += 1
+			finally:
+				polaczenie.close()
+
+		def czytaj():
+			polaczenie = _polaczenie(sciezka, opcje)
+			try:
+				while not koniec.is_set():
+					with polaczenie.cursor() as kursor:
+						kursor.execute("SELECT COUNT(*) FROM zgloszenia")
+						kursor.fetchone()
+					wynik["odczyty"] += 1
+			except OperationalError as blad:
+				if not blokada_bazy(blad):
+					raise
+				wynik["blokady_odczytu"] += 1
+			finally:
+				polaczenie.close()
+
+		czytelnicy = [threading.Thread(target=czytaj) for _ in range(czytajace)]
+		pisarze = [threading.Thread(target=pisz) for _ in range(piszace)]
+		poczatek = time.perf_counter()
+		for watek in czytelnicy + pisarze:
+			watek.start()
+		for watek in pisarze:
+			watek.join()
+		koniec.set()
+		for watek in czytelnicy:
+			watek.join()
+		czas = time.perf_counter() - poczatek
+
+	wynik["zapisy_na_s"] = round(wynik["zapisy"] / czas)
+	wynik["odczyty_na_s"] = round(wynik["odczyty"] / czas)
+	return wynik
+
+
+class Command(BaseCommand):
+	help = (
+		"Test obciążeniowy SQLite: równoległe transakcje zapisu i odczyty na domyślnym "
+		"i produkcyjnym profilu (SQLITE_PRODUCTION_OPTIONS), na pliku tymczasowym."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--piszace", type=int, default=8, help="Wątki zapisujące.")
+		parser.add_argument("--czytajace", type=int, default=4, help="Wątki czytające.")
+		parser.add_argument(
+			"--transakcje", type=int, default=200, help="Transakcji na wątek."
+		)
+		parser.add_argument(
+			"--ponawiaj",
+			action="store_true",
+			help="Zapisy przez ponawiaj_przy_blokadzie.",
+		)
+		parser.add_argument("--json", action="store_true", help="Wynik jako JSON.")
+
+	def handle(self, *args, **options):
+		wyniki = {
+			nazwa: zmierz(
+				opcje,
+				piszace=options["piszace"],
+				czytajace=options["czytajace"],
+				transakcje=options["transakcje"],
+				ponawiaj=options["ponawiaj"],
+			)
+			for nazwa, opcje in PROFILE.items()
+		}
+		if options["json"]:
+			self.stdout.write(json.dumps(wyniki, indent=2))
+			return
+		self.stdout.write(
+			f"{'profil':<14}{'zapisy':>8}{'blokady':>9}{'zapisy/s':>10}{'odczyty/s':>11}"
+		)
+		for nazwa, wynik in wyniki.items():
+			self.stdout.write(
+				f"{nazwa:<14}{wynik['zapisy']:>8}{wynik['blokady']:>9}"
+				f"{wynik['zapisy_na_s']:>10}{wynik['odczyty_na_s']:>11}"
+			)
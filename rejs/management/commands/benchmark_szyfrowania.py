@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from rejs.szyfry import pierscien_kluczy, szyfr
+
+# wartości jednego wiersza Dane_Dodatkowe: PESEL, typ i numer dokumentu,
+# miejsce urodzenia, obywatelstwo
+WIERSZ = ["00210112345", "dowod-osobisty", "ABC123456", "Gdynia", "polskie"]
+
+
+class FernetTekst:
+	"""Format EncryptedTextField: token Fernet w base64 jako tekst."""
+
+	def szyfruj(self, dane):
+		return pierscien_kluczy().encrypt(dane).decode()
+
+	def odszyfruj(self, token):
+		return pierscien_kluczy().decrypt(token.encode())
+
+
+def zmierz(wiersze):
+	"""Szyfrowanie/odszyfrowanie ``wiersze`` wierszy w każdym formacie.
+
+	Zwraca listę wyników.
+	"""
+	wyniki = []
+	dane = [wartosc.encode() for wartosc in WIERSZ] * wiersze
+	warianty = {
+		"fernet-tekst": FernetTekst(),
+		"fernet-binarny": szyfr("fernet"),
+		"aes-gcm-binarny": szyfr("aes-gcm"),
+	}
+	for nazwa, wariant in warianty.items():
+		poczatek = time.perf_counter()
+		szyfrogramy = [wariant.szyfruj(wartosc) for wartosc in dane]
+		szyfrowanie = time.perf_counter() - poczatek
+
+		poczatek = time.perf_counter()
+		for szyfrogram in szyfrogramy:
+			wariant.odszyfruj(szyfrogram)
+		odszyfrowanie = time.perf_counter() - poczatek
+
+		wyniki.append({
+			"format": nazwa,
+			"szyfrowanie_na_s": round(len(dane) / szyfrowanie),
+			"odszyfrowanie_na_s": round(len(dane) / odszyfrowanie),
+			"bajty_na_wiersz": sum(len(s) for s in szyfrogramy[:len(WIERSZ)]),
+		})
+	return wyniki
+
+
+class Command(BaseCommand):
+	help = (
+		"Porównuje przepustowość szyfrowania i rozmiar wiersza danych wrażliwych: "
+		"tekstowy Fernet (EncryptedTextField), binarny Fernet i binarny AES-GCM."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--wiersze",
+			type=int,
+			default=10000,
+			help="Liczba wierszy Dane_Dodatkowe.",
+		)
+		parser.add_argument("--json", action="store_true", help="Wynik jako JSON.")
+
+	def handle(self, *args, **options):
+		wyniki = zmierz(options["wiersze"])
+		if options["json"]:
+			self.stdout.write(json.dumps(wyniki, indent=2))
+			return
+		self.stdout.write(
+			f"{'format':<20}{'szyfr./s':>12}{'odszyfr./s':>12}{'bajty/wiersz':>14}"
+		)
+		for wynik in wyniki:
+			self.stdout.write(
+				f"{wynik['format']:<20}{wynik['szyfrowanie_na_s']:>12}"
+				f"{wynik['odszyfrowanie_na_s']:>12}{wynik['bajty_na_wiersz']:>14}"
+			)
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rejs.generator import generuj
+from rejs.models import Rejs
+
+
+class Command(BaseCommand):
+	help = (
+		"Zakłada syntetyczne rejsy ze zgłoszeniami, wachtami, wpłatami, "
+		"zamówieniami PayU, zaszyfrowanymi danymi dodatkowymi i ogłoszeniami - "
+		"do pomiarów wydajności. To samo ziarno daje te same dane."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--rejsy", type=int, default=10, help="Liczba rejsów.")
+		parser.add_argument(
+			"--zgloszenia", type=int, default=1000, help="Zgłoszeń na rejs."
+		)
+		parser.add_argument("--ziarno", type=int, default=0, help="Ziarno generatora.")
+		parser.add_argument(
+			"--partia", type=int, default=2000, help="Wierszy w jednym bulk_create."
+		)
+		parser.add_argument(
+			"--dopisz",
+			action="store_true",
+			help=(
+				"Dopisz do bazy, w której są już rejsy "
+				"(podaj inne ziarno niż wcześniej)."
+			),
+		)
+
+	def handle(self, *args, **options):
+		if Rejs.objects.exists() and not options["dopisz"]:
+			raise CommandError(
+				"W bazie są już rejsy. Użyj pustej bazy albo --dopisz z nowym ziarnem."
+			)
+		poczatek = time.perf_counter()
+		wynik = generuj(
+			rejsy=options["rejsy"],
+			zgloszenia=options["zgloszenia"],
+			ziarno=options["ziarno"],
+			partia=options["partia"],
+		)
+		czas = time.perf_counter() - poczatek
+		for model, liczba in wynik.items():
+			self.stdout.write(f"{model:<16}{liczba:>10}")
+		self.stdout.write(f"Wierszy: {sum(wynik.values())} w {czas:.1f} s")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rejs.wyciagi import BladWyciagu, czytaj_wyciag, importuj
+
+
+class Command(BaseCommand):
+	help = (
+		"Importuje wyciąg bankowy (CSV lub MT940): dopasowane przelewy księguje "
+		"jako wpłaty, pozostałe zostawia do sprawdzenia w panelu admina "
+		"(Przelewy bankowe)."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("plik", help="Ścieżka do pliku wyciągu.")
+		parser.add_argument(
+			"--format",
+			choices=["csv", "mt940"],
+			help="Format wyciągu (domyślnie rozpoznawany).",
+		)
+		parser.add_argument(
+			"--bez-maili", action="store_true", help="Nie wysyłaj potwierdzeń wpłat."
+		)
+
+	def handle(self, *args, **options):
+		try:
+			with open(options["plik"], "rb") as plik:
+				przelewy = czytaj_wyciag(plik.read(), options["format"])
+		except OSError as e:
+			raise CommandError(f"Nie można odczytać pliku: {e}")
+		except BladWyciagu as e:
+			raise CommandError(str(e))
+
+		wynik = importuj(przelewy, maile=not options["bez_maili"])
+		self.stdout.write(
+			f"Przelewy: {len(przelewy)}, zaksięgowane: {wynik['zaksiegowane']}, "
+			f"do sprawdzenia: {wynik['do_sprawdzenia']}, "
+			f"już zaimportowane: {wynik['pominiete']}"
+		)
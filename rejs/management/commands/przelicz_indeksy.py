@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from rejs.szyfrowanie import przelicz_indeksy
+
+
+class Command(BaseCommand):
+	help = (
+		"Przelicza ślepe indeksy PESEL-u i numeru dokumentu bieżącym "
+		"DJANGO_BLIND_INDEX_KEY. Uruchom po zmianie klucza - do tego czasu "
+		"wyszukiwanie po PESEL-u nic nie znajduje."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--partia", type=int, default=500, help="Wierszy w jednej transakcji."
+		)
+		parser.add_argument(
+			"--pauza",
+			type=float,
+			default=0,
+			help="Przerwa między partiami w sekundach.",
+		)
+
+	def handle(self, *args, **options):
+		zmienione = przelicz_indeksy(
+			partia=options["partia"], pauza=options["pauza"]
+		)
+		self.stdout.write(f"Przeliczone indeksy: {zmienione}")
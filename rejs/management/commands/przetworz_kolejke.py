@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from rejs import kolejka
+from rejs.baza import blokada_bazy
+
+
+class Command(BaseCommand):
+	help = "Zapisuje zgłoszenia z kolejki (tryb kolejki rejsu) do bazy, partiami."
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--partia",
+			type=int,
+			default=100,
+			help="Liczba zgłoszeń w jednej transakcji.",
+		)
+		parser.add_argument(
+			"--petla",
+			action="store_true",
+			help="Działaj w pętli, sprawdzając kolejkę co --odstep sekund.",
+		)
+		parser.add_argument("--odstep", type=float, default=1.0)
+
+	def handle(self, *args, **options):
+		przywrocone = kolejka.przywroc_porzucone()
+		if przywrocone:
+			self.stdout.write(f"Przywrócono do kolejki: {przywrocone}")
+
+		while True:
+			try:
+				zapisane, odrzucone = kolejka.przetworz(options["partia"])
+			except OperationalError as blad:
+				# pliki wróciły do kolejki - spróbujemy po przerwie
+				if not blokada_bazy(blad) or not options["petla"]:
+					raise
+				self.stderr.write(
+					f"Baza zablokowana, ponowienie za {options['odstep']} s"
+				)
+				time.sleep(options["odstep"])
+				continue
+			if zapisane or odrzucone:
+				self.stdout.write(f"Zapisane: {zapisane}, odrzucone: {odrzucone}")
+				continue
+			if not options["petla"]:
+				break
+			time.sleep(options["odstep"])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rejs import powiadomienia
+
+
+class Command(BaseCommand):
+	help = (
+		"Stosuje powiadomienia PayU zapisane przez webhook "
+		"(zmiana statusu płatności, wpłaty)."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--partia",
+			type=int,
+			default=100,
+			help="Liczba powiadomień w jednym przebiegu.",
+		)
+		parser.add_argument(
+			"--petla",
+			action="store_true",
+			help="Działaj w pętli, sprawdzając skrzynkę co --odstep sekund.",
+		)
+		parser.add_argument("--odstep", type=float, default=1.0)
+
+	def handle(self, *args, **options):
+		while True:
+			przetworzone, odlozone = powiadomienia.przetworz(options["partia"])
+			if przetworzone or odlozone:
+				self.stdout.write(f"Przetworzone: {przetworzone}, odłożone: {odlozone}")
+				continue
+			if not options["petla"]:
+				break
+			time.sleep(options["odstep"])
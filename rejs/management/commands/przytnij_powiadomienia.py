@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from rejs.powiadomienia import przytnij
+
+
+class Command(BaseCommand):
+	help = (
+		"Usuwa ze skrzynki powiadomienia PayU przetworzone ponad --dni dni temu. "
+		"Porzucone po błędach zostają do ręcznego sprawdzenia."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--dni", type=int, default=30, help="Okres przechowywania w dniach."
+		)
+		parser.add_argument(
+			"--partia", type=int, default=10000, help="Powiadomień w jednym DELETE."
+		)
+
+	def handle(self, *args, **options):
+		usuniete = przytnij(dni=options["dni"], partia=options["partia"])
+		self.stdout.write(f"Usunięte powiadomienia: {usuniete}")
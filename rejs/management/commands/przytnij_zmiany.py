@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from rejs.zmiany import przytnij
+
+
+class Command(BaseCommand):
+	help = (
+		"Usuwa z dziennika kanału zmian wpisy starsze niż --dni dni. Odbiorcy "
+		"z kursorem sprzed przyciętych wpisów dostaną błąd i muszą pobrać pełny "
+		"stan od nowa."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--dni", type=int, default=90, help="Okres przechowywania w dniach."
+		)
+		parser.add_argument(
+			"--partia", type=int, default=10000, help="Wpisów w jednym DELETE."
+		)
+
+	def handle(self, *args, **options):
+		usuniete = przytnij(dni=options["dni"], partia=options["partia"])
+		self.stdout.write(f"Usunięte wpisy: {usuniete}")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from rejs.szyfrowanie import na_starych_kluczach, rotuj
+
+
+class Command(BaseCommand):
+	help = (
+		"Przepisuje zaszyfrowane pola na bieżący (pierwszy) klucz z "
+		"DJANGO_FIELD_ENCRYPTION_KEY. Działa partiami i zapamiętuje postęp - "
+		"przerwaną rotację wystarczy uruchomić ponownie."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--partia", type=int, default=500, help="Wierszy w jednej transakcji."
+		)
+		parser.add_argument(
+			"--pauza",
+			type=float,
+			default=0,
+			help="Przerwa między partiami w sekundach.",
+		)
+		parser.add_argument(
+			"--od-nowa",
+			action="store_true",
+			help="Zacznij od początku mimo zapisanego postępu.",
+		)
+		parser.add_argument(
+			"--sprawdz",
+			action="store_true",
+			help="Tylko policz wiersze, których nie odszyfruje sam bieżący klucz.",
+		)
+
+	def handle(self, *args, **options):
+		if not options["sprawdz"]:
+			wynik = rotuj(
+				partia=options["partia"],
+				pauza=options["pauza"],
+				od_nowa=options["od_nowa"],
+			)
+			for model, liczba in sorted(wynik.items()):
+				self.stdout.write(f"{model}: przepisane wiersze: {liczba}")
+
+		stare = sum(na_starych_kluczach().values())
+		if stare:
+			self.stdout.write(f"Wiersze na starych kluczach: {stare}")
+		else:
+			self.stdout.write(
+				"Wszystkie wiersze są na bieżącym kluczu - stare klucze można usunąć "
+				"z DJANGO_FIELD_ENCRYPTION_KEY."
+			)
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from rejs.platnosci import uzgodnij_platnosci
+
+
+class Command(BaseCommand):
+	help = (
+		"Sprawdza w PayU płatności, które utknęły w statusie NEW/PENDING "
+		"(np. po zgubionym webhooku), i księguje zakończone."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--starsze-niz",
+			type=int,
+			default=30,
+			help="Wiek płatności w minutach (domyślnie 30).",
+		)
+		parser.add_argument(
+			"--watki", type=int, default=4, help="Równoległe zapytania do PayU."
+		)
+		parser.add_argument(
+			"--na-sekunde",
+			type=float,
+			default=10,
+			help="Najwięcej zapytań do PayU na sekundę.",
+		)
+		parser.add_argument(
+			"--wygasle-dni",
+			type=int,
+			default=7,
+			help="Sprawdzaj też wygaszone płatności z tylu ostatnich dni.",
+		)
+		parser.add_argument(
+			"--odstep-waznych",
+			type=int,
+			default=60,
+			help="Otwarte płatności z ważnym linkiem sprawdzaj najwyżej co tyle minut.",
+		)
+
+	def handle(self, *args, **options):
+		wynik = uzgodnij_platnosci(
+			starsze_niz=options["starsze_niz"],
+			watki=options["watki"],
+			na_sekunde=options["na_sekunde"],
+			wygasle_dni=options["wygasle_dni"],
+			odstep_waznych=options["odstep_waznych"],
+		)
+		self.stdout.write(
+			f"Sprawdzone: {wynik['sprawdzone']}, zakończone: {wynik['zakonczone']}, "
+			f"nieudane: {wynik['nieudane']}, w toku: {wynik['w_toku']}, "
+			f"bez zmian: {wynik['bez_zmian']}, błędy PayU: {wynik['bledy']}"
+		)
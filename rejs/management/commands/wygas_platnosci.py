@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rejs.platnosci import wygas_platnosci
+
+
+class Command(BaseCommand):
+	help = (
+		"Oznacza jako wygasłe porzucone płatności PayU "
+		"(NEW/PENDING starsze niż ważność zamówienia)."
+	)
+
+	def handle(self, *args, **options):
+		wygaszone = wygas_platnosci()
+		self.stdout.write(f"Wygaszone płatności: {wygaszone}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rejs.models import Rejs
+from rejs.przypomnienia import wyslij_linki_reszty
+
+
+class Command(BaseCommand):
+	help = (
+		"Wysyła zakwalifikowanym uczestnikom rejsu maile z linkiem PayU do dopłaty - "
+		"cały rejs naraz, bez limitu akcji w panelu admina."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("rejs", type=int, help="Id rejsu.")
+		parser.add_argument(
+			"--watki", type=int, default=4, help="Równoległe zapytania do PayU."
+		)
+		parser.add_argument(
+			"--na-sekunde",
+			type=float,
+			default=5,
+			help="Najwięcej zamówień PayU na sekundę.",
+		)
+
+	def handle(self, *args, **options):
+		try:
+			rejs = Rejs.objects.get(pk=options["rejs"])
+		except Rejs.DoesNotExist as e:
+			raise CommandError(f"Nie ma rejsu {options['rejs']}.") from e
+
+		wynik = wyslij_linki_reszty(
+			rejs, watki=options["watki"], na_sekunde=options["na_sekunde"]
+		)
+		self.stdout.write(
+			f"Wysłane maile: {wynik['maile']}, nowe zamówienia PayU: {wynik['nowe']}, "
+			f"ponownie wysłane linki: {wynik['ponowione']}, błędy: {wynik['bledy']}"
+		)
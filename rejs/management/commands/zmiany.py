@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rejs.zmiany import (
+	DOMYSLNY_LIMIT,
+	NieprawidlowyKursor,
+	dekoduj_kursor,
+	ndjson,
+	pobierz_zmiany,
+)
+
+
+class Command(BaseCommand):
+	help = "Wypisuje zmiany (NDJSON) nowsze od podanego kursora."
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--kursor", default="", help="Kursor z poprzedniego wywołania."
+		)
+		parser.add_argument(
+			"--plik-kursora",
+			help=(
+				"Plik, z którego czytany jest kursor "
+				"i do którego zapisywany jest nowy."
+			),
+		)
+		parser.add_argument("--limit", type=int, default=DOMYSLNY_LIMIT)
+		parser.add_argument(
+			"--wszystko",
+			action="store_true",
+			help="Pobieraj kolejne strony, dopóki są nowe zmiany.",
+		)
+
+	def handle(self, *args, **options):
+		plik = Path(options["plik_kursora"]) if options["plik_kursora"] else None
+		kursor = options["kursor"]
+		if plik and not kursor and plik.exists():
+			kursor = plik.read_text().strip()
+
+		try:
+			od = dekoduj_kursor(kursor)
+		except NieprawidlowyKursor as e:
+			raise CommandError(str(e)) from e
+
+		while True:
+			koniec = None
+			try:
+				zmiany = pobierz_zmiany(od, options["limit"])
+			except NieprawidlowyKursor as e:
+				raise CommandError(str(e)) from e
+			for wpis in zmiany:
+				if "wiecej" in wpis:
+					koniec = wpis
+				self.stdout.write(next(ndjson([wpis])), ending="")
+
+			kursor = koniec["kursor"]
+			od = dekoduj_kursor(kursor)
+			if not (options["wszystko"] and koniec["wiecej"]):
+				break
+
+		if plik:
+			plik.write_text(kursor)
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rejs import zwroty
+from rejs.models import Rejs
+
+
+class Command(BaseCommand):
+	help = (
+		"Zleca w PayU zwroty dla odwołanych rejsów, księguje je jako wpłaty typu zwrot "
+		"i wysyła maile. Przerwaną komendę można uruchomić ponownie."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--rejs", type=int, help="Tylko zwroty tego rejsu (id).")
+		parser.add_argument(
+			"--odwolaj",
+			action="store_true",
+			help=(
+				"Najpierw odwołaj rejs podany w --rejs "
+				"(zamyka rekrutację, zakłada zwroty)."
+			),
+		)
+		parser.add_argument(
+			"--watki", type=int, default=4, help="Równoległe zapytania do PayU."
+		)
+		parser.add_argument(
+			"--na-sekunde",
+			type=float,
+			default=5,
+			help="Najwięcej zapytań do PayU na sekundę.",
+		)
+
+	def handle(self, *args, **options):
+		rejs = None
+		if options["rejs"]:
+			try:
+				rejs = Rejs.objects.get(pk=options["rejs"])
+			except Rejs.DoesNotExist:
+				raise CommandError(f"Nie ma rejsu o id {options['rejs']}.")
+		if options["odwolaj"]:
+			if rejs is None:
+				raise CommandError("--odwolaj wymaga --rejs.")
+			nowe = zwroty.odwolaj_rejs(rejs)
+			self.stdout.write(f"Odwołano rejs {rejs}, nowe zwroty: {nowe}")
+
+		wynik = zwroty.zlec_zwroty(
+			rejs=rejs, watki=options["watki"], na_sekunde=options["na_sekunde"]
+		)
+		maile = zwroty.wyslij_powiadomienia()
+		self.stdout.write(
+			f"Zlecone zwroty: {wynik['zlecone']}, błędy: {wynik['bledy']}, "
+			f"wysłane maile: {maile}"
+		)
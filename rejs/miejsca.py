@@ -0,0 +1,89 @@
+"""
+Limit miejsc na rejsie i lista rezerwowa.
+
+Liczba zajętych miejsc jest trzymana w ``Rejs.zajete_miejsca`` i zmieniana
+pojedynczym warunkowym UPDATE-em, więc przy otwarciu rekrutacji zgłoszenia
+nie liczą ``COUNT(*)`` po tabeli zgłoszeń, a limit nie może zostać
+przekroczony przez równoległe żądania.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Rejs, Zgloszenie
+
+STATUSY_BEZ_MIEJSCA = (Zgloszenie.STATUS_REZERWOWA, Zgloszenie.STATUS_ODRZUCONE)
+
+
+def zajmuje_miejsce(status):
+	return status not in STATUSY_BEZ_MIEJSCA
+
+
+def zajmij_miejsce(rejs_id):
+	"""Zajmuje miejsce, jeśli jest wolne. Zwraca True, gdy się udało."""
+	return bool(
+		Rejs.objects
+		.filter(pk=rejs_id)
+		.filter(
+			Q(liczba_miejsc__isnull=True) | Q(zajete_miejsca__lt=F("liczba_miejsc"))
+		)
+		.update(zajete_miejsca=F("zajete_miejsca") + 1)
+	)
+
+
+def dodaj_miejsce(rejs_id):
+	"""Zajmuje miejsce bez sprawdzania limitu (decyzja obsługi w panelu)."""
+	Rejs.objects.filter(pk=rejs_id).update(zajete_miejsca=F("zajete_miejsca") + 1)
+
+
+def odejmij_miejsce(rejs_id):
+	Rejs.objects.filter(pk=rejs_id, zajete_miejsca__gt=0).update(
+		zajete_miejsca=F("zajete_miejsca") - 1
+	)
+
+
+def zwolnij_miejsce(rejs_id):
+	"""
+	Zwalnia miejsce i od razu oddaje je pierwszym osobom z listy rezerwowej.
+
+	Obie operacje są w jednej transakcji, więc zwolnionego miejsca nie
+	przechwyci w międzyczasie nowe zgłoszenie z formularza.
+	"""
+	with transaction.atomic():
+		odejmij_miejsce(rejs_id)
+		return uzupelnij_z_listy_rezerwowej(rejs_id)
+
+
+def uzupelnij_z_listy_rezerwowej(rejs_id):
+	"""Przenosi osoby z listy rezerwowej (w kolejności zgłoszeń) na wolne miejsca."""
+	awansowani = []
+	with transaction.atomic():
+		lista = (
+			Zgloszenie.objects
+			.select_for_update()
+			.filter(rejs_id=rejs_id, status=Zgloszenie.STATUS_REZERWOWA)
+			.order_by("data_zgloszenia", "id")
+		)
+		for zgl in lista:
+			if not zajmij_miejsce(rejs_id):
+				break
+			zgl.status = Zgloszenie.STATUS_NIEZAKWALIFIKOWANY
+			zgl._miejsce_przydzielone = True
+			zgl.save(update_fields=["status"])
+			awansowani.append(zgl)
+	return awansowani
+
+
+def przelicz_miejsca(rejsy):
+	"""Odtwarza liczniki zajętych miejsc z tabeli zgłoszeń (jedno UPDATE)."""
+	zajmujace = (
+		Zgloszenie.objects
+		.filter(rejs=OuterRef("pk"))
+		.exclude(status__in=STATUSY_BEZ_MIEJSCA)
+		.order_by()
+		.values("rejs")
+		.annotate(liczba=Count("pk"))
+		.values("liczba")
+	)
+	return rejsy.update(zajete_miejsca=Coalesce(Subquery(zajmujace), 0))
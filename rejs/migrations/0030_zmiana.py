@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0029_alter_zgloszenie_adres_alter_zgloszenie_kod_pocztowy_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Zmiana',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID',
+                )),
+                ('model', models.CharField(max_length=30)),
+                ('obiekt_id', models.BigIntegerField()),
+                ('operacja', models.CharField(
+                    choices=[('zapis', 'zapis'), ('usuniecie', 'usunięcie')],
+                    max_length=10,
+                )),
+                ('data', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Zmiana',
+                'verbose_name_plural': 'Zmiany',
+            },
+        ),
+    ]
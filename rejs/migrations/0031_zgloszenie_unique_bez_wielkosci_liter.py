@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:38
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def sprawdz_duplikaty(apps, schema_editor):
+    Zgloszenie = apps.get_model("rejs", "Zgloszenie")
+
+    klucze = (
+        Zgloszenie.objects.annotate(
+            imie_m=Lower("imie"), nazwisko_m=Lower("nazwisko"), email_m=Lower("email")
+        )
+        .values("rejs", "imie_m", "nazwisko_m", "email_m")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    duplikaty = []
+    for klucz in klucze:
+        zgloszenia = Zgloszenie.objects.filter(
+            rejs=klucz["rejs"],
+            imie__iexact=klucz["imie_m"],
+            nazwisko__iexact=klucz["nazwisko_m"],
+            email__iexact=klucz["email_m"],
+        ).order_by("id")
+        opisy = [f"#{z.id} {z.imie} {z.nazwisko} <{z.email}>" for z in zgloszenia]
+        duplikaty.append(f"rejs {klucz['rejs']}: " + ", ".join(opisy))
+    if duplikaty:
+        # zgłoszenia mogą mieć wpłaty i dane - scalanie zostawiamy organizatorowi
+        raise RuntimeError(
+            "Przed migracją scal albo usuń zgłoszenia różniące się tylko wielkością "
+            "liter:\n" + "\n".join(duplikaty)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0030_zmiana'),
+    ]
+
+    operations = [
+        migrations.RunPython(sprawdz_duplikaty, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='zgloszenie',
+            name='unique_zgloszenie_na_rejs_dla_osoby',
+        ),
+        migrations.AddConstraint(
+            model_name='zgloszenie',
+            constraint=models.UniqueConstraint(
+                models.F('rejs'),
+                django.db.models.functions.text.Lower('imie'),
+                django.db.models.functions.text.Lower('nazwisko'),
+                django.db.models.functions.text.Lower('email'),
+                name='unique_zgloszenie_na_rejs_dla_osoby',
+            ),
+        ),
+    ]
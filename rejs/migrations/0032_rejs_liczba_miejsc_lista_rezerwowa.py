@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:39
+
+from django.db import migrations, models
+
+
+def przelicz_zajete_miejsca(apps, schema_editor):
+    Rejs = apps.get_model("rejs", "Rejs")
+    Zgloszenie = apps.get_model("rejs", "Zgloszenie")
+    for rejs in Rejs.objects.all():
+        rejs.zajete_miejsca = (
+            Zgloszenie.objects
+            .filter(rejs=rejs)
+            .exclude(status__in=["Lista rezerwowa", "Odrzucone"])
+            .count()
+        )
+        rejs.save(update_fields=["zajete_miejsca"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0031_zgloszenie_unique_bez_wielkosci_liter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rejs',
+            name='liczba_miejsc',
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text=(
+                    'Puste = bez limitu. Po zajęciu wszystkich miejsc kolejne '
+                    'zgłoszenia trafiają na listę rezerwową.'
+                ),
+                null=True,
+                verbose_name='liczba miejsc',
+            ),
+        ),
+        migrations.AddField(
+            model_name='rejs',
+            name='zajete_miejsca',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name='zajęte miejsca'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='zgloszenie',
+            name='status',
+            field=models.CharField(
+                choices=[
+                    ('Niezakwalifikowany', 'Niezakwalifikowany'),
+                    ('Zakwalifikowany', 'Zakwalifikowany'),
+                    ('Odrzucone', 'Odrzucone'),
+                    ('Lista rezerwowa', 'Lista rezerwowa'),
+                ],
+                default='Niezakwalifikowany',
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(przelicz_zajete_miejsca, migrations.RunPython.noop),
+    ]
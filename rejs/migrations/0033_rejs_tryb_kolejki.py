@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0032_rejs_liczba_miejsc_lista_rezerwowa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rejs',
+            name='tryb_kolejki',
+            field=models.BooleanField(
+                default=False,
+                help_text=(
+                    'Na czas otwarcia popularnej rekrutacji: zgłoszenia trafiają '
+                    'do kolejki i są zapisywane partiami przez komendę '
+                    'przetworz_kolejke.'
+                ),
+                verbose_name='tryb kolejki',
+            ),
+        ),
+    ]
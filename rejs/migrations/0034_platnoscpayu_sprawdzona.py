@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0033_rejs_tryb_kolejki'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='platnoscpayu',
+            name='sprawdzona',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
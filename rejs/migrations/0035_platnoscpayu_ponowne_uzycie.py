@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0034_platnoscpayu_sprawdzona'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='platnoscpayu',
+            name='redirect_uri',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='platnoscpayu',
+            name='status',
+            field=models.CharField(
+                choices=[
+                    ('NEW', 'Nowa'),
+                    ('PENDING', 'W toku'),
+                    ('COMPLETED', 'Zakończona'),
+                    ('FAILED', 'Błąd'),
+                    ('EXPIRED', 'Wygasła'),
+                ],
+                default='NEW',
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='platnoscpayu',
+            index=models.Index(
+                fields=['status', 'utworzona'], name='platnosc_status_utworzona'
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0035_platnoscpayu_ponowne_uzycie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PowiadomieniePayU',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID',
+                )),
+                ('payu_order_id', models.CharField(max_length=64)),
+                ('status_payu', models.CharField(blank=True, max_length=32)),
+                ('tresc', models.TextField()),
+                ('odebrane', models.DateTimeField(auto_now_add=True)),
+                ('przetworzone', models.DateTimeField(blank=True, null=True)),
+                ('proby', models.PositiveSmallIntegerField(default=0)),
+                ('nastepna_proba', models.DateTimeField(blank=True, null=True)),
+                ('blad', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Powiadomienie PayU',
+                'verbose_name_plural': 'Powiadomienia PayU',
+                'indexes': [
+                    models.Index(
+                        fields=['przetworzone', 'id'],
+                        name='powiadomienie_do_zrobienia',
+                    ),
+                ],
+            },
+        ),
+    ]
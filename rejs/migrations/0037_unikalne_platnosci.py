@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:50
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def sprawdz_duplikaty(apps, schema_editor):
+    PlatnoscPayU = apps.get_model("rejs", "PlatnoscPayU")
+    Wplata = apps.get_model("rejs", "Wplata")
+
+    # puste id zamówienia traktujemy jak brak - unikalność dotyczy tylko wypełnionych
+    PlatnoscPayU.objects.filter(payu_order_id="").update(payu_order_id=None)
+
+    platnosci = list(
+        PlatnoscPayU.objects.exclude(payu_order_id=None)
+        .values("payu_order_id").annotate(n=Count("id")).filter(n__gt=1)
+        .values_list("payu_order_id", flat=True)
+    )
+    wplaty = list(
+        Wplata.objects.exclude(zrodlo_id=None).exclude(zrodlo_id="")
+        .values("rodzaj", "zrodlo_id").annotate(n=Count("id")).filter(n__gt=1)
+        .values_list("rodzaj", "zrodlo_id")
+    )
+    if platnosci or wplaty:
+        # podwójnie zaksięgowanych wpłat nie usuwamy automatycznie - to decyzja księgowa
+        raise RuntimeError(
+            "Przed migracją usuń zduplikowane wpisy. "
+            f"PlatnoscPayU.payu_order_id: {platnosci}; "
+            f"Wplata (rodzaj, zrodlo_id): {wplaty}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0036_powiadomieniepayu'),
+    ]
+
+    operations = [
+        migrations.RunPython(sprawdz_duplikaty, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='platnoscpayu',
+            name='payu_order_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='wplata',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ('zrodlo_id__isnull', False),
+                    models.Q(('zrodlo_id', ''), _negated=True),
+                ),
+                fields=('rodzaj', 'zrodlo_id'),
+                name='unique_wplata_zrodlo',
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0037_unikalne_platnosci'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rejs',
+            name='odwolany',
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name='rejs odwołany'
+            ),
+        ),
+        migrations.CreateModel(
+            name='ZwrotPayU',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID',
+                )),
+                ('status', models.CharField(
+                    choices=[
+                        ('oczekuje', 'Oczekuje'),
+                        ('zlecany', 'W trakcie zlecania'),
+                        ('zlecony', 'Zlecony w PayU'),
+                        ('blad', 'Błąd'),
+                    ],
+                    default='oczekuje',
+                    max_length=20,
+                )),
+                ('refund_id', models.CharField(blank=True, max_length=64)),
+                ('powiadomiony', models.BooleanField(default=False)),
+                ('proby', models.PositiveSmallIntegerField(default=0)),
+                ('blad', models.TextField(blank=True)),
+                ('utworzony', models.DateTimeField(auto_now_add=True)),
+                ('platnosc', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='zwrot',
+                    to='rejs.platnoscpayu',
+                )),
+                ('wplata', models.OneToOneField(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='zwrot_payu',
+                    to='rejs.wplata',
+                )),
+            ],
+            options={
+                'verbose_name': 'Zwrot PayU',
+                'verbose_name_plural': 'Zwroty PayU',
+            },
+        ),
+    ]
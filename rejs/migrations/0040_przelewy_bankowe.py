@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0039_platnosc_wazna_do'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrzelewBankowy',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID',
+                )),
+                ('id_transakcji', models.CharField(max_length=64, unique=True)),
+                ('data', models.DateField()),
+                ('kwota', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('tytul', models.TextField(blank=True, verbose_name='tytuł')),
+                ('nadawca', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(
+                    choices=[
+                        ('zaksiegowany', 'Zaksięgowany'),
+                        ('do_sprawdzenia', 'Do sprawdzenia'),
+                        ('pominiety', 'Pominięty'),
+                    ],
+                    default='do_sprawdzenia',
+                    max_length=20,
+                )),
+                ('kandydaci', models.JSONField(
+                    blank=True, default=list, editable=False
+                )),
+                ('zaimportowany', models.DateTimeField(auto_now_add=True)),
+                ('wplata', models.OneToOneField(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='przelew',
+                    to='rejs.wplata',
+                )),
+                ('zgloszenie', models.ForeignKey(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='przelewy',
+                    to='rejs.zgloszenie',
+                )),
+            ],
+            options={
+                'verbose_name': 'Przelew bankowy',
+                'verbose_name_plural': 'Przelewy bankowe',
+            },
+        ),
+    ]
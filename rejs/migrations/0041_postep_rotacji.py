@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0040_przelewy_bankowe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostepRotacji',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID',
+                )),
+                ('model', models.CharField(max_length=50)),
+                ('klucz', models.CharField(max_length=16)),
+                ('ostatnie_id', models.BigIntegerField(default=0)),
+                ('przetworzone', models.PositiveIntegerField(default=0)),
+                ('zakonczona', models.DateTimeField(blank=True, null=True)),
+                ('zmieniony', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Postęp rotacji klucza',
+                'verbose_name_plural': 'Postęp rotacji kluczy',
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('model', 'klucz'), name='unique_postep_rotacji'
+                    ),
+                ],
+            },
+        ),
+    ]
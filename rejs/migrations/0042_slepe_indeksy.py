@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:06
+
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def indeks_slepy(rodzaj, wartosc):
+    # kopia rejs.models.indeks_slepy z chwili tej migracji
+    if not wartosc:
+        return ""
+    znormalizowana = re.sub(r"[\s-]", "", wartosc).upper()
+    return hmac.new(
+        settings.DJANGO_BLIND_INDEX_KEY.encode(),
+        f"{rodzaj}:{znormalizowana}".encode(),
+        hashlib.sha256,
+    ).hexdigest()[:32]
+
+
+def uzupelnij_indeksy(apps, schema_editor):
+    Dane_Dodatkowe = apps.get_model("rejs", "Dane_Dodatkowe")
+    partia = []
+    dane_dodatkowe = Dane_Dodatkowe.objects.only("pk", "poz1", "poz3")
+    for dane in dane_dodatkowe.iterator(chunk_size=500):
+        dane.poz1_indeks = indeks_slepy("pesel", dane.poz1)
+        dane.poz3_indeks = indeks_slepy("dokument", dane.poz3)
+        partia.append(dane)
+        if len(partia) == 500:
+            Dane_Dodatkowe.objects.bulk_update(partia, ["poz1_indeks", "poz3_indeks"])
+            partia = []
+    Dane_Dodatkowe.objects.bulk_update(partia, ["poz1_indeks", "poz3_indeks"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0041_postep_rotacji'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='poz1_indeks',
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=32
+            ),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='poz3_indeks',
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=32
+            ),
+        ),
+        migrations.RunPython(uzupelnij_indeksy, migrations.RunPython.noop),
+    ]
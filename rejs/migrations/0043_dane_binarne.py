@@ -0,0 +1,180 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:10
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+import rejs.models
+
+POLA = ["poz1", "poz2", "poz3", "pos4", "pos5"]
+
+
+def na_bajty(apps, schema_editor):
+    """Tokeny Fernet z kolumn tekstowych jako surowe bajty - bez odszyfrowania."""
+    from rejs.szyfry import token_na_bajty
+
+    Dane_Dodatkowe = apps.get_model("rejs", "Dane_Dodatkowe")
+    surowe = {f"{pole}_tekst": Cast(pole, models.TextField()) for pole in POLA}
+    partia = []
+    wiersze = Dane_Dodatkowe.objects.annotate(**surowe).values_list("pk", *surowe)
+    for pk, *tokeny in wiersze.iterator(chunk_size=500):
+        dane = Dane_Dodatkowe(pk=pk)
+        for pole, token in zip(POLA, tokeny):
+            setattr(dane, f"{pole}_bin", token_na_bajty(token))
+        partia.append(dane)
+        if len(partia) == 500:
+            Dane_Dodatkowe.objects.bulk_update(partia, [f"{pole}_bin" for pole in POLA])
+            partia = []
+    Dane_Dodatkowe.objects.bulk_update(partia, [f"{pole}_bin" for pole in POLA])
+
+
+def na_tekst(apps, schema_editor):
+    """Cofnięcie: odszyfrowane wartości zapisane z powrotem przez EncryptedTextField."""
+    from rejs.szyfry import odszyfruj
+
+    Dane_Dodatkowe = apps.get_model("rejs", "Dane_Dodatkowe")
+    partia = []
+    wiersze = Dane_Dodatkowe.objects.only("pk", *(f"{pole}_bin" for pole in POLA))
+    for dane in wiersze.iterator(chunk_size=500):
+        for pole in POLA:
+            setattr(dane, pole, odszyfruj(getattr(dane, f"{pole}_bin")))
+        partia.append(dane)
+        if len(partia) == 500:
+            Dane_Dodatkowe.objects.bulk_update(partia, POLA)
+            partia = []
+    Dane_Dodatkowe.objects.bulk_update(partia, POLA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0042_slepe_indeksy'),
+    ]
+
+    operations = [
+        # domyślną wartością była krotka, której pole nie umiało zaszyfrować
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='poz2',
+            field=rejs.models.EncryptedTextField(
+                choices=[
+                    ('paszport', 'paszport'),
+                    ('dowod-osobisty', 'dowód osobisty'),
+                ],
+                default='paszport',
+                max_length=14,
+                verbose_name='typ dokumentu',
+            ),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='pos4_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='pos5_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='poz1_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='poz2_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dane_dodatkowe',
+            name='poz3_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(na_bajty, na_tekst),
+        migrations.RemoveField(
+            model_name='dane_dodatkowe',
+            name='pos4',
+        ),
+        migrations.RenameField(
+            model_name='dane_dodatkowe',
+            old_name='pos4_bin',
+            new_name='pos4',
+        ),
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='pos4',
+            field=rejs.models.EncryptedBinaryField(
+                default='', max_length=100, verbose_name='miejsce urodzenia'
+            ),
+        ),
+        migrations.RemoveField(
+            model_name='dane_dodatkowe',
+            name='pos5',
+        ),
+        migrations.RenameField(
+            model_name='dane_dodatkowe',
+            old_name='pos5_bin',
+            new_name='pos5',
+        ),
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='pos5',
+            field=rejs.models.EncryptedBinaryField(
+                default='', max_length=50, verbose_name='obywatelstwo'
+            ),
+        ),
+        migrations.RemoveField(
+            model_name='dane_dodatkowe',
+            name='poz1',
+        ),
+        migrations.RenameField(
+            model_name='dane_dodatkowe',
+            old_name='poz1_bin',
+            new_name='poz1',
+        ),
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='poz1',
+            field=rejs.models.EncryptedBinaryField(
+                default='12345678900', max_length=13, verbose_name='pesel'
+            ),
+        ),
+        migrations.RemoveField(
+            model_name='dane_dodatkowe',
+            name='poz2',
+        ),
+        migrations.RenameField(
+            model_name='dane_dodatkowe',
+            old_name='poz2_bin',
+            new_name='poz2',
+        ),
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='poz2',
+            field=rejs.models.EncryptedBinaryField(
+                choices=[
+                    ('paszport', 'paszport'),
+                    ('dowod-osobisty', 'dowód osobisty'),
+                ],
+                default='paszport',
+                max_length=14,
+                verbose_name='typ dokumentu',
+            ),
+        ),
+        migrations.RemoveField(
+            model_name='dane_dodatkowe',
+            name='poz3',
+        ),
+        migrations.RenameField(
+            model_name='dane_dodatkowe',
+            old_name='poz3_bin',
+            new_name='poz3',
+        ),
+        migrations.AlterField(
+            model_name='dane_dodatkowe',
+            name='poz3',
+            field=rejs.models.EncryptedBinaryField(
+                default='ABC123', verbose_name='numer dokumentu'
+            ),
+        ),
+    ]
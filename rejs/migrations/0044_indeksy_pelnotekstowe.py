@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def utworz(apps, schema_editor):
+    """Indeksy GIN pod wyszukiwanie pełnotekstowe - tylko na PostgreSQL."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from django.contrib.postgres.indexes import GinIndex
+
+    from rejs.postgres import PELNOTEKSTOWE, wektor
+
+    for model, pola, nazwa in PELNOTEKSTOWE:
+        schema_editor.add_index(
+            apps.get_model("rejs", model), GinIndex(wektor(pola), name=nazwa)
+        )
+
+
+def usun(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from django.contrib.postgres.indexes import GinIndex
+
+    from rejs.postgres import PELNOTEKSTOWE, wektor
+
+    for model, pola, nazwa in PELNOTEKSTOWE:
+        schema_editor.remove_index(
+            apps.get_model("rejs", model), GinIndex(wektor(pola), name=nazwa)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0043_dane_binarne'),
+    ]
+
+    operations = [
+        migrations.RunPython(utworz, usun),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0044_indeksy_pelnotekstowe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rejs',
+            index=models.Index(
+                condition=models.Q(('aktywna_rekrutacja', True)),
+                fields=['od'],
+                name='rejs_rekrutacja_od',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='wplata',
+            index=models.Index(
+                fields=['zgloszenie', 'rodzaj', 'kwota'],
+                name='wplata_zgloszenie_rodzaj',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='zgloszenie',
+            index=models.Index(
+                fields=['rejs', 'status'], name='zgloszenie_rejs_status'
+            ),
+        ),
+    ]
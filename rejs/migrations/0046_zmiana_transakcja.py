@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rejs', '0045_indeksy_goracych_zapytan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zmiana',
+            name='transakcja',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='zmiana',
+            index=models.Index(fields=['transakcja', 'id'], name='zmiana_kolejnosc'),
+        ),
+    ]
@@ -1,28 +1,109 @@
 import datetime
+import hashlib
+import hmac
+import re
 import uuid
 import base64
 from decimal import Decimal
 from django.db import models
-from django.db.models import Case, Sum, When
+from django.db.models import (
+	Case,
+	DecimalField,
+	ExpressionWrapper,
+	F,
+	Q,
+	Sum,
+	Value,
+	When,
+)
+from django.db.models.functions import Coalesce, Lower
 from django.forms import ValidationError
 from django.urls import reverse
-from cryptography.fernet import Fernet
 from django.conf import settings
+from django import forms
 from datetime import date
 
+from .szyfry import odszyfruj, pierscien_kluczy, szyfruj
+
+
+def indeks_slepy(rodzaj, wartosc):
+	"""
+	HMAC znormalizowanej wartości (bez spacji i myślników, wielkie litery).
+
+	Zapisywany obok szyfrogramu pozwala szukać równych wartości po indeksie,
+	bez odszyfrowywania wierszy. ``rodzaj`` rozdziela indeksy różnych pól.
+	"""
+	if not wartosc:
+		return ""
+	znormalizowana = re.sub(r"[\s-]", "", wartosc).upper()
+	return hmac.new(
+		settings.DJANGO_BLIND_INDEX_KEY.encode(),
+		f"{rodzaj}:{znormalizowana}".encode(),
+		hashlib.sha256,
+	).hexdigest()[:32]
 
-fernet = Fernet(settings.DJANGO_FIELD_ENCRYPTION_KEY.encode())
 
 class EncryptedTextField(models.TextField):
+	"""Token Fernet jako tekst - format sprzed EncryptedBinaryField.
+
+	Zostaje dla migracji.
+	"""
+
+	def from_db_value(self, value, expression, connection):
+		if value is None:
+			return value
+		return pierscien_kluczy().decrypt(value.encode()).decode()
+
+	def get_prep_value(self, value):
+		if value is None:
+			return value
+		return pierscien_kluczy().encrypt(value.encode()).decode()
+
+
+class EncryptedBinaryField(models.BinaryField):
+	"""
+	Tekst zaszyfrowany szyfrem z DJANGO_FIELD_CIPHER, zapisany jako surowe bajty.
+
+	W Pythonie i w formularzach zachowuje się jak TextField; w bazie trzyma
+	bajty z prefiksem szyfru (rejs.szyfry), o około jedną trzecią krótsze od
+	tokenu base64 w EncryptedTextField.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		kwargs.setdefault("editable", True)
+		super().__init__(*args, **kwargs)
+
+	def _check_str_default_value(self):
+		# domyślna wartość to tekst jawny, szyfrowany przy zapisie
+		return []
+
+	def deconstruct(self):
+		name, path, args, kwargs = super().deconstruct()
+		kwargs.pop("editable", None)
+		return name, path, args, kwargs
+
 	def from_db_value(self, value, expression, connection):
 		if value is None:
 			return value
-		return fernet.decrypt(value.encode()).decode()
+		return odszyfruj(value)
+
+	def to_python(self, value):
+		return value
 
 	def get_prep_value(self, value):
 		if value is None:
 			return value
-		return fernet.encrypt(value.encode()).decode()
+		return szyfruj(value)
+
+	def value_to_string(self, obj):
+		return self.value_from_object(obj)
+
+	def formfield(self, **kwargs):
+		return super().formfield(**{
+			"max_length": self.max_length,
+			**({} if self.choices is not None else {"widget": forms.Textarea}),
+			**kwargs,
+		})
 
 
 class Rejs(models.Model):
@@ -39,6 +120,31 @@ class Rejs(models.Model):
 	zaliczka = models.DecimalField(default=500, max_digits=10, decimal_places=2)
 	opis = models.TextField(default="tutaj opis rejsu", blank=False, null=False)
 	aktywna_rekrutacja = models.BooleanField(default=True, verbose_name="aktywna rekrutacja")
+	liczba_miejsc = models.PositiveIntegerField(
+		null=True,
+		blank=True,
+		verbose_name="liczba miejsc",
+		help_text=(
+			"Puste = bez limitu. Po zajęciu wszystkich miejsc kolejne zgłoszenia "
+			"trafiają na listę rezerwową."
+		),
+	)
+	zajete_miejsca = models.PositiveIntegerField(
+		default=0, editable=False, verbose_name="zajęte miejsca"
+	)
+	tryb_kolejki = models.BooleanField(
+		default=False,
+		verbose_name="tryb kolejki",
+		help_text=(
+			"Na czas otwarcia popularnej rekrutacji: zgłoszenia trafiają do "
+			"kolejki i są zapisywane partiami przez komendę przetworz_kolejke."
+		),
+	)
+	odwolany = models.BooleanField(
+		default=False,
+		editable=False,
+		verbose_name="rejs odwołany",
+	)
 
 	def __str__(self) -> str:
 		return self.nazwa
@@ -47,6 +153,17 @@ class Rejs(models.Model):
 	def reszta_do_zaplaty(self):
 		return self.cena - self.zaliczka
 
+	def save(self, *args, **kwargs):
+		# licznik zajętych miejsc zmieniają tylko atomowe UPDATE-y (rejs/miejsca.py),
+		# zwykły zapis nie może go nadpisać nieaktualną wartością
+		if not self._state.adding and kwargs.get("update_fields") is None:
+			kwargs["update_fields"] = [
+				f.name
+				for f in self._meta.concrete_fields
+				if not f.primary_key and f.name != "zajete_miejsca"
+			]
+		super().save(*args, **kwargs)
+
 	def clean(self):
 		super().clean()
 		if self.od and self.do and self.od > self.do:
@@ -58,6 +175,16 @@ class Rejs(models.Model):
 	class Meta:
 		verbose_name = "Rejs"
 		verbose_name_plural = "Rejsy"
+		indexes = [
+			# lista rejsów z otwartą rekrutacją na stronie głównej; indeks częściowy, bo
+			# Django pisze filtr jako "WHERE aktywna_rekrutacja", którego SQLite nie
+			# dopasuje do indeksu złożonego (aktywna_rekrutacja, od)
+			models.Index(
+				fields=["od"],
+				condition=Q(aktywna_rekrutacja=True),
+				name="rejs_rekrutacja_od",
+			),
+		]
 
 
 class Wachta(models.Model):
@@ -72,14 +199,65 @@ class Wachta(models.Model):
 		return f"Wachta {self.nazwa} - {self.rejs}"
 
 
+class ZgloszenieQuerySet(models.QuerySet):
+	def duplikaty(self, rejs, imie, nazwisko, email):
+		"""
+		Zgłoszenia tej samej osoby na rejs, bez rozróżniania wielkości liter.
+
+		Używa tych samych wyrażeń co ograniczenie
+		unique_zgloszenie_na_rejs_dla_osoby, więc zapytanie obsługuje jego indeks.
+		"""
+		return self.alias(
+			imie_lower=Lower("imie"),
+			nazwisko_lower=Lower("nazwisko"),
+			email_lower=Lower("email"),
+		).filter(
+			rejs=rejs,
+			imie_lower=Lower(Value(imie)),
+			nazwisko_lower=Lower(Value(nazwisko)),
+			email_lower=Lower(Value(email)),
+		)
+
+	def z_saldem(self):
+		"""
+		Dodaje ``wplacono`` (wpłaty minus zwroty) i ``pozostalo`` (cena rejsu minus
+		wpłacono) - te same wartości co ``suma_wplat`` i ``do_zaplaty``, ale dla
+		wszystkich zgłoszeń jednym zapytaniem.
+		"""
+		kwota = DecimalField(max_digits=10, decimal_places=2)
+		return self.annotate(
+			wplacono=Coalesce(
+				Sum(
+					Case(
+						When(
+							wplaty__rodzaj__in=["wplata", "payu"],
+							then=F("wplaty__kwota"),
+						),
+						When(wplaty__rodzaj="zwrot", then=-F("wplaty__kwota")),
+						default=Value(Decimal("0")),
+						output_field=kwota,
+					)
+				),
+				Value(Decimal("0")),
+				output_field=kwota,
+			),
+		).annotate(
+			pozostalo=ExpressionWrapper(
+				F("rejs__cena") - F("wplacono"), output_field=kwota
+			),
+		)
+
+
 class Zgloszenie(models.Model):
 	STATUS_ZAKWALIFIKOWANY = "Zakwalifikowany"
 	STATUS_NIEZAKWALIFIKOWANY = "Niezakwalifikowany"
 	STATUS_ODRZUCONE = "Odrzucone"
+	STATUS_REZERWOWA = "Lista rezerwowa"
 	statusy = [
 		(STATUS_NIEZAKWALIFIKOWANY, "Niezakwalifikowany"),
 		(STATUS_ZAKWALIFIKOWANY, "Zakwalifikowany"),
 		(STATUS_ODRZUCONE, "Odrzucone"),
+		(STATUS_REZERWOWA, "Lista rezerwowa"),
 	]
 	wzrok_statusy = [
 		("WIDZI", "widzący"),
@@ -143,6 +321,8 @@ class Zgloszenie(models.Model):
 	token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
 	data_zgloszenia = models.DateTimeField(auto_now_add=True, editable=False)
 
+	objects = ZgloszenieQuerySet.as_manager()
+
 	@property
 	def wiek(self) -> int:
 		today = date.today()
@@ -175,6 +355,18 @@ class Zgloszenie(models.Model):
 		zwroty = result["zwroty_sum"] or Decimal("0")
 		return wplaty - zwroty
 
+	@property
+	def pozycja_na_liscie_rezerwowej(self):
+		if self.status != self.STATUS_REZERWOWA:
+			return None
+		wczesniejsze = Zgloszenie.objects.filter(
+			rejs_id=self.rejs_id, status=self.STATUS_REZERWOWA
+		).filter(
+			models.Q(data_zgloszenia__lt=self.data_zgloszenia)
+			| models.Q(data_zgloszenia=self.data_zgloszenia, id__lt=self.id)
+		)
+		return wczesniejsze.count() + 1
+
 	@property
 	def rejs_cena(self):
 		return self.rejs.cena
@@ -200,10 +392,17 @@ class Zgloszenie(models.Model):
 		verbose_name_plural = "Zgłoszenia"
 		constraints = [
 			models.UniqueConstraint(
-				fields=["rejs", "imie", "nazwisko", "email"],
+				F("rejs"),
+				Lower("imie"),
+				Lower("nazwisko"),
+				Lower("email"),
 				name="unique_zgloszenie_na_rejs_dla_osoby",
 			)
 		]
+		indexes = [
+			# zgłoszenia rejsu w danym statusie (raporty, crew list, miejsca)
+			models.Index(fields=["rejs", "status"], name="zgloszenie_rejs_status"),
+		]
 
 
 
@@ -229,6 +428,21 @@ class Wplata(models.Model):
 	class Meta:
 		verbose_name = "Wpłata"
 		verbose_name_plural = "Wpłaty"
+		constraints = [
+			# ta sama płatność z zewnętrznego źródła (np. zamówienie PayU) tylko raz
+			models.UniqueConstraint(
+				fields=["rodzaj", "zrodlo_id"],
+				condition=Q(zrodlo_id__isnull=False) & ~Q(zrodlo_id=""),
+				name="unique_wplata_zrodlo",
+			),
+		]
+		indexes = [
+			# saldo zgłoszenia (suma_wplat, z_saldem) czytane z samego indeksu
+			models.Index(
+				fields=["zgloszenie", "rodzaj", "kwota"],
+				name="wplata_zgloszenie_rodzaj",
+			),
+		]
 
 	def __str__(self):
 		return f"Wpłata: {self.kwota} zł"
@@ -253,6 +467,31 @@ class Ogloszenie(models.Model):
 	def __str__(self):
 		return self.tytul
 
+class DaneDodatkoweQuerySet(models.QuerySet):
+	def po_peselu(self, pesel):
+		return self.filter(poz1_indeks=indeks_slepy("pesel", pesel))
+
+	def po_dokumencie(self, numer):
+		return self.filter(poz3_indeks=indeks_slepy("dokument", numer))
+
+	def powtorzone(self):
+		"""Dane, których PESEL albo numer dokumentu powtarza się w zgłoszeniach."""
+		def wielokrotne(pole):
+			return (
+				Dane_Dodatkowe.objects
+				.exclude(**{pole: ""})
+				.values(pole)
+				.annotate(liczba=models.Count("id"))
+				.filter(liczba__gt=1)
+				.values(pole)
+			)
+
+		return self.filter(
+			Q(poz1_indeks__in=wielokrotne("poz1_indeks"))
+			| Q(poz3_indeks__in=wielokrotne("poz3_indeks"))
+		)
+
+
 class Dane_Dodatkowe(models.Model):
 	typ_dokumentu = [
 		("paszport", "paszport"),
@@ -264,22 +503,43 @@ class Dane_Dodatkowe(models.Model):
 		on_delete=models.CASCADE,
 		related_name="dane_dodatkowe"
 	)
-	poz1 = EncryptedTextField(max_length=13,
+	poz1 = EncryptedBinaryField(max_length=13,
 						   null = False,
 						   blank=False,
 						   default="12345678900",
 						   verbose_name="pesel")
-	poz2 = EncryptedTextField(max_length=14,
+	poz2 = EncryptedBinaryField(max_length=14,
 								  choices=typ_dokumentu,
-								  default=typ_dokumentu[0],
+								  default=typ_dokumentu[0][0],
 								  verbose_name="typ dokumentu")
-	poz3 = EncryptedTextField(blank=False,
+	poz3 = EncryptedBinaryField(blank=False,
 						   null=False,
 						   default="ABC123",
 						   verbose_name="numer dokumentu")
-	pos4 = EncryptedTextField(null=False, blank=False, verbose_name="miejsce urodzenia", default="", max_length=100)
-	pos5 = EncryptedTextField(null=False, blank=False, default="", verbose_name="obywatelstwo", max_length=50)
+	pos4 = EncryptedBinaryField(
+		null=False,
+		blank=False,
+		verbose_name="miejsce urodzenia",
+		default="",
+		max_length=100,
+	)
+	pos5 = EncryptedBinaryField(
+		null=False,
+		blank=False,
+		default="",
+		verbose_name="obywatelstwo",
+		max_length=50,
+	)
 	pos6 = models.DateField(verbose_name="data ważności dokumentu", max_length=10, null=False, blank=False)
+	# ślepe indeksy poz1 i poz3 (indeks_slepy), liczone przy zapisie
+	poz1_indeks = models.CharField(
+		max_length=32, blank=True, editable=False, db_index=True
+	)
+	poz3_indeks = models.CharField(
+		max_length=32, blank=True, editable=False, db_index=True
+	)
+
+	objects = DaneDodatkoweQuerySet.as_manager()
 
 	class Meta:
 		verbose_name = "dane dodatkowe"
@@ -291,6 +551,19 @@ class Dane_Dodatkowe(models.Model):
 	def __str__(self) -> str:
 		return f"dane dodatkowe dla zgłoszenia: {self.zgloszenie_id}"
 
+	def save(self, *args, **kwargs):
+		self.poz1_indeks = indeks_slepy("pesel", self.poz1)
+		self.poz3_indeks = indeks_slepy("dokument", self.poz3)
+		update_fields = kwargs.get("update_fields")
+		if update_fields is not None:
+			update_fields = set(update_fields)
+			if "poz1" in update_fields:
+				update_fields.add("poz1_indeks")
+			if "poz3" in update_fields:
+				update_fields.add("poz3_indeks")
+			kwargs["update_fields"] = update_fields
+		super().save(*args, **kwargs)
+
 	@property
 	def masked_pesel(self):
 		result = self.poz1[:2] + ("*" * (len(self.poz1) - 3)) + self.poz1[len(self.poz1) - 1]
@@ -307,12 +580,14 @@ class PlatnoscPayU(models.Model):
 	STATUS_PENDING = "PENDING"
 	STATUS_COMPLETED = "COMPLETED"
 	STATUS_FAILED = "FAILED"
+	STATUS_EXPIRED = "EXPIRED"
 
 	STATUS_CHOICES = [
 		(STATUS_NEW, "Nowa"),
 		(STATUS_PENDING, "W toku"),
 		(STATUS_COMPLETED, "Zakończona"),
 		(STATUS_FAILED, "Błąd"),
+		(STATUS_EXPIRED, "Wygasła"),
 	]
 
 	TYP_CHOICES = [
@@ -326,7 +601,9 @@ class PlatnoscPayU(models.Model):
 		related_name="platnosci_payu",
 	)
 
-	payu_order_id = models.CharField(max_length=64, blank=True, null=True)
+	payu_order_id = models.CharField(max_length=64, blank=True, null=True, unique=True)
+	# link do strony płatności PayU, ponownie używany przy kolejnym kliknięciu
+	redirect_uri = models.URLField(max_length=500, blank=True)
 	kwota = models.DecimalField(max_digits=10, decimal_places=2)
 	typ = models.CharField(max_length=20, choices=TYP_CHOICES)
 	status = models.CharField(
@@ -335,6 +612,197 @@ class PlatnoscPayU(models.Model):
 		default=STATUS_NEW,
 	)
 	utworzona = models.DateTimeField(auto_now_add=True)
+	# ostatnie pytanie PayU o status (rejs/platnosci.py)
+	sprawdzona = models.DateTimeField(null=True, blank=True, editable=False)
+	# ważność linku wysłanego mailem (rejs/przypomnienia.py);
+	# puste = ORDER_VALIDITY od utworzenia
+	wazna_do = models.DateTimeField(null=True, blank=True, editable=False)
+
+	class Meta:
+		indexes = [
+			# wygasanie porzuconych płatności (komenda wygas_platnosci)
+			models.Index(
+				fields=["status", "utworzona"], name="platnosc_status_utworzona"
+			),
+		]
 
 	def __str__(self):
 		return f"{self.zgloszenie} – {self.typ} – {self.kwota} PLN"
+
+
+class ZwrotPayU(models.Model):
+	"""Zwrot płatności PayU po odwołaniu rejsu (rejs/zwroty.py)."""
+
+	STATUS_OCZEKUJE = "oczekuje"
+	# zapytanie do PayU wysłane, odpowiedź nieznana - przy wznowieniu sprawdzamy w PayU
+	STATUS_ZLECANY = "zlecany"
+	STATUS_ZLECONY = "zlecony"
+	STATUS_BLAD = "blad"
+
+	STATUS_CHOICES = [
+		(STATUS_OCZEKUJE, "Oczekuje"),
+		(STATUS_ZLECANY, "W trakcie zlecania"),
+		(STATUS_ZLECONY, "Zlecony w PayU"),
+		(STATUS_BLAD, "Błąd"),
+	]
+
+	platnosc = models.OneToOneField(
+		PlatnoscPayU, on_delete=models.CASCADE, related_name="zwrot"
+	)
+	status = models.CharField(
+		max_length=20, choices=STATUS_CHOICES, default=STATUS_OCZEKUJE
+	)
+	refund_id = models.CharField(max_length=64, blank=True)
+	wplata = models.OneToOneField(
+		Wplata,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name="zwrot_payu",
+	)
+	powiadomiony = models.BooleanField(default=False)
+	proby = models.PositiveSmallIntegerField(default=0)
+	blad = models.TextField(blank=True)
+	utworzony = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		verbose_name = "Zwrot PayU"
+		verbose_name_plural = "Zwroty PayU"
+
+	def __str__(self):
+		return f"Zwrot {self.platnosc} – {self.get_status_display()}"
+
+	@property
+	def ext_refund_id(self):
+		# stały identyfikator zwrotu po naszej stronie - PayU nie przyjmie go dwa razy
+		return f"zwrot-{self.platnosc_id}"
+
+
+class PrzelewBankowy(models.Model):
+	"""Wpływ z wyciągu bankowego (rejs/wyciagi.py) i kolejka do ręcznego przypisania."""
+
+	STATUS_ZAKSIEGOWANY = "zaksiegowany"
+	STATUS_DO_SPRAWDZENIA = "do_sprawdzenia"
+	STATUS_POMINIETY = "pominiety"
+
+	STATUS_CHOICES = [
+		(STATUS_ZAKSIEGOWANY, "Zaksięgowany"),
+		(STATUS_DO_SPRAWDZENIA, "Do sprawdzenia"),
+		(STATUS_POMINIETY, "Pominięty"),
+	]
+
+	# identyfikator z banku albo skrót treści linii -
+	# ten sam wyciąg nie wejdzie dwa razy
+	id_transakcji = models.CharField(max_length=64, unique=True)
+	data = models.DateField()
+	kwota = models.DecimalField(max_digits=10, decimal_places=2)
+	tytul = models.TextField(blank=True, verbose_name="tytuł")
+	nadawca = models.CharField(max_length=255, blank=True)
+	status = models.CharField(
+		max_length=20, choices=STATUS_CHOICES, default=STATUS_DO_SPRAWDZENIA
+	)
+	zgloszenie = models.ForeignKey(
+		Zgloszenie,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name="przelewy",
+	)
+	# id zgłoszeń pasujących do przelewu, gdy dopasowanie nie było jednoznaczne
+	kandydaci = models.JSONField(default=list, blank=True, editable=False)
+	wplata = models.OneToOneField(
+		Wplata, on_delete=models.SET_NULL, null=True, blank=True, related_name="przelew"
+	)
+	zaimportowany = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		verbose_name = "Przelew bankowy"
+		verbose_name_plural = "Przelewy bankowe"
+
+	def __str__(self):
+		return f"{self.data} – {self.kwota} zł – {self.nadawca}"
+
+
+class PostepRotacji(models.Model):
+	"""Postęp przepisywania zaszyfrowanych pól na bieżący klucz.
+
+	Prowadzi go komenda rotuj_klucze.
+	"""
+
+	model = models.CharField(max_length=50)
+	# skrót bieżącego klucza - nowa rotacja zaczyna od początku
+	klucz = models.CharField(max_length=16)
+	ostatnie_id = models.BigIntegerField(default=0)
+	przetworzone = models.PositiveIntegerField(default=0)
+	zakonczona = models.DateTimeField(null=True, blank=True)
+	zmieniony = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name = "Postęp rotacji klucza"
+		verbose_name_plural = "Postęp rotacji kluczy"
+		constraints = [
+			models.UniqueConstraint(
+				fields=["model", "klucz"], name="unique_postep_rotacji"
+			),
+		]
+
+	def __str__(self):
+		return f"{self.model} – do id {self.ostatnie_id}"
+
+
+class PowiadomieniePayU(models.Model):
+	"""Powiadomienie z PayU czekające na przetworzenie (rejs/powiadomienia.py)."""
+
+	payu_order_id = models.CharField(max_length=64)
+	status_payu = models.CharField(max_length=32, blank=True)
+	tresc = models.TextField()
+	odebrane = models.DateTimeField(auto_now_add=True)
+	przetworzone = models.DateTimeField(null=True, blank=True)
+	proby = models.PositiveSmallIntegerField(default=0)
+	nastepna_proba = models.DateTimeField(null=True, blank=True)
+	blad = models.TextField(blank=True)
+
+	class Meta:
+		verbose_name = "Powiadomienie PayU"
+		verbose_name_plural = "Powiadomienia PayU"
+		indexes = [
+			models.Index(
+				fields=["przetworzone", "id"], name="powiadomienie_do_zrobienia"
+			),
+		]
+
+	def __str__(self):
+		return f"{self.payu_order_id} – {self.status_payu}"
+
+
+class Zmiana(models.Model):
+	"""Wpis dziennika zmian, z którego czyta kanał zmian (rejs/zmiany.py).
+
+	Kolejność wpisów wyznacza para (``transakcja``, ``id``), więc odczyt „od
+	kursora” to zakres po indeksie - koszt zależy od liczby zmian, a nie
+	rozmiaru tabel. ``transakcja`` to identyfikator transakcji PostgreSQL,
+	na SQLite zawsze 0.
+	"""
+
+	OPERACJA_ZAPIS = "zapis"
+	OPERACJA_USUNIECIE = "usuniecie"
+	operacje = [
+		(OPERACJA_ZAPIS, "zapis"),
+		(OPERACJA_USUNIECIE, "usunięcie"),
+	]
+
+	model = models.CharField(max_length=30)
+	obiekt_id = models.BigIntegerField()
+	operacja = models.CharField(max_length=10, choices=operacje)
+	data = models.DateTimeField(auto_now_add=True)
+	transakcja = models.BigIntegerField(default=0, editable=False)
+
+	class Meta:
+		verbose_name = "Zmiana"
+		verbose_name_plural = "Zmiany"
+		indexes = [
+			models.Index(fields=["transakcja", "id"], name="zmiana_kolejnosc"),
+		]
+
+	def __str__(self):
+		return f"{self.operacja} {self.model}#{self.obiekt_id}"
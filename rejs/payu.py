@@ -1,35 +1,145 @@
+import threading
+import time
+
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 PAYU_URLS = {
 	"sandbox": "https://secure.snd.payu.com",
 	"production": "https://secure.payu.com",
 }
 
+# token odnawiamy z wyprzedzeniem, żeby nie wygasł w trakcie zapytania
+ZAPAS_WAZNOSCI_TOKENU = 60
+
+_sesja = None
+_blokada_sesji = threading.Lock()
+
+# (adres, client_id) -> (token, wygasa_o)
+_tokeny: dict[tuple[str, str], tuple[str, float]] = {}
+_blokada_tokenu = threading.Lock()
+
+
+def sesja():
+	"""
+	Wspólna dla procesu sesja HTTP z pulą połączeń do PayU.
+
+	Połączenia TLS są używane ponownie między zapytaniami. Zapytania GET są
+	powtarzane przy błędach sieci i odpowiedziach 5xx; POST tylko wtedy, gdy
+	nie udało się nawiązać połączenia, więc zamówienie nie powstanie dwa razy.
+	"""
+	global _sesja
+	if _sesja is None:
+		with _blokada_sesji:
+			if _sesja is None:
+				powtorzenia = Retry(
+					total=settings.PAYU.get("RETRIES", 2),
+					backoff_factor=settings.PAYU.get("RETRY_BACKOFF", 0.3),
+					status_forcelist=(500, 502, 503, 504),
+					allowed_methods=frozenset({"GET"}),
+					raise_on_status=False,
+				)
+				adapter = HTTPAdapter(
+					pool_connections=2,
+					pool_maxsize=settings.PAYU.get("POOL_SIZE", 10),
+					max_retries=powtorzenia,
+				)
+				s = requests.Session()
+				s.mount("https://", adapter)
+				s.mount("http://", adapter)
+				_sesja = s
+	return _sesja
+
+
+def wyczysc_pamiec():
+	"""Zamyka sesję i zapomina tokeny (testy, zmiana konfiguracji)."""
+	global _sesja
+	with _blokada_sesji:
+		if _sesja is not None:
+			_sesja.close()
+		_sesja = None
+	with _blokada_tokenu:
+		_tokeny.clear()
+
 
 class PayUClient:
 	def __init__(self):
-		self.base_url = PAYU_URLS[settings.PAYU["ENV"]]
+		if settings.PAYU["ENV"] == "local":
+			# atrapa PayU: python manage.py atrapa_payu
+			self.base_url = settings.PAYU.get("LOCAL_URL", "http://127.0.0.1:8001")
+		else:
+			self.base_url = PAYU_URLS[settings.PAYU["ENV"]]
 		self.client_id = settings.PAYU["CLIENT_ID"]
 		self.client_secret = settings.PAYU["CLIENT_SECRET"]
 		self.pos_id = settings.PAYU["POS_ID"]
+		self.timeout = settings.PAYU.get("TIMEOUT", 5)
+		self.validity = settings.PAYU.get("ORDER_VALIDITY", 1800)
+		self.session = sesja()
 
-	def get_token(self):
-		r = requests.post(
+	def _pobierz_token(self):
+		r = self.session.post(
 			f"{self.base_url}/pl/standard/user/oauth/authorize",
 			data={
 				"grant_type": "client_credentials",
 				"client_id": self.client_id,
 				"client_secret": self.client_secret,
 			},
-			timeout=5,
+			timeout=self.timeout,
 		)
 		r.raise_for_status()
-		return r.json()["access_token"]
+		dane = r.json()
+		waznosc = int(dane.get("expires_in", 0))
+		# przy bardzo krótkiej ważności nie odejmujemy więcej niż połowę
+		zapas = min(ZAPAS_WAZNOSCI_TOKENU, waznosc // 2)
+		return dane["access_token"], time.monotonic() + waznosc - zapas
+
+	def get_token(self, odrzucony=None):
+		"""
+		Token OAuth z pamięci procesu, odnawiany dopiero przed wygaśnięciem.
 
-	def create_order(self, *, kwota, opis, email, notify_url, continue_url):
+		Odnawia go jeden wątek - pozostałe czekają na blokadzie i dostają już
+		nowy token zamiast wysyłać własne zapytania. ``odrzucony`` to token,
+		na który PayU odpowiedziało 401 - odnawiany jest tylko wtedy, gdy
+		w pamięci wciąż jest ten sam.
+		"""
+		klucz = (self.base_url, self.client_id)
+		wpis = _tokeny.get(klucz)
+		if wpis and wpis[0] != odrzucony and wpis[1] > time.monotonic():
+			return wpis[0]
+
+		with _blokada_tokenu:
+			aktualny = _tokeny.get(klucz)
+			# inny wątek mógł odnowić token, gdy czekaliśmy na blokadę
+			if aktualny and aktualny[0] != odrzucony and aktualny[1] > time.monotonic():
+				return aktualny[0]
+			_tokeny[klucz] = self._pobierz_token()
+			return _tokeny[klucz][0]
+
+	def _zapytanie(self, metoda, sciezka, **kwargs):
+		naglowki = kwargs.pop("headers", {})
 		token = self.get_token()
+		for proba in range(2):
+			r = self.session.request(
+				metoda,
+				f"{self.base_url}{sciezka}",
+				headers={**naglowki, "Authorization": f"Bearer {token}"},
+				timeout=self.timeout,
+				**kwargs,
+			)
+			# token unieważniony po stronie PayU - pobieramy nowy
+			# i próbujemy raz jeszcze
+			if r.status_code == 401 and proba == 0:
+				token = self.get_token(odrzucony=token)
+				continue
+			break
+		r.raise_for_status()
+		return r.json()
 
+	def create_order(
+		self, *, kwota, opis, email, notify_url, continue_url, waznosc=None
+	):
 		data = {
 			"notifyUrl": notify_url,
 			"continueUrl": continue_url,
@@ -37,6 +147,8 @@ class PayUClient:
 			"merchantPosId": self.pos_id,
 			"description": opis,
 			"currencyCode": "PLN",
+			# po tym czasie PayU anuluje zamówienie, a my je wygaszamy
+			"validityTime": waznosc or self.validity,
 			"totalAmount": int(kwota * 100),
 			"buyer": {
 				"email": email,
@@ -50,32 +162,44 @@ class PayUClient:
 			],
 		}
 
-		r = requests.post(
-			f"{self.base_url}/api/v2_1/orders",
+		return self._zapytanie(
+			"POST",
+			"/api/v2_1/orders",
 			json=data,
 			headers={
-				"Authorization": f"Bearer {token}",
 				"Content-Type": "application/json",
 				"Accept": "application/json",
 			},
 			allow_redirects=False,
-			timeout=5,
 		)
 
-		r.raise_for_status()
-		return r.json()
-
 	def get_order(self, order_id):
-		token = self.get_token()
+		return self._zapytanie(
+			"GET",
+			f"/api/v2_1/orders/{order_id}",
+			headers={"Accept": "application/json"},
+		)
 
-		r = requests.get(
-			f"{self.base_url}/api/v2_1/orders/{order_id}",
+	def refund(self, order_id, *, kwota, opis, ext_refund_id):
+		return self._zapytanie(
+			"POST",
+			f"/api/v2_1/orders/{order_id}/refunds",
+			json={
+				"refund": {
+					"description": opis,
+					"amount": int(kwota * 100),
+					"extRefundId": ext_refund_id,
+				}
+			},
 			headers={
-				"Authorization": f"Bearer {token}",
+				"Content-Type": "application/json",
 				"Accept": "application/json",
 			},
-			timeout=5,
 		)
 
-		r.raise_for_status()
-		return r.json()
+	def get_refunds(self, order_id):
+		return self._zapytanie(
+			"GET",
+			f"/api/v2_1/orders/{order_id}/refunds",
+			headers={"Accept": "application/json"},
+		)
@@ -0,0 +1,331 @@
+"""
+Stan płatności PayU po naszej stronie.
+
+Strona powrotu z PayU i endpoint statusu czytają ``PlatnoscPayU`` z bazy.
+Do PayU sięgamy tylko wtedy, gdy płatność nie jest zakończona, a od
+ostatniego sprawdzenia minęło ``PAYU["STATUS_INTERVAL"]`` sekund - i tylko
+jeden proces, który warunkowym UPDATE-em zajmie sprawdzenie.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PlatnoscPayU, Wplata, Zgloszenie
+from .payu import PayUClient
+from .zmiany import zapisz_zmiany
+
+logger = logging.getLogger(__name__)
+
+STATUSY_OTWARTE = (PlatnoscPayU.STATUS_NEW, PlatnoscPayU.STATUS_PENDING)
+STATUSY_KONCOWE = (
+	PlatnoscPayU.STATUS_COMPLETED,
+	PlatnoscPayU.STATUS_FAILED,
+	PlatnoscPayU.STATUS_EXPIRED,
+)
+
+# link do PayU dajemy ponownie tylko, jeśli zostało jeszcze tyle sekund na zapłatę
+ZAPAS_NA_ZAPLATE = 300
+
+
+def status_lokalny(status_payu):
+	"""Zamienia status zamówienia PayU na status ``PlatnoscPayU``."""
+	if status_payu == PlatnoscPayU.STATUS_COMPLETED:
+		return PlatnoscPayU.STATUS_COMPLETED
+	if status_payu in ("FAILED", "CANCELED"):
+		return PlatnoscPayU.STATUS_FAILED
+	return PlatnoscPayU.STATUS_PENDING
+
+
+def zastosuj_status(platnosc, status_payu):
+	"""
+	Zapisuje status z PayU i przy zakończeniu tworzy wpłatę (idempotentnie).
+
+	Wiersz płatności jest blokowany (select_for_update), więc webhook
+	i odpytywanie PayU z przeglądarki nie zaksięgują wpłaty dwa razy;
+	ostatnią zaporą jest unikalność (rodzaj, zrodlo_id) wpłaty.
+	Zakończona płatność nie wraca do innego statusu.
+	"""
+	status = status_lokalny(status_payu)
+	with transaction.atomic():
+		zablokowana = PlatnoscPayU.objects.select_for_update().get(pk=platnosc.pk)
+		platnosc.status = zablokowana.status
+		if platnosc.status == PlatnoscPayU.STATUS_COMPLETED:
+			return False
+
+		if platnosc.status != status:
+			platnosc.status = status
+			platnosc.save(update_fields=["status"])
+
+		if status == PlatnoscPayU.STATUS_COMPLETED:
+			Wplata.objects.get_or_create(
+				rodzaj=Wplata.RODZAJ_PAYU,
+				zrodlo_id=platnosc.payu_order_id,
+				defaults={
+					"zgloszenie": platnosc.zgloszenie,
+					"kwota": platnosc.kwota,
+					"opis": f"PayU – {platnosc.typ}",
+				},
+			)
+	return True
+
+
+def _zajmij_sprawdzenie(platnosc):
+	odstep = settings.PAYU.get("STATUS_INTERVAL", 30)
+	granica = timezone.now() - timedelta(seconds=odstep)
+	if platnosc.sprawdzona and platnosc.sprawdzona > granica:
+		return False
+	teraz = timezone.now()
+	zajete = (
+		PlatnoscPayU.objects
+		.filter(pk=platnosc.pk)
+		.filter(Q(sprawdzona__isnull=True) | Q(sprawdzona__lte=granica))
+		.update(sprawdzona=teraz)
+	)
+	if zajete:
+		platnosc.sprawdzona = teraz
+	return bool(zajete)
+
+
+def odswiez_z_payu(platnosc):
+	"""
+	Pobiera status z PayU, jeśli lokalny jest nieaktualny.
+
+	Błąd PayU nie jest przekazywany dalej - zostaje stan z bazy, a kolejne
+	sprawdzenie nastąpi po upływie interwału.
+	"""
+	if platnosc.status in STATUSY_KONCOWE or not platnosc.payu_order_id:
+		return platnosc
+	if not _zajmij_sprawdzenie(platnosc):
+		return platnosc
+
+	try:
+		dane = PayUClient().get_order(platnosc.payu_order_id)
+		status = dane["orders"][0]["status"]
+	except (requests.RequestException, KeyError, IndexError, ValueError):
+		logger.warning(
+			"Nie udało się pobrać statusu zamówienia PayU %s",
+			platnosc.payu_order_id,
+			exc_info=True,
+		)
+		return platnosc
+
+	zastosuj_status(platnosc, status)
+	return platnosc
+
+
+def waznosc_zamowienia():
+	return settings.PAYU.get("ORDER_VALIDITY", 1800)
+
+
+def waznosc_po(chwila):
+	"""Warunek: link do PayU jest jeszcze ważny w ``chwila``."""
+	od_utworzenia = chwila - timedelta(seconds=waznosc_zamowienia())
+	return (
+		Q(wazna_do__isnull=True, utworzona__gt=od_utworzenia)
+		| Q(wazna_do__gt=chwila)
+	)
+
+
+def zajmij_platnosc(zgloszenie, typ, kwota):
+	"""
+	Zwraca (płatność, nowa) dla kliknięcia "zapłać".
+
+	Jeśli ta sama osoba ma otwartą płatność o tym samym typie i kwocie, a jej
+	link do PayU jest jeszcze ważny (albo właśnie powstaje w równoległym
+	żądaniu), zwraca ją zamiast zakładać nowe zamówienie. Blokada wiersza
+	zgłoszenia sprawia, że równoległe kliknięcia nie utworzą dwóch płatności.
+	"""
+	teraz = timezone.now()
+	with transaction.atomic():
+		Zgloszenie.objects.select_for_update().filter(pk=zgloszenie.pk).exists()
+		platnosc = (
+			PlatnoscPayU.objects
+			.filter(
+				zgloszenie=zgloszenie,
+				typ=typ,
+				kwota=kwota,
+				status__in=STATUSY_OTWARTE,
+			)
+			.filter(waznosc_po(teraz + timedelta(seconds=ZAPAS_NA_ZAPLATE)))
+			.filter(
+				# bez linku tylko świeża - starsza to nieudana próba, nie czekamy na nią
+				Q(redirect_uri__gt="")
+				| Q(utworzona__gt=teraz - timedelta(seconds=_czas_tworzenia()))
+			)
+			.order_by("-utworzona")
+			.first()
+		)
+		if platnosc:
+			return platnosc, False
+		platnosc = PlatnoscPayU.objects.create(
+			zgloszenie=zgloszenie, typ=typ, kwota=kwota
+		)
+		return platnosc, True
+
+
+def _czas_tworzenia():
+	# tyle może trwać create_order w równoległym żądaniu
+	return 2 * settings.PAYU.get("TIMEOUT", 5) + 1
+
+
+def czekaj_na_link(platnosc):
+	"""Czeka, aż równoległe żądanie zapisze link do PayU. Zwraca True, gdy jest."""
+	koniec = time.monotonic() + _czas_tworzenia()
+	while not platnosc.redirect_uri:
+		if platnosc.status != PlatnoscPayU.STATUS_NEW or time.monotonic() >= koniec:
+			return False
+		time.sleep(0.2)
+		platnosc.refresh_from_db(fields=["redirect_uri", "status"])
+	return True
+
+
+def wygas_platnosci(platnosci=None):
+	"""
+	Oznacza jako wygasłe otwarte płatności, których link do PayU stracił ważność.
+
+	Jedno UPDATE zamiast zapisu każdego wiersza; zmiany trafiają do kanału
+	zmian przez ``zapisz_zmiany``. Zwraca liczbę wygaszonych płatności.
+	"""
+	if platnosci is None:
+		platnosci = PlatnoscPayU.objects.all()
+	with transaction.atomic():
+		ids = list(
+			platnosci
+			.filter(status__in=STATUSY_OTWARTE)
+			.exclude(waznosc_po(timezone.now()))
+			.values_list("pk", flat=True)
+		)
+		if not ids:
+			return 0
+		PlatnoscPayU.objects.filter(pk__in=ids, status__in=STATUSY_OTWARTE).update(
+			status=PlatnoscPayU.STATUS_EXPIRED
+		)
+		zapisz_zmiany(PlatnoscPayU, ids)
+	return len(ids)
+
+
+class Tempo:
+	"""Rozkłada zapytania do PayU równo w czasie: najwyżej ``na_sekunde``."""
+
+	def __init__(self, na_sekunde):
+		self.odstep = 1 / na_sekunde if na_sekunde else 0
+		self.nastepne = time.monotonic()
+		self.blokada = threading.Lock()
+
+	def czekaj(self):
+		with self.blokada:
+			teraz = time.monotonic()
+			start = max(teraz, self.nastepne)
+			self.nastepne = start + self.odstep
+		if start > teraz:
+			time.sleep(start - teraz)
+
+
+def uzgodnij_platnosci(
+	starsze_niz=30, watki=4, na_sekunde=10, wygasle_dni=7, partia=200, odstep_waznych=60
+):
+	"""
+	Sprawdza w PayU płatności, które utknęły (np. zgubiony webhook).
+
+	Bierze otwarte płatności starsze niż ``starsze_niz`` minut oraz wygaszone
+	z ostatnich ``wygasle_dni`` dni - ktoś mógł zapłacić tuż przed końcem
+	ważności. Otwarte z linkiem wciąż ważnym (linki z maili żyją dniami)
+	sprawdza najwyżej raz na ``odstep_waznych`` minut.
+
+	Zapytania idą równolegle przez pulę ``watki`` wątków, najwyżej
+	``na_sekunde`` na sekundę, a wyniki są stosowane w wątku głównym tą samą
+	funkcją co powiadomienia z webhooka. Zwraca Counter z podsumowaniem.
+	"""
+	teraz = timezone.now()
+	do_sprawdzenia = (
+		PlatnoscPayU.objects
+		.filter(payu_order_id__isnull=False)
+		.filter(
+			Q(
+				status__in=STATUSY_OTWARTE,
+				utworzona__lt=teraz - timedelta(minutes=starsze_niz),
+			)
+			| Q(
+				status=PlatnoscPayU.STATUS_EXPIRED,
+				utworzona__gte=teraz - timedelta(days=wygasle_dni),
+			)
+			| Q(
+				status=PlatnoscPayU.STATUS_EXPIRED,
+				wazna_do__gte=teraz - timedelta(days=wygasle_dni),
+			)
+		)
+		# linki z maili są ważne dniami - sprawdzamy je rzadziej, ale nie czekamy
+		# do wygaśnięcia, bo zapłata z pierwszego dnia bez webhooka wisiałaby tydzień
+		.exclude(
+			status__in=STATUSY_OTWARTE,
+			wazna_do__gt=teraz,
+			sprawdzona__gte=teraz - timedelta(minutes=odstep_waznych),
+		)
+		.select_related("zgloszenie")
+		.order_by("id")
+	)
+
+	client = PayUClient()
+	tempo = Tempo(na_sekunde)
+
+	def pobierz(order_id):
+		tempo.czekaj()
+		return client.get_order(order_id)["orders"][0]["status"]
+
+	wynik = Counter()
+	ostatnie_id = 0
+	with ThreadPoolExecutor(max_workers=watki) as pula:
+		while True:
+			# stronicowanie po id - zmienione statusy nie przesuwają kolejnych stron
+			platnosci = list(do_sprawdzenia.filter(id__gt=ostatnie_id)[:partia])
+			if not platnosci:
+				break
+			ostatnie_id = platnosci[-1].id
+
+			zadania = {pula.submit(pobierz, p.payu_order_id): p for p in platnosci}
+			for zadanie in as_completed(zadania):
+				platnosc = zadania[zadanie]
+				wynik["sprawdzone"] += 1
+				try:
+					status = zadanie.result()
+				except (
+					requests.RequestException, KeyError, IndexError, ValueError
+				) as e:
+					wynik["bledy"] += 1
+					logger.warning(
+						"Nie udało się sprawdzić zamówienia PayU %s: %s",
+						platnosc.payu_order_id,
+						e,
+					)
+					continue
+				poprzedni = platnosc.status
+				if (
+					poprzedni == PlatnoscPayU.STATUS_EXPIRED
+					and status != PlatnoscPayU.STATUS_COMPLETED
+				):
+					# wygaszona i anulowana w PayU - zostaje "Wygasła"
+					wynik["bez_zmian"] += 1
+					continue
+				zastosuj_status(platnosc, status)
+				if platnosc.status == poprzedni:
+					wynik["bez_zmian"] += 1
+				elif platnosc.status == PlatnoscPayU.STATUS_COMPLETED:
+					wynik["zakonczone"] += 1
+				elif platnosc.status == PlatnoscPayU.STATUS_FAILED:
+					wynik["nieudane"] += 1
+				else:
+					wynik["w_toku"] += 1
+			PlatnoscPayU.objects.filter(pk__in=[p.pk for p in platnosci]).update(
+				sprawdzona=timezone.now()
+			)
+	return wynik
@@ -0,0 +1,74 @@
+"""
+Funkcje dostępne tylko na PostgreSQL.
+
+Aplikacja działa na SQLite i na PostgreSQL (``DATABASE_URL``). To, czego
+SQLite nie ma, włącza się samo po rozpoznaniu backendu:
+
+- wyszukiwanie pełnotekstowe w adminie zamiast ``icontains`` (``szukaj``),
+  z indeksami GIN na wyrażeniach ``SearchVector`` (migracja 0044); słowa
+  szukamy po prefiksie, a gdy nic nie pasuje, admin wraca do ``icontains``,
+- ``SKIP LOCKED`` w kolejce powiadomień PayU - na SQLite Django pomija
+  ``select_for_update`` w całości.
+
+``django.contrib.postgres`` importujemy dopiero przy użyciu: na SQLite
+moduł nie jest potrzebny, a bez psycopg nie da się go nawet zaimportować.
+"""
+
+import re
+
+from django.db import connections
+
+# (model, pola, nazwa indeksu GIN) - wyszukiwanie w adminie
+PELNOTEKSTOWE = [
+	("zgloszenie", ("imie", "nazwisko"), "zgloszenie_fts"),
+	("przelewbankowy", ("tytul", "nadawca"), "przelew_fts"),
+]
+# słownik "simple": bez odmiany słów, sensowny dla nazwisk i tytułów przelewów
+KONFIGURACJA = "simple"
+
+
+def jest_postgres(using="default"):
+	return connections[using].vendor == "postgresql"
+
+
+def wektor(pola):
+	from django.contrib.postgres.search import SearchVector
+
+	return SearchVector(*pola, config=KONFIGURACJA)
+
+
+def zapytanie(fraza):
+	"""
+	``tsquery`` z prefiksem na każdym słowie frazy ("kowal 12" ->
+	``kowal:* & 12:*``), żeby "Kowal" znajdowało "Kowalska". Do zapytania
+	trafiają tylko litery i cyfry, więc fraza nie złamie składni ``tsquery``.
+	"""
+	return " & ".join(f"{slowo}:*" for slowo in re.findall(r"[^\W_]+", fraza))
+
+
+def szukaj(queryset, pola, fraza):
+	"""``queryset`` zawężony do wierszy, których ``pola`` pasują do ``fraza``."""
+	from django.contrib.postgres.search import SearchQuery
+
+	return queryset.annotate(_wektor=wektor(pola)).filter(
+		_wektor=SearchQuery(zapytanie(fraza), config=KONFIGURACJA, search_type="raw")
+	)
+
+
+class PelnotekstoweMixin:
+	"""
+	Admin: na PostgreSQL szuka pełnotekstowo w ``pola_pelnotekstowe``
+	(indeks GIN), na SQLite zostaje zwykłe ``search_fields``. Gdy indeks nic
+	nie znajdzie (np. fragment ze środka tytułu przelewu), też wracamy do
+	``search_fields``.
+	"""
+
+	pola_pelnotekstowe: tuple[str, ...] = ()
+
+	def get_search_results(self, request, queryset, search_term):
+		if not zapytanie(search_term) or not jest_postgres(queryset.db):
+			return super().get_search_results(request, queryset, search_term)
+		wyniki = szukaj(queryset, self.pola_pelnotekstowe, search_term)
+		if not wyniki.exists():
+			return super().get_search_results(request, queryset, search_term)
+		return wyniki, False
@@ -0,0 +1,176 @@
+"""
+Skrzynka powiadomień PayU.
+
+Webhook tylko sprawdza podpis i zapisuje surową treść w ``PowiadomieniePayU``,
+więc PayU dostaje 200 od razu, bez czekania na bazę płatności i SMTP.
+Komenda ``przetworz_powiadomienia`` stosuje je potem po kolei - dla jednego
+zamówienia zawsze w kolejności odbioru. Powiadomienie, którego nie udało się
+przetworzyć, czeka na ponowną próbę, a razem z nim późniejsze powiadomienia
+tego samego zamówienia.
+
+Przetworzone powiadomienia usuwa po okresie przechowywania komenda
+``przytnij_powiadomienia``; porzucone (z błędem) zostają do ręcznego
+sprawdzenia.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PlatnoscPayU, PowiadomieniePayU
+from .platnosci import zastosuj_status
+
+logger = logging.getLogger(__name__)
+
+MAKS_PROB = 8
+# kolejne próby po 10 s, 20 s, 40 s... maksymalnie co godzinę
+PIERWSZA_PRZERWA = 10
+MAKS_PRZERWA = 3600
+
+
+class NieznaneZamowienie(Exception):
+	pass
+
+
+class Zajete(Exception):
+	"""Powiadomienie albo jego zamówienie przetwarza w tej chwili inny proces."""
+
+
+def odbierz(tresc):
+	"""
+	Zapisuje powiadomienie ze zweryfikowanym podpisem. Zwraca None, gdy treść
+	nie jest powiadomieniem o zamówieniu.
+	"""
+	try:
+		order = json.loads(tresc).get("order") or {}
+	except (ValueError, AttributeError):
+		return None
+	if not order.get("orderId"):
+		return None
+	return PowiadomieniePayU.objects.create(
+		payu_order_id=order["orderId"],
+		status_payu=order.get("status", ""),
+		tresc=tresc.decode() if isinstance(tresc, bytes) else tresc,
+	)
+
+
+def _zastosuj(powiadomienie):
+	# SKIP LOCKED: kilka równoległych przetworz_powiadomienia nie czeka na siebie -
+	# powiadomienie lub zamówienie zajęte przez inny proces zostaje na później.
+	# Na SQLite Django pomija select_for_update, a proces i tak jest jeden.
+	with transaction.atomic():
+		wolne = (
+			PowiadomieniePayU.objects
+			.select_for_update(skip_locked=True)
+			.filter(pk=powiadomienie.pk, przetworzone__isnull=True)
+		)
+		if not wolne.exists():
+			raise Zajete(powiadomienie.payu_order_id)
+		try:
+			platnosc = (
+				PlatnoscPayU.objects
+				.select_for_update(skip_locked=True)
+				.select_related("zgloszenie")
+				.get(payu_order_id=powiadomienie.payu_order_id)
+			)
+		except PlatnoscPayU.DoesNotExist:
+			platnosci = PlatnoscPayU.objects.filter(
+				payu_order_id=powiadomienie.payu_order_id
+			)
+			if platnosci.exists():
+				raise Zajete(powiadomienie.payu_order_id)
+			raise NieznaneZamowienie(powiadomienie.payu_order_id)
+		zastosuj_status(platnosc, powiadomienie.status_payu)
+		powiadomienie.przetworzone = timezone.now()
+		powiadomienie.blad = ""
+		powiadomienie.save(update_fields=["przetworzone", "blad"])
+
+
+def _odloz(powiadomienie, blad):
+	powiadomienie.proby += 1
+	powiadomienie.blad = blad
+	if powiadomienie.proby >= MAKS_PROB:
+		# poddajemy się - zostaje z opisem błędu, nie blokuje kolejnych powiadomień
+		powiadomienie.przetworzone = timezone.now()
+		logger.error(
+			"Porzucono powiadomienie PayU %s (%s): %s",
+			powiadomienie.pk,
+			powiadomienie.payu_order_id,
+			blad,
+		)
+	else:
+		przerwa = min(PIERWSZA_PRZERWA * 2 ** (powiadomienie.proby - 1), MAKS_PRZERWA)
+		powiadomienie.nastepna_proba = timezone.now() + timedelta(seconds=przerwa)
+		logger.warning(
+			"Nie przetworzono powiadomienia PayU %s (%s), próba %s: %s",
+			powiadomienie.pk,
+			powiadomienie.payu_order_id,
+			powiadomienie.proby,
+			blad,
+		)
+	powiadomienie.save(
+		update_fields=["proby", "blad", "przetworzone", "nastepna_proba"]
+	)
+
+
+def przetworz(rozmiar_partii=100):
+	"""
+	Przetwarza jedną partię powiadomień w kolejności odbioru.
+
+	Każde powiadomienie ma własną transakcję. Zwraca krotkę
+	(przetworzone, odłożone).
+	"""
+	teraz = timezone.now()
+	oczekujace = PowiadomieniePayU.objects.filter(przetworzone__isnull=True)
+	# zamówienia, których wcześniejsze powiadomienie czeka na ponowną próbę
+	wstrzymane = set(
+		oczekujace
+		.filter(nastepna_proba__gt=teraz)
+		.values_list("payu_order_id", flat=True)
+	)
+	partia = (
+		oczekujace
+		.exclude(payu_order_id__in=wstrzymane)
+		.order_by("id")[:rozmiar_partii]
+	)
+
+	przetworzone = odlozone = 0
+	for powiadomienie in partia:
+		if powiadomienie.payu_order_id in wstrzymane:
+			continue
+		try:
+			_zastosuj(powiadomienie)
+		except Zajete:
+			# bez liczenia próby; późniejsze powiadomienia zamówienia też czekają
+			wstrzymane.add(powiadomienie.payu_order_id)
+			continue
+		except NieznaneZamowienie:
+			# PayU potrafi wysłać powiadomienie, zanim zaplac zapisze orderId
+			_odloz(powiadomienie, "Nieznane zamówienie")
+		except Exception as e:
+			_odloz(powiadomienie, f"{type(e).__name__}: {e}")
+		else:
+			przetworzone += 1
+			continue
+		odlozone += 1
+		wstrzymane.add(powiadomienie.payu_order_id)
+	return przetworzone, odlozone
+
+
+def przytnij(dni=30, partia=10000):
+	"""
+	Usuwa powiadomienia przetworzone bez błędu ponad ``dni`` dni temu. Zwraca
+	liczbę usuniętych. Partiami, każda w osobnej krótkiej transakcji.
+	"""
+	stare = PowiadomieniePayU.objects.filter(
+		przetworzone__lt=timezone.now() - timedelta(days=dni), blad=""
+	)
+	usuniete = 0
+	while True:
+		ids = list(stare.values_list("id", flat=True)[:partia])
+		if not ids:
+			return usuniete
+		usuniete += PowiadomieniePayU.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,169 @@
+"""
+Przypomnienia o dopłacie z gotowym linkiem PayU.
+
+Przed terminem dopłaty akcja w panelu admina (albo komenda
+``wyslij_linki_doplaty``) zakłada z góry zamówienia PayU na pozostałą kwotę
+dla zakwalifikowanych uczestników rejsu i wysyła maile z linkiem prosto do
+strony płatności PayU - kliknięcie nie dotyka już naszego serwera. Saldo
+wszystkich zgłoszeń liczy jedno zapytanie, zamówienia powstają równolegle
+(ograniczona pula wątków i tempo), a maile idą partiami przez jedno
+połączenie SMTP.
+
+Akcja w adminie działa w żądaniu HTTP, więc zakłada najwyżej
+``MAKS_NOWYCH_W_ADMINIE`` zamówień naraz i zgłasza, ilu osobom linku jeszcze
+brakuje; komenda obsługuje cały rejs.
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .mailers import build_simple_mail, send_mass_simple_mail
+from .models import PlatnoscPayU, Zgloszenie
+from .payu import PayUClient
+from .platnosci import STATUSY_OTWARTE, Tempo
+from .zmiany import zapisz_zmiany
+
+logger = logging.getLogger(__name__)
+
+# przy tempie 5 zamówień/s to kilka sekund żądania w adminie
+MAKS_NOWYCH_W_ADMINIE = 25
+
+
+def waznosc_linku():
+	return settings.PAYU.get("LINK_VALIDITY", 7 * 24 * 3600)
+
+
+def _platnosci_do_wyslania(rejs, teraz, limit=None):
+	"""
+	Zwraca pary (zgłoszenie, płatność) do wysłania, nowe płatności (zapisane)
+	i liczbę osób, którym z powodu ``limit`` linku jeszcze brakuje.
+	"""
+	zgloszenia = list(
+		Zgloszenie.objects
+		.z_saldem()
+		.filter(rejs=rejs, status=Zgloszenie.STATUS_ZAKWALIFIKOWANY, pozostalo__gt=0)
+		.select_related("rejs")
+		.order_by("id")
+	)
+	# link z wcześniejszej rundy wysyłamy ponownie, jeśli kwota się zgadza
+	# i zostało mu co najmniej pół ważności
+	gotowe = {
+		(p.zgloszenie_id, p.kwota): p
+		for p in PlatnoscPayU.objects.filter(
+			zgloszenie__in=zgloszenia,
+			typ="reszta",
+			status__in=STATUSY_OTWARTE,
+			redirect_uri__gt="",
+			wazna_do__gt=teraz + timedelta(seconds=waznosc_linku() / 2),
+		)
+	}
+	pary = []
+	nowe = []
+	for zgl in zgloszenia:
+		platnosc = gotowe.get((zgl.pk, zgl.pozostalo))
+		if platnosc is None:
+			platnosc = PlatnoscPayU(
+				zgloszenie=zgl,
+				typ="reszta",
+				kwota=zgl.pozostalo,
+				wazna_do=teraz + timedelta(seconds=waznosc_linku()),
+			)
+			nowe.append(platnosc)
+		pary.append((zgl, platnosc))
+	pozostalo = 0
+	if limit is not None and nowe:
+		pozostalo = max(0, len(nowe) - limit)
+		nowe = nowe[:limit]
+		pary = [(p.zgloszenie, p) for p in nowe]
+	PlatnoscPayU.objects.bulk_create(nowe)
+	return pary, nowe, pozostalo
+
+
+def _zaloz_zamowienia(nowe, watki, na_sekunde):
+	"""Zakłada zamówienia PayU równolegle; wyniki zapisuje w wątku głównym.
+
+	Zwraca liczbę błędów.
+	"""
+	client = PayUClient()
+	tempo = Tempo(na_sekunde)
+
+	def zaloz(platnosc):
+		zgl = platnosc.zgloszenie
+		tempo.czekaj()
+		return client.create_order(
+			kwota=platnosc.kwota,
+			opis=f"{zgl.rejs.nazwa} – reszta",
+			email=zgl.email,
+			notify_url=settings.SITE_URL + reverse("payu_webhook"),
+			continue_url=settings.SITE_URL + reverse(
+				"payu_continue", kwargs={"token": zgl.token, "platnosc_id": platnosc.pk}
+			),
+			waznosc=waznosc_linku(),
+		)
+
+	bledy = 0
+	with ThreadPoolExecutor(max_workers=watki) as pula:
+		zadania = {pula.submit(zaloz, p): p for p in nowe}
+		for zadanie in as_completed(zadania):
+			platnosc = zadania[zadanie]
+			try:
+				wynik = zadanie.result()
+				platnosc.payu_order_id = wynik["orderId"]
+				platnosc.redirect_uri = wynik["redirectUri"]
+			except (requests.RequestException, KeyError, ValueError) as e:
+				bledy += 1
+				platnosc.status = PlatnoscPayU.STATUS_FAILED
+				logger.warning(
+					"Nie udało się założyć zamówienia PayU dla zgłoszenia %s: %s",
+					platnosc.zgloszenie_id,
+					e,
+				)
+			else:
+				platnosc.status = PlatnoscPayU.STATUS_PENDING
+
+	PlatnoscPayU.objects.bulk_update(nowe, ["payu_order_id", "redirect_uri", "status"])
+	# bulk_create/bulk_update pomijają sygnały - ręcznie do kanału zmian
+	zapisz_zmiany(PlatnoscPayU, [p.pk for p in nowe])
+	return bledy
+
+
+def wyslij_linki_reszty(rejs, watki=4, na_sekunde=5, partia=200, limit=None):
+	"""
+	Wysyła zakwalifikowanym uczestnikom rejsu maile z linkiem PayU do dopłaty.
+
+	Z ``limit`` zakłada najwyżej tyle zamówień i wysyła maile tylko osobom
+	z nowym zamówieniem; wcześniejsze linki idą ponownie dopiero w rundzie,
+	w której nikomu linku nie brakuje - kolejne partie nie dublują maili.
+
+	Zwraca Counter: nowe (założone zamówienia), ponowione (wcześniejszy link
+	wysłany jeszcze raz), bledy, maile i pozostalo (osoby czekające na link).
+	"""
+	teraz = timezone.now()
+	pary, nowe, pozostalo = _platnosci_do_wyslania(rejs, teraz, limit)
+	wynik = Counter(
+		nowe=len(nowe), ponowione=len(pary) - len(nowe), pozostalo=pozostalo
+	)
+	if nowe:
+		wynik["bledy"] = _zaloz_zamowienia(nowe, watki, na_sekunde)
+		wynik["nowe"] -= wynik["bledy"]
+
+	maile = [
+		build_simple_mail(
+			f"Dopłata za rejs {zgl.rejs.nazwa} {zgl.imie} {zgl.nazwisko}",
+			zgl.email,
+			"emails/doplata_link",
+			{"zgl": zgl, "platnosc": platnosc, "link": platnosc.redirect_uri},
+		)
+		for zgl, platnosc in pary
+		if platnosc.redirect_uri
+	]
+	for start in range(0, len(maile), partia):
+		wynik["maile"] += send_mass_simple_mail(maile[start:start + partia])
+	return wynik
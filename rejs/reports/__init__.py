@@ -1,7 +1,6 @@
 from django.http import HttpResponse
 from django.utils.timezone import now
 from .builder import RaportRejsuBuilder
-from .excel import ExcelExporter
 
 
 def generate_rejs_report(rejs, user):
@@ -18,6 +17,9 @@ def generate_rejs_report(rejs, user):
 	crew_list = builder.build_crew_list()
 
 	# ---------- EXCEL ----------
+	# openpyxl ładowany dopiero tutaj - większość procesów nie eksportuje
+	from .excel import ExcelExporter
+
 	# filename nie jest potrzebny, bo zapisujemy do HttpResponse
 	exporter = ExcelExporter(filename=None)
 
@@ -1,5 +1,7 @@
+from django.db.models import F
 from django.utils.timezone import localtime
 from rejs.models import Zgloszenie, Wachta, Wplata, Dane_Dodatkowe
+from rejs.szyfry import z_odszyfrowanymi
 
 
 class RaportRejsuBuilder:
@@ -19,6 +21,7 @@ class RaportRejsuBuilder:
 			Zgloszenie.objects
 			.filter(rejs=self.rejs)
 			.select_related("wachta")
+			.z_saldem()
 		):
 			rows.append({
 				"imie": z.imie,
@@ -33,8 +36,8 @@ class RaportRejsuBuilder:
 				"wzrok": z.wzrok,
 				"rola": z.rola,
 				"wachta": z.wachta.nazwa if z.wachta else "",
-				"suma_wplat": z.suma_wplat,
-				"do_zaplaty": z.do_zaplaty,
+				"suma_wplat": z.wplacono,
+				"do_zaplaty": z.pozostalo,
 			})
 
 		return rows
@@ -93,19 +96,22 @@ class RaportRejsuBuilder:
 
 		rows = []
 
-		for d in (
+		# zaszyfrowane pola odszyfrowuje hurtem z_odszyfrowanymi, nie model
+		for d, jawne in z_odszyfrowanymi(
 			Dane_Dodatkowe.objects
 			.filter(zgloszenie__rejs=self.rejs)
 			.select_related("zgloszenie")
+			.only("zgloszenie__imie", "zgloszenie__nazwisko"),
+			["poz1", "poz2", "poz3"],
 		):
 			z = d.zgloszenie
 
 			rows.append({
 				"imie": z.imie,
 				"nazwisko": z.nazwisko,
-				"pesel": d.poz1,
-				"typ_dokumentu": d.poz2,
-				"dokument": d.poz3,
+				"pesel": jawne["poz1"],
+				"typ_dokumentu": jawne["poz2"],
+				"dokument": jawne["poz3"],
 			})
 
 		return rows
@@ -120,24 +126,29 @@ class RaportRejsuBuilder:
 				rejs=self.rejs,
 				status=Zgloszenie.STATUS_ZAKWALIFIKOWANY
 			)
-			.select_related("dane_dodatkowe", "wachta")
+			.select_related("wachta")
+			.annotate(document_expiry=F("dane_dodatkowe__pos6"))
 			.order_by("nazwisko", "imie")
 		)
 
-		for z in qs:
-			d = getattr(z, "dane_dodatkowe", None)
-
+		# brak danych dodatkowych daje None we wszystkich polach
+		for z, d in z_odszyfrowanymi(qs, [
+			"dane_dodatkowe__pos4",
+			"dane_dodatkowe__pos5",
+			"dane_dodatkowe__poz2",
+			"dane_dodatkowe__poz3",
+		]):
 			rows.append({
 				"family_name": z.nazwisko,
 				"given_names": z.imie,
 				"age": z.wiek,
 				"date_of_birth": z.data_urodzenia,
-				"place_of_birth": d.pos4 if d else "",
-				"nationality": d.pos5 if d else "",
+				"place_of_birth": d["dane_dodatkowe__pos4"] or "",
+				"nationality": d["dane_dodatkowe__pos5"] or "",
 				"rank": z.rola,
-				"document_type": d.poz2 if d else "",
-				"document_number": d.poz3 if d else "",
-				"document_expiry": d.pos6 if d else "",
+				"document_type": d["dane_dodatkowe__poz2"] or "",
+				"document_number": d["dane_dodatkowe__poz3"] or "",
+				"document_expiry": z.document_expiry or "",
 				"sex": z.plec,
 			})
 
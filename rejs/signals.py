@@ -1,10 +1,13 @@
 from django.conf import settings
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 
 from .mailers import send_simple_mail
-from .models import Ogloszenie, Wplata, Zgloszenie
+from .miejsca import dodaj_miejsce, odejmij_miejsce, zajmuje_miejsce, zwolnij_miejsce
+from .models import Ogloszenie, PlatnoscPayU, Wachta, Wplata, Zgloszenie, Zmiana
+from .zmiany import zapisz_zmiany
 
 
 @receiver(pre_save, sender=Zgloszenie)
@@ -25,7 +28,16 @@ def zgloszenie_pre_save(sender, instance, **kwargs):
 @receiver(post_save, sender=Zgloszenie)
 def zgloszenie_post_save(sender, instance, created, **kwargs):
 	if created:
-		subject = f"Potwierdzenie zgłoszenia na rejs: {instance.rejs.nazwa}"
+		przydzielone = getattr(instance, "_miejsce_przydzielone", False)
+		if zajmuje_miejsce(instance.status) and not przydzielone:
+			dodaj_miejsce(instance.rejs_id)
+
+		if instance.status == Zgloszenie.STATUS_REZERWOWA:
+			subject = f"Zgłoszenie na listę rezerwową rejsu: {instance.rejs.nazwa}"
+			template = "emails/zgloszenie_lista_rezerwowa"
+		else:
+			subject = f"Potwierdzenie zgłoszenia na rejs: {instance.rejs.nazwa}"
+			template = "emails/zgloszenie_utworzone"
 		link = settings.SITE_URL + reverse(
 			"zgloszenie_details", kwargs={"token": instance.token}
 		)
@@ -36,13 +48,18 @@ def zgloszenie_post_save(sender, instance, created, **kwargs):
 				"link": link,
 		}
 
-		send_simple_mail(
-			subject, instance.email, "emails/zgloszenie_utworzone", context
+		# po zatwierdzeniu transakcji - SMTP nie może trzymać blokady licznika miejsc
+		transaction.on_commit(
+			lambda: send_simple_mail(subject, instance.email, template, context),
+			robust=True,
 		)
 		return
 
 	old_status = getattr(instance, "_old_status", None)
 	if old_status is not None and old_status != instance.status:
+		if not getattr(instance, "_miejsce_przydzielone", False):
+			_rozlicz_miejsce(instance, old_status)
+
 		link = settings.SITE_URL + reverse(
 			"zgloszenie_details", kwargs={"token": instance.token}
 		)
@@ -61,6 +78,13 @@ def zgloszenie_post_save(sender, instance, created, **kwargs):
 		elif instance.status == "Odrzucone":
 			subject = f"Odrzucone zgłoszenie na rejs {instance.rejs.nazwa}"
 			send_simple_mail(subject, instance.email, "emails/zgloszenie_o", context)
+		elif old_status == Zgloszenie.STATUS_REZERWOWA and zajmuje_miejsce(
+			instance.status
+		):
+			subject = f"Zwolniło się miejsce na rejsie {instance.rejs.nazwa}"
+			send_simple_mail(
+				subject, instance.email, "emails/zgloszenie_z_listy_rezerwowej", context
+			)
 
 	old_wachta_id = getattr(instance, "_old_wachta_id", None)
 	if old_wachta_id is None and instance.wachta_id is not None:
@@ -76,6 +100,24 @@ def zgloszenie_post_save(sender, instance, created, **kwargs):
 		send_simple_mail(subject, instance.email, "emails/wachta_added", context)
 
 
+def _rozlicz_miejsce(instance, old_status):
+	if zajmuje_miejsce(old_status) and not zajmuje_miejsce(instance.status):
+		if instance.status == Zgloszenie.STATUS_ODRZUCONE:
+			zwolnij_miejsce(instance.rejs_id)
+		else:
+			# przeniesienie na listę rezerwową - bez awansu, inaczej ta sama
+			# osoba mogłaby od razu wrócić na zwolnione przez siebie miejsce
+			odejmij_miejsce(instance.rejs_id)
+	elif not zajmuje_miejsce(old_status) and zajmuje_miejsce(instance.status):
+		dodaj_miejsce(instance.rejs_id)
+
+
+@receiver(post_delete, sender=Zgloszenie)
+def zgloszenie_post_delete(sender, instance, **kwargs):
+	if zajmuje_miejsce(instance.status):
+		zwolnij_miejsce(instance.rejs_id)
+
+
 @receiver(post_save, sender=Wplata)
 def wplata_post_save(sender, instance, created, **kwargs):
 	if not created:
@@ -91,10 +133,17 @@ def wplata_post_save(sender, instance, created, **kwargs):
 	}
 	if instance.rodzaj in ["wplata", "payu"]:
 		subject = f"Zarejestrowaliśmy nową wpłatę {zgl.imie} {zgl.nazwisko}"
-		send_simple_mail(subject, zgl.email, "emails/wplata", context)
+		template = "emails/wplata"
 	elif instance.rodzaj == "zwrot":
 		subject = f"Zwrot wpłaconych środków {zgl.imie} {zgl.nazwisko}"
-		send_simple_mail(subject, zgl.email, "emails/wplata_zwrot", context)
+		template = "emails/wplata_zwrot"
+	else:
+		return
+	# po zatwierdzeniu transakcji - wpłatę z PayU zapisujemy pod blokadą płatności
+	transaction.on_commit(
+		lambda: send_simple_mail(subject, zgl.email, template, context),
+		robust=True,
+	)
 
 
 @receiver(post_save, sender=Ogloszenie)
@@ -115,3 +164,26 @@ def ogloszenie_post_save(sender, instance, created, **kwargs):
 			"link": link,
 		}
 		send_simple_mail(subject, z.email, "emails/ogloszenie", context)
+
+
+# ---------- DZIENNIK ZMIAN (kanał zmian, rejs/zmiany.py) ----------
+@receiver(post_save, sender=Zgloszenie)
+@receiver(post_save, sender=Wplata)
+@receiver(post_save, sender=PlatnoscPayU)
+@receiver(post_save, sender=Wachta)
+def zmiana_zapis(sender, instance, **kwargs):
+	zapisz_zmiany(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Zgloszenie)
+@receiver(post_delete, sender=Wplata)
+@receiver(post_delete, sender=PlatnoscPayU)
+@receiver(post_delete, sender=Wachta)
+def zmiana_usuniecie(sender, instance, **kwargs):
+	zapisz_zmiany(sender, [instance.pk], Zmiana.OPERACJA_USUNIECIE)
+
+
+@receiver(pre_delete, sender=Wachta)
+def wachta_pre_delete(sender, instance, **kwargs):
+	# SET_NULL na członkach idzie przez update() i omija post_save
+	zapisz_zmiany(Zgloszenie, instance.czlonkowie.values_list("pk", flat=True))
@@ -0,0 +1,159 @@
+"""
+Rotacja klucza i szyfru pól zaszyfrowanych (``EncryptedBinaryField``).
+
+Nowy klucz dopisuje się na początek ``DJANGO_FIELD_ENCRYPTION_KEY`` (klucze po
+przecinku). Odczyt działa od razu - szyfr próbuje kolejnych kluczy -
+a ``rotuj`` przepisuje istniejące wiersze na nowy klucz partiami po kluczu
+głównym. Każda partia to osobna krótka transakcja, która blokuje tylko swoje
+wiersze i zapisuje postęp w ``PostepRotacji``, więc przerwaną rotację
+wystarczy uruchomić ponownie. Tak samo po zmianie ``DJANGO_FIELD_CIPHER``:
+odczyt rozpoznaje szyfr po prefiksie, a rotacja zapisuje wiersze nowym.
+
+Ślepe indeksy nie zależą od klucza szyfrowania, tylko od
+``DJANGO_BLIND_INDEX_KEY`` - po jego zmianie przelicza je ``przelicz_indeksy``.
+"""
+
+import hashlib
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Dane_Dodatkowe, EncryptedBinaryField, PostepRotacji, indeks_slepy
+from .szyfry import BladSzyfrowania, klucze_szyfrowania, odszyfruj
+
+
+def modele_szyfrowane():
+	"""{model: [nazwy zaszyfrowanych pól]} dla modeli aplikacji rejs."""
+	wynik = {}
+	for model in apps.get_app_config("rejs").get_models():
+		pola = [
+			f.name
+			for f in model._meta.concrete_fields
+			if isinstance(f, EncryptedBinaryField)
+		]
+		if pola:
+			wynik[model] = pola
+	return wynik
+
+
+def odcisk_klucza():
+	"""Odcisk bieżącego szyfru i klucza - nowy rozpoczyna nową rotację."""
+	biezacy = f"{settings.DJANGO_FIELD_CIPHER}:{klucze_szyfrowania()[0]}"
+	return hashlib.sha256(biezacy.encode()).hexdigest()[:16]
+
+
+def rotuj(partia=500, pauza=0, od_nowa=False):
+	"""
+	Przepisuje zaszyfrowane pola na bieżący klucz. Zwraca Counter {model: wiersze}.
+
+	``pauza`` (sekundy) między partiami zostawia bazę innym zapytaniom.
+	"""
+	wynik = Counter()
+	odcisk = odcisk_klucza()
+	for model, pola in modele_szyfrowane().items():
+		postep, _ = PostepRotacji.objects.get_or_create(
+			model=model._meta.label_lower, klucz=odcisk
+		)
+		if od_nowa:
+			postep.ostatnie_id = 0
+			postep.przetworzone = 0
+			postep.zakonczona = None
+		if postep.zakonczona:
+			continue
+
+		while True:
+			with transaction.atomic():
+				# odczyt odszyfrowuje starym kluczem, zapis szyfruje bieżącym
+				wiersze = list(
+					model.objects
+					.select_for_update()
+					.filter(pk__gt=postep.ostatnie_id)
+					.only("pk", *pola)
+					.order_by("pk")[:partia]
+				)
+				if not wiersze:
+					postep.zakonczona = timezone.now()
+					postep.save()
+					break
+				model.objects.bulk_update(wiersze, pola)
+				postep.ostatnie_id = wiersze[-1].pk
+				postep.przetworzone += len(wiersze)
+				postep.save()
+			wynik[model._meta.label_lower] += len(wiersze)
+			if pauza:
+				time.sleep(pauza)
+	return wynik
+
+
+def na_starych_kluczach(partia=1000):
+	"""
+	Liczba wierszy, których nie odszyfruje sam bieżący szyfr z bieżącym kluczem.
+
+	Czyta surowe szyfrogramy (bez odszyfrowania przez pole). Gdy wynik to 0,
+	stare klucze można usunąć z ``DJANGO_FIELD_ENCRYPTION_KEY``.
+	"""
+	wynik = Counter()
+	for model, pola in modele_szyfrowane().items():
+		surowe = {f"_surowe_{pole}": Cast(pole, models.BinaryField()) for pole in pola}
+		ostatnie_id = 0
+		while True:
+			wiersze = list(
+				model.objects
+				.filter(pk__gt=ostatnie_id)
+				.annotate(**surowe)
+				.order_by("pk")
+				.values_list("pk", *surowe)[:partia]
+			)
+			if not wiersze:
+				break
+			ostatnie_id = wiersze[-1][0]
+			for _, *szyfrogramy in wiersze:
+				try:
+					for szyfrogram in szyfrogramy:
+						if szyfrogram is not None:
+							odszyfruj(szyfrogram, tylko_biezacy=True)
+				except BladSzyfrowania:
+					wynik[model._meta.label_lower] += 1
+	return wynik
+
+
+def przelicz_indeksy(partia=500, pauza=0):
+	"""
+	Przelicza ślepe indeksy PESEL-u i dokumentu bieżącym ``DJANGO_BLIND_INDEX_KEY``.
+
+	Partiami po kluczu głównym, każda w osobnej transakcji; zapisuje tylko
+	wiersze z nieaktualnym indeksem. Zwraca liczbę zmienionych wierszy.
+	"""
+	zmienione = 0
+	ostatnie_id = 0
+	while True:
+		with transaction.atomic():
+			wiersze = list(
+				Dane_Dodatkowe.objects
+				.select_for_update()
+				.filter(pk__gt=ostatnie_id)
+				.only("pk", "poz1", "poz3", "poz1_indeks", "poz3_indeks")
+				.order_by("pk")[:partia]
+			)
+			if not wiersze:
+				return zmienione
+			ostatnie_id = wiersze[-1].pk
+			do_zapisu = []
+			for dane in wiersze:
+				poz1_indeks = indeks_slepy("pesel", dane.poz1)
+				poz3_indeks = indeks_slepy("dokument", dane.poz3)
+				if (dane.poz1_indeks, dane.poz3_indeks) != (poz1_indeks, poz3_indeks):
+					dane.poz1_indeks = poz1_indeks
+					dane.poz3_indeks = poz3_indeks
+					do_zapisu.append(dane)
+			Dane_Dodatkowe.objects.bulk_update(
+				do_zapisu, ["poz1_indeks", "poz3_indeks"]
+			)
+		zmienione += len(do_zapisu)
+		if pauza:
+			time.sleep(pauza)
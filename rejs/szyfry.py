@@ -0,0 +1,246 @@
+"""
+Szyfry pól z danymi wrażliwymi.
+
+Klucze pochodzą z ``DJANGO_FIELD_ENCRYPTION_KEY`` (klucze Fernet po
+przecinku, pierwszy jest bieżący). ``EncryptedBinaryField`` zapisuje surowe
+bajty szyfrogramu poprzedzone bajtem szyfru, więc odczyt wybiera szyfr po
+prefiksie, a ``DJANGO_FIELD_CIPHER`` decyduje tylko o tym, czym szyfrować
+nowe zapisy:
+
+- ``fernet`` - token Fernet bez base64 (``\\x01`` + token),
+- ``aes-gcm`` - AES-256-GCM z kluczem wyprowadzonym HKDF z klucza Fernet
+  (``\\x02`` + identyfikator klucza + nonce + szyfrogram z tagiem).
+
+Po zmianie szyfru lub klucza komenda rotuj_klucze przepisuje stare wiersze.
+
+Eksporty całego sezonu odszyfrowują setki tysięcy wartości - ``z_odszyfrowanymi``
+pobiera surowe szyfrogramy querysetu i odszyfrowuje je partiami w puli procesów
+(``odszyfruj_wiele``), zamiast pole po polu w wątku żądania.
+
+Biblioteka cryptography jest importowana przy pierwszym użyciu szyfru, więc
+procesy, które niczego nie odszyfrowują (migrate, większość workerów), jej
+nie ładują.
+"""
+
+import base64
+import hashlib
+import os
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.functions import Cast
+
+if TYPE_CHECKING:
+	from cryptography.fernet import MultiFernet
+
+_pierscien: dict[str | None, "MultiFernet"] = {}
+_szyfry: dict[tuple[str, str | None], "SzyfrFernet | SzyfrAesGcm"] = {}
+# szyfry procesu roboczego odszyfruj_wiele: {prefiks: szyfr}
+_szyfry_procesu: dict[bytes, "SzyfrFernet | SzyfrAesGcm"] = {}
+
+
+class BladSzyfrowania(ValueError):
+	"""Szyfrogram nieznanego szyfru, obcego klucza albo uszkodzony."""
+
+
+def klucze_szyfrowania():
+	"""Klucze z DJANGO_FIELD_ENCRYPTION_KEY (po przecinku) - pierwszy jest bieżący."""
+	klucze = settings.DJANGO_FIELD_ENCRYPTION_KEY or ""
+	klucze = [k.strip() for k in klucze.split(",") if k.strip()]
+	if not klucze:
+		raise ImproperlyConfigured(
+			"Brak DJANGO_FIELD_ENCRYPTION_KEY - ustaw klucz w .env."
+		)
+	return klucze
+
+
+def pierscien_kluczy():
+	"""
+	MultiFernet: szyfruje pierwszym kluczem, odszyfrowuje każdym.
+
+	Po dopisaniu nowego klucza na początek stare dane dalej się odczytują,
+	a komenda rotuj_klucze przepisuje je na nowy klucz.
+	"""
+	from cryptography.fernet import Fernet, MultiFernet
+
+	klucze = settings.DJANGO_FIELD_ENCRYPTION_KEY
+	if klucze not in _pierscien:
+		_pierscien.clear()
+		_pierscien[klucze] = MultiFernet(
+			[Fernet(k.encode()) for k in klucze_szyfrowania()]
+		)
+	return _pierscien[klucze]
+
+
+class SzyfrFernet:
+	nazwa = "fernet"
+	prefiks = b"\x01"
+
+	def __init__(self, klucze):
+		from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+		self.biezacy = Fernet(klucze[0].encode())
+		self.pierscien = MultiFernet([Fernet(k.encode()) for k in klucze])
+		self.bledy = InvalidToken
+
+	def szyfruj(self, dane):
+		return self.prefiks + base64.urlsafe_b64decode(self.biezacy.encrypt(dane))
+
+	def odszyfruj(self, szyfrogram, tylko_biezacy=False):
+		token = base64.urlsafe_b64encode(szyfrogram[1:])
+		try:
+			return (self.biezacy if tylko_biezacy else self.pierscien).decrypt(token)
+		except self.bledy:
+			raise BladSzyfrowania from None
+
+
+class SzyfrAesGcm:
+	nazwa = "aes-gcm"
+	prefiks = b"\x02"
+	DLUGOSC_NONCE = 12
+
+	def __init__(self, klucze):
+		from cryptography.exceptions import InvalidTag
+		from cryptography.hazmat.primitives import hashes
+		from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+		from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+		self.bledy = InvalidTag
+		self.klucze = {}
+		for klucz in klucze:
+			surowy = HKDF(
+				algorithm=hashes.SHA256(), length=32, salt=None, info=b"rejs aes-gcm"
+			).derive(base64.urlsafe_b64decode(klucz))
+			# identyfikator klucza wybiera klucz przy odczycie, jak MultiFernet
+			self.klucze.setdefault(hashlib.sha256(surowy).digest()[:4], AESGCM(surowy))
+		self.biezacy_id = next(iter(self.klucze))
+
+	def szyfruj(self, dane):
+		nonce = os.urandom(self.DLUGOSC_NONCE)
+		naglowek = self.prefiks + self.biezacy_id
+		szyfrogram = self.klucze[self.biezacy_id].encrypt(nonce, dane, naglowek)
+		return naglowek + nonce + szyfrogram
+
+	def odszyfruj(self, szyfrogram, tylko_biezacy=False):
+		naglowek, id_klucza = szyfrogram[:5], szyfrogram[1:5]
+		koniec_nonce = 5 + self.DLUGOSC_NONCE
+		nonce, reszta = szyfrogram[5:koniec_nonce], szyfrogram[koniec_nonce:]
+		if id_klucza not in self.klucze or (
+			tylko_biezacy and id_klucza != self.biezacy_id
+		):
+			raise BladSzyfrowania
+		try:
+			return self.klucze[id_klucza].decrypt(nonce, reszta, naglowek)
+		except self.bledy:
+			raise BladSzyfrowania from None
+
+
+SZYFRY = {szyfr.nazwa: szyfr for szyfr in (SzyfrFernet, SzyfrAesGcm)}
+PO_PREFIKSIE = {szyfr.prefiks: szyfr.nazwa for szyfr in SZYFRY.values()}
+
+
+def szyfr(nazwa=None):
+	"""Szyfr z bieżącymi kluczami; domyślnie ten z DJANGO_FIELD_CIPHER."""
+	nazwa = nazwa or settings.DJANGO_FIELD_CIPHER
+	klucze = settings.DJANGO_FIELD_ENCRYPTION_KEY
+	if (nazwa, klucze) not in _szyfry:
+		if nazwa not in SZYFRY:
+			raise ValueError(f"Nieznany szyfr: {nazwa} (dostępne: {', '.join(SZYFRY)})")
+		_szyfry[nazwa, klucze] = SZYFRY[nazwa](klucze_szyfrowania())
+	return _szyfry[nazwa, klucze]
+
+
+def szyfruj(tekst):
+	return szyfr().szyfruj(tekst.encode())
+
+
+def odszyfruj(szyfrogram, tylko_biezacy=False):
+	"""
+	Odszyfrowuje bajty z prefiksem dowolnego znanego szyfru.
+
+	``tylko_biezacy`` przyjmuje wyłącznie bieżący szyfr i bieżący klucz - tak
+	rotuj_klucze sprawdza, które wiersze trzeba jeszcze przepisać.
+	"""
+	szyfrogram = bytes(szyfrogram)
+	nazwa = PO_PREFIKSIE.get(szyfrogram[:1])
+	if nazwa is None or (tylko_biezacy and nazwa != settings.DJANGO_FIELD_CIPHER):
+		raise BladSzyfrowania
+	return szyfr(nazwa).odszyfruj(szyfrogram, tylko_biezacy).decode()
+
+
+def token_na_bajty(token):
+	"""Tekstowy token Fernet (EncryptedTextField) jako bajty EncryptedBinaryField.
+
+	Bez odszyfrowania.
+	"""
+	return SzyfrFernet.prefiks + base64.urlsafe_b64decode(token)
+
+
+def _przygotuj_proces(klucze):
+	_szyfry_procesu.update({s.prefiks: s(klucze) for s in SZYFRY.values()})
+
+
+def _odszyfruj_partie(szyfrogramy):
+	wynik = []
+	for szyfrogram in szyfrogramy:
+		if szyfrogram is None:
+			wynik.append(None)
+			continue
+		szyfr_ = _szyfry_procesu.get(szyfrogram[:1])
+		if szyfr_ is None:
+			raise BladSzyfrowania
+		wynik.append(szyfr_.odszyfruj(szyfrogram).decode())
+	return wynik
+
+
+def odszyfruj_wiele(szyfrogramy, procesy=None, partia=2000, minimum=50000):
+	"""
+	Odszyfrowuje listę szyfrogramów (None zostaje None), zachowując kolejność.
+
+	Partie po ``partia`` wartości trafiają do puli ``procesy`` procesów
+	(domyślnie liczba rdzeni) - odszyfrowanie obciąża procesor, więc wątki
+	ograniczałby GIL. Poniżej ``minimum`` wartości start puli (około sekundy)
+	kosztuje więcej niż samo odszyfrowanie, więc działa bez niej.
+	"""
+	szyfrogramy = [None if s is None else bytes(s) for s in szyfrogramy]
+	procesy = procesy or os.cpu_count() or 1
+	if procesy == 1 or len(szyfrogramy) <= max(partia, minimum):
+		return [None if s is None else odszyfruj(s) for s in szyfrogramy]
+
+	import multiprocessing
+	from concurrent.futures import ProcessPoolExecutor
+
+	partie = [szyfrogramy[i:i + partia] for i in range(0, len(szyfrogramy), partia)]
+	# spawn: proces roboczy nie dziedziczy połączeń z bazą ani wątków serwera
+	with ProcessPoolExecutor(
+		max_workers=min(procesy, len(partie)),
+		mp_context=multiprocessing.get_context("spawn"),
+		initializer=_przygotuj_proces,
+		initargs=(klucze_szyfrowania(),),
+	) as pula:
+		wyniki = pula.map(_odszyfruj_partie, partie)
+		return [wartosc for wynik in wyniki for wartosc in wynik]
+
+
+def z_odszyfrowanymi(queryset, pola, procesy=None):
+	"""
+	Pary (obiekt, {pole: tekst}) dla wierszy querysetu, w ich kolejności.
+
+	``pola`` to zaszyfrowane pola, także przez relacje (``dane_dodatkowe__poz3``);
+	brak powiązanego wiersza daje None. Queryset nie powinien ładować tych pól
+	przez model, bo każde zostałoby odszyfrowane osobno.
+	"""
+	surowe = {
+		f"_szyfrogram_{nr}": Cast(pole, models.BinaryField())
+		for nr, pole in enumerate(pola)
+	}
+	obiekty = list(queryset.annotate(**surowe))
+	jawne = odszyfruj_wiele(
+		[getattr(obiekt, nazwa) for obiekt in obiekty for nazwa in surowe], procesy
+	)
+	return [
+		(obiekt, dict(zip(pola, jawne[nr * len(pola):(nr + 1) * len(pola)])))
+		for nr, obiekt in enumerate(obiekty)
+	]
@@ -0,0 +1,158 @@
+import time
+from datetime import date, timedelta
+
+import requests
+from django.conf import settings
+from django.test import LiveServerTestCase, RequestFactory, override_settings
+
+from rejs import payu, powiadomienia, zwroty
+from rejs.atrapa_payu import AtrapaPayU
+from rejs.models import (
+    PlatnoscPayU,
+    PowiadomieniePayU,
+    Rejs,
+    Wplata,
+    Zgloszenie,
+    ZwrotPayU,
+)
+from rejs.payu_verify import verify_payu_signature
+
+
+class AtrapaPayUTests(LiveServerTestCase):
+    """Pełna ścieżka zaplac -> płatność -> webhook -> powrót, na atrapie PayU."""
+
+    def uruchom_atrape(self, **opcje):
+        self.atrapa = AtrapaPayU(settings.PAYU["WEBHOOK_SECRET"], ziarno=1, **opcje)
+        adres = self.atrapa.uruchom(port=0)
+        self.addCleanup(self.atrapa.zatrzymaj)
+        ustawienia = override_settings(
+            RATE_LIMITS={},
+            PAYU={
+                **settings.PAYU,
+                "ENV": "local",
+                "LOCAL_URL": adres,
+                "RETRIES": 0,
+                "STATUS_LONGPOLL": 0,
+            },
+        )
+        ustawienia.enable()
+        self.addCleanup(ustawienia.disable)
+        payu.wyczysc_pamiec()
+        self.addCleanup(payu.wyczysc_pamiec)
+
+    def setUp(self):
+        rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            zaliczka=500,
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs,
+        )
+
+    def zaplac(self):
+        return requests.get(
+            f"{self.live_server_url}/payu/zaplac/{self.zgl.token}/zaliczka/",
+            allow_redirects=False,
+            timeout=10,
+        )
+
+    def czekaj_na_powiadomienia(self, liczba):
+        koniec = time.monotonic() + 10
+        while PowiadomieniePayU.objects.count() < liczba and time.monotonic() < koniec:
+            time.sleep(0.05)
+        self.assertEqual(PowiadomieniePayU.objects.count(), liczba)
+
+    def test_full_payment_flow(self):
+        self.uruchom_atrape()
+
+        response = self.zaplac()
+        self.assertEqual(response.status_code, 302)
+        strona_platnosci = response.headers["Location"]
+        self.assertTrue(strona_platnosci.startswith(self.atrapa.adres + "/pay/"))
+
+        response = requests.get(
+            strona_platnosci + "?wynik=COMPLETED", allow_redirects=False, timeout=10
+        )
+        powrot = response.headers["Location"]
+        self.assertIn("/payu/continue/", powrot)
+
+        # PENDING i COMPLETED
+        self.czekaj_na_powiadomienia(2)
+        self.assertEqual(powiadomienia.przetworz(), (2, 0))
+
+        platnosc = PlatnoscPayU.objects.get()
+        self.assertEqual(platnosc.status, PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(Wplata.objects.get().zrodlo_id, platnosc.payu_order_id)
+        self.assertIn("Dziękujemy za płatność", requests.get(powrot, timeout=10).text)
+
+    def test_refund_after_cancellation(self):
+        self.uruchom_atrape()
+        pay_url = self.zaplac().headers["Location"]
+        requests.get(pay_url + "?wynik=COMPLETED", allow_redirects=False, timeout=10)
+        self.czekaj_na_powiadomienia(2)
+        powiadomienia.przetworz()
+
+        zwroty.odwolaj_rejs(self.zgl.rejs)
+        self.assertEqual(zwroty.zlec_zwroty(na_sekunde=0)["zlecone"], 1)
+
+        order_id = PlatnoscPayU.objects.get().payu_order_id
+        self.assertEqual(
+            ZwrotPayU.objects.get().refund_id,
+            self.atrapa.pobierz_zwroty(order_id)[0]["refundId"],
+        )
+        self.assertEqual(self.zgl.suma_wplat, 0)
+
+    def test_duplicate_notifications_credit_once(self):
+        self.uruchom_atrape(duplikaty=1.0)
+
+        pay_url = self.zaplac().headers["Location"]
+        requests.get(pay_url + "?wynik=COMPLETED", allow_redirects=False, timeout=10)
+
+        self.czekaj_na_powiadomienia(4)
+        powiadomienia.przetworz()
+        self.assertEqual(Wplata.objects.count(), 1)
+
+    def test_status_poll_reads_order_from_fake(self):
+        self.uruchom_atrape()
+        self.zaplac()
+        platnosc = PlatnoscPayU.objects.get()
+        self.atrapa.zamowienia[platnosc.payu_order_id]["status"] = "COMPLETED"
+
+        adres = f"{self.live_server_url}/payu/status/{self.zgl.token}/{platnosc.id}/"
+        response = requests.get(adres, timeout=10)
+
+        self.assertEqual(response.json(), {"status": "COMPLETED", "zakonczona": True})
+
+    def test_payu_outage_shows_error_page(self):
+        self.uruchom_atrape(awarie=1.0)
+
+        response = self.zaplac()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Nie udało się połączyć z PayU", response.text)
+        self.assertEqual(PlatnoscPayU.objects.get().status, PlatnoscPayU.STATUS_FAILED)
+
+    def test_notification_signature_matches_verifier(self):
+        self.uruchom_atrape()
+        wynik = self.atrapa.utworz_zamowienie({"notifyUrl": None, "totalAmount": 50000})
+
+        body, naglowki = self.atrapa.powiadomienie(wynik["orderId"], "COMPLETED")
+        request = RequestFactory().post(
+            "/payu/webhook/",
+            data=body,
+            content_type="application/json",
+            HTTP_OPENPAYU_SIGNATURE=naglowki["OpenPayU-Signature"],
+        )
+
+        self.assertTrue(verify_payu_signature(request))
@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+from collections import Counter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+from rejs.baza import ponawiaj_przy_blokadzie
+from rejs.management.commands.benchmark_sqlite import zmierz
+
+ZABLOKOWANA = OperationalError("database is locked")
+
+
+@override_settings(DB_LOCK_RETRIES=2)
+class ProfilSqliteTests(SimpleTestCase):
+    def test_production_profile_pragmas(self):
+        with TemporaryDirectory() as katalog:
+            polaczenie = DatabaseWrapper(connections.configure_settings({"default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": str(Path(katalog) / "baza.sqlite3"),
+                "OPTIONS": settings.SQLITE_PRODUCTION_OPTIONS,
+            }})["default"], alias="profil")
+            with polaczenie.cursor() as kursor:
+                pragmy = {}
+                for pragma in (
+                    "journal_mode", "synchronous", "busy_timeout", "mmap_size"
+                ):
+                    kursor.execute(f"PRAGMA {pragma}")
+                    pragmy[pragma] = kursor.fetchone()[0]
+            polaczenie.close()
+
+        self.assertEqual(
+            pragmy,
+            {
+                "journal_mode": "wal",
+                "synchronous": 1,
+                "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+                "mmap_size": settings.SQLITE_MMAP_SIZE,
+            },
+        )
+        self.assertEqual(polaczenie.transaction_mode, "IMMEDIATE")
+
+    def test_production_profile_beats_default_under_concurrent_writes(self):
+        # suma z trzech przebiegów - pojedynczy na domyślnym profilu rzadko,
+        # ale bywa bez blokad
+        obciazenie = {"piszace": 8, "czytajace": 2, "transakcje": 25}
+        domyslny, produkcyjny = Counter(), Counter()
+        for _ in range(3):
+            domyslny += zmierz({}, **obciazenie)
+            produkcyjny += zmierz(settings.SQLITE_PRODUCTION_OPTIONS, **obciazenie)
+
+        self.assertEqual((produkcyjny["zapisy"], produkcyjny["blokady"]), (600, 0))
+        self.assertGreater(produkcyjny["odczyty"], 0)
+        self.assertLess(produkcyjny["blokady"], domyslny["blokady"])
+        self.assertGreater(produkcyjny["zapisy_na_s"], domyslny["zapisy_na_s"])
+
+    @patch("rejs.baza.time.sleep")
+    def test_lock_errors_are_retried(self, sleep):
+        funkcja = Mock(side_effect=[ZABLOKOWANA, ZABLOKOWANA, "ok"])
+
+        self.assertEqual(ponawiaj_przy_blokadzie(funkcja)(), "ok")
+        self.assertEqual(funkcja.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+        funkcja = Mock(side_effect=ZABLOKOWANA)
+        with self.assertRaises(OperationalError):
+            ponawiaj_przy_blokadzie(funkcja)()
+        self.assertEqual(funkcja.call_count, 3)
+
+    @patch("rejs.baza.time.sleep")
+    def test_other_errors_are_not_retried(self, sleep):
+        funkcja = Mock(side_effect=OperationalError("no such table: rejs_rejs"))
+
+        with self.assertRaises(OperationalError):
+            ponawiaj_przy_blokadzie(funkcja)()
+        self.assertEqual(funkcja.call_count, 1)
+
+    @override_settings(RATE_LIMITS={})
+    @patch("rejs.baza.time.sleep")
+    def test_webhook_is_retried_on_lock(self, sleep):
+        body = b'{"order": {"orderId": "X", "status": "COMPLETED"}}'
+        podpis = hmac.new(
+            settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+        ).hexdigest()
+
+        with patch(
+            "rejs.views_payu.odbierz", side_effect=[ZABLOKOWANA, object()]
+        ) as odbierz:
+            response = self.client.post(
+                "/payu/webhook/",
+                data=body,
+                content_type="application/json",
+                HTTP_OPENPAYU_SIGNATURE=f"sender=payu;signature=sha256={podpis}",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(odbierz.call_count, 2)
@@ -0,0 +1,168 @@
+import hashlib
+import hmac
+import json
+import uuid
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rejs.models import Dane_Dodatkowe, PlatnoscPayU, Rejs, Wachta, Wplata, Zgloszenie
+from rejs.reports import generate_rejs_report
+
+# liczba zgłoszeń na rejs
+ROZMIARY = (1, 10, 100)
+
+# stała liczba zapytań na stronę, niezależna od liczby zgłoszeń
+BUDZET = {
+    "index": 1,
+    "zgloszenie_details": 2,
+    "dane_dodatkowe_form": 2,
+    "zaplac": 11,
+    "payu_webhook": 1,
+    "admin_zgloszenie_lista": 6,
+    "admin_zgloszenie_zmiana": 10,
+    "admin_rejs_lista": 5,
+    "admin_rejs_zmiana": 12,
+    "admin_wachta_lista": 6,
+    "admin_wachta_zmiana": 8,
+    "raport": 6,
+}
+
+
+@override_settings(RATE_LIMITS={})
+class BudzetZapytanTests(TestCase):
+    """
+    Każda strona na rejsie z 1, 10 i 100 zgłoszeniami wykonuje tyle samo
+    zapytań. Zapytanie na wiersz (N+1) przekracza budżet, a komunikat
+    assertNumQueries wypisuje wszystkie wykonane zapytania.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@test.pl", "haslo")
+        cls.rejsy = {rozmiar: cls.zasiej(rozmiar) for rozmiar in ROZMIARY}
+
+    @classmethod
+    def zasiej(cls, rozmiar):
+        rejs = Rejs.objects.create(
+            nazwa=f"Rejs {rozmiar}",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        wachta = Wachta.objects.create(rejs=rejs, nazwa="Dziobowa")
+        zgloszenia = Zgloszenie.objects.bulk_create(
+            Zgloszenie(
+                imie="Anna",
+                nazwisko=f"Nowak{nr}",
+                email=f"{rozmiar}-{nr}@test.pl",
+                telefon="123456789",
+                data_urodzenia=date(2000, 1, 1),
+                kod_pocztowy="00-001",
+                rodo=True,
+                rejs=rejs,
+                wachta=wachta if nr % 2 else None,
+                status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+            )
+            for nr in range(rozmiar)
+        )
+        Wplata.objects.bulk_create(
+            Wplata(zgloszenie=zgl, kwota=kwota, rodzaj=rodzaj)
+            for zgl in zgloszenia
+            for kwota, rodzaj in ((500, "wplata"), (200, "payu"), (100, "zwrot"))
+        )
+        Dane_Dodatkowe.objects.bulk_create(
+            Dane_Dodatkowe(
+                zgloszenie=zgl,
+                poz1=f"0021011{nr:04d}",
+                poz2="paszport",
+                poz3=f"DOK{nr}",
+                pos4="Gdynia",
+                pos5="polskie",
+                pos6=date(2030, 1, 1),
+            )
+            for nr, zgl in enumerate(zgloszenia[1:])
+        )
+        PlatnoscPayU.objects.create(
+            zgloszenie=zgloszenia[0],
+            typ="zaliczka",
+            kwota=500,
+            payu_order_id=f"ORDER{rozmiar}",
+            status=PlatnoscPayU.STATUS_PENDING,
+        )
+        # pierwsze zgłoszenie bez danych dodatkowych - dla dane_dodatkowe_form
+        return rejs, wachta, zgloszenia[0]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def wyslij_powiadomienie(self, order_id):
+        zamowienie = {"orderId": order_id, "status": "COMPLETED"}
+        body = json.dumps({"order": zamowienie}).encode()
+        podpis = hmac.new(
+            settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            reverse("payu_webhook"),
+            data=body,
+            content_type="application/json",
+            HTTP_OPENPAYU_SIGNATURE=f"sender=payu;signature=sha256={podpis}",
+        )
+
+    def strony(self, rozmiar):
+        rejs, wachta, zgl = self.rejsy[rozmiar]
+        return {
+            "index": lambda: self.client.get(reverse("index")),
+            "zgloszenie_details": lambda: self.client.get(
+                reverse("zgloszenie_details", args=[zgl.token])
+            ),
+            "dane_dodatkowe_form": lambda: self.client.get(
+                reverse("dane_dodatkowe_form", args=[zgl.token])
+            ),
+            "zaplac": lambda: self.client.get(
+                reverse("zaplac", args=[zgl.token, "reszta"])
+            ),
+            "payu_webhook": lambda: self.wyslij_powiadomienie(f"ORDER{rozmiar}"),
+            "admin_zgloszenie_lista": lambda: self.client.get(
+                reverse("admin:rejs_zgloszenie_changelist"),
+                {"rejs__id__exact": rejs.pk},
+            ),
+            "admin_zgloszenie_zmiana": lambda: self.client.get(
+                reverse("admin:rejs_zgloszenie_change", args=[zgl.pk])
+            ),
+            "admin_rejs_lista": lambda: self.client.get(
+                reverse("admin:rejs_rejs_changelist")
+            ),
+            "admin_rejs_zmiana": lambda: self.client.get(
+                reverse("admin:rejs_rejs_change", args=[rejs.pk])
+            ),
+            "admin_wachta_lista": lambda: self.client.get(
+                reverse("admin:rejs_wachta_changelist"), {"rejs__id__exact": rejs.pk}
+            ),
+            "admin_wachta_zmiana": lambda: self.client.get(
+                reverse("admin:rejs_wachta_change", args=[wachta.pk])
+            ),
+            "raport": lambda: generate_rejs_report(rejs, self.admin),
+        }
+
+    @patch("rejs.views_payu.PayUClient")
+    def test_query_budget(self, payu):
+        payu.return_value.create_order.side_effect = lambda **kwargs: {
+            "orderId": f"NOWE{uuid.uuid4().hex}",
+            "redirectUri": "https://payu.example/pay",
+        }
+        for rozmiar in ROZMIARY:
+            for nazwa, strona in self.strony(rozmiar).items():
+                with self.subTest(strona=nazwa, zgloszenia=rozmiar):
+                    # bez pamięci typów z poprzedniej strony -
+                    # liczba nie zależy od kolejności
+                    ContentType.objects.clear_cache()
+                    with self.assertNumQueries(BUDZET[nazwa]):
+                        response = strona()
+                    self.assertLess(response.status_code, 400)
@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django import forms
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rejs.forms import ZgloszenieForm
+from rejs.models import Rejs, Zgloszenie
+
+
+@override_settings(RATE_LIMITS={})
+class DuplikatZgloszeniaTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.zgloszenie = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            wzrok="WIDZI",
+            obecnosc="tak",
+            adres="Chrzanowa 1a",
+            miejscowosc="Warszawa",
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+        )
+
+    def dane_formularza(self, **zmiany):
+        dane = {
+            "imie": "jan",
+            "nazwisko": "KOWALSKI",
+            "plec": "mezczyzna",
+            "email": "Jan@Test.pl",
+            "telefon": "123456789",
+            "data_urodzenia": "01.01.2000",
+            "adres": "Chrzanowa 1a",
+            "kod_pocztowy": "00-001",
+            "miejscowosc": "Warszawa",
+            "wzrok": "WIDZI",
+            "obecnosc": "tak",
+            "rozmiar_koszulki": "M",
+            "rodo": "on",
+        }
+        dane.update(zmiany)
+        return dane
+
+    def test_duplikaty_ignores_case(self):
+        duplikaty = Zgloszenie.objects.duplikaty
+        self.assertTrue(
+            duplikaty(self.rejs, "JAN", "kowalski", "JAN@test.pl").exists()
+        )
+        self.assertFalse(
+            duplikaty(self.rejs, "Anna", "Kowalski", "jan@test.pl").exists()
+        )
+
+    def test_duplikaty_uses_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Plan zapytania sprawdzany tylko dla SQLite.")
+        plan = Zgloszenie.objects.duplikaty(self.rejs, "a", "b", "c").explain()
+        self.assertIn("USING INDEX unique_zgloszenie_na_rejs_dla_osoby", plan)
+
+    def test_constraint_is_case_insensitive(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Zgloszenie.objects.create(
+                imie="JAN",
+                nazwisko="kowalski",
+                email="JAN@TEST.PL",
+                telefon="123456789",
+                data_urodzenia=date(2000, 1, 1),
+                kod_pocztowy="00-001",
+                rodo=True,
+                rejs=self.rejs,
+            )
+
+    def test_form_rejects_case_variant(self):
+        form = ZgloszenieForm(self.dane_formularza(), initial={"rejs": self.rejs})
+        self.assertFalse(form.is_valid())
+        self.assertIn(ZgloszenieForm.BLAD_DUPLIKATU, form.non_field_errors())
+
+    def test_insert_race_shows_form_error(self):
+        # symulacja wyścigu: clean() nie widzi jeszcze równoległego zgłoszenia
+        with patch.object(ZgloszenieForm, "clean", forms.ModelForm.clean):
+            response = self.client.post(
+                reverse("zgloszenie_utworz", kwargs={"rejs_id": self.rejs.id}),
+                self.dane_formularza(),
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            ZgloszenieForm.BLAD_DUPLIKATU,
+            response.context["form"].non_field_errors(),
+        )
+        self.assertEqual(Zgloszenie.objects.count(), 1)
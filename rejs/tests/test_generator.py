@@ -0,0 +1,106 @@
+import json
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from rejs.generator import generuj
+from rejs.management.commands.benchmark import zmierz
+from rejs.miejsca import STATUSY_BEZ_MIEJSCA
+from rejs.models import (
+    Dane_Dodatkowe,
+    Ogloszenie,
+    PlatnoscPayU,
+    Rejs,
+    Wachta,
+    Wplata,
+    Zgloszenie,
+    Zmiana,
+    indeks_slepy,
+)
+
+
+class GeneratorTests(TestCase):
+    def odcisk(self):
+        return list(
+            Zgloszenie.objects.order_by("token").values_list(
+                "token", "imie", "nazwisko", "status", "wachta__nazwa", "rejs__nazwa"
+            )
+        ) + list(
+            PlatnoscPayU.objects.order_by("payu_order_id").values_list(
+                "payu_order_id", "status"
+            )
+        )
+
+    def test_generates_related_rows(self):
+        wynik = generuj(rejsy=2, zgloszenia=20, ziarno=1)
+
+        self.assertEqual(Rejs.objects.count(), 2)
+        self.assertEqual(Zgloszenie.objects.count(), 40)
+        self.assertEqual(Wachta.objects.count(), 6)
+        self.assertEqual(Ogloszenie.objects.count(), 4)
+        self.assertEqual(wynik["zgloszenie"], 40)
+        self.assertEqual(wynik["wplata"], Wplata.objects.count())
+        zakwalifikowani = Zgloszenie.objects.filter(
+            status=Zgloszenie.STATUS_ZAKWALIFIKOWANY
+        )
+        self.assertEqual(Dane_Dodatkowe.objects.count(), zakwalifikowani.count())
+        self.assertFalse(zakwalifikowani.filter(wachta__isnull=True).exists())
+        self.assertFalse(zakwalifikowani.filter(wplaty__isnull=True).exists())
+
+        dane = Dane_Dodatkowe.objects.first()
+        self.assertEqual(dane.poz1_indeks, indeks_slepy("pesel", dane.poz1))
+        for rejs in Rejs.objects.all():
+            self.assertEqual(
+                rejs.zajete_miejsca,
+                rejs.zgloszenia.exclude(status__in=STATUSY_BEZ_MIEJSCA).count(),
+            )
+        self.assertEqual(Zmiana.objects.filter(model="zgloszenie").count(), 40)
+
+    def test_same_seed_same_data(self):
+        generuj(rejsy=1, zgloszenia=15, ziarno=7)
+        pierwszy = self.odcisk()
+        Rejs.objects.all().delete()
+        generuj(rejsy=1, zgloszenia=15, ziarno=7)
+
+        self.assertEqual(self.odcisk(), pierwszy)
+
+    def test_command_refuses_non_empty_database(self):
+        generuj(rejsy=1, zgloszenia=1)
+
+        with self.assertRaises(CommandError):
+            call_command("generuj_dane", rejsy=1, zgloszenia=1, stdout=StringIO())
+        call_command(
+            "generuj_dane",
+            rejsy=1,
+            zgloszenia=1,
+            ziarno=1,
+            dopisz=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Rejs.objects.count(), 2)
+
+
+@override_settings(RATE_LIMITS={})
+class BenchmarkTests(TestCase):
+    def test_measures_every_path(self):
+        wyniki = zmierz(rejsy=1, zgloszenia=10, powtorzenia=1, powiadomienia_na_probe=2)
+
+        self.assertEqual(
+            set(wyniki),
+            {
+                "generowanie",
+                "index",
+                "zgloszenie_details",
+                "admin_zgloszenia",
+                "admin_rejs",
+                "raport",
+                "webhook",
+                "przetworz_powiadomienia",
+                "linki_doplaty_nowe",
+                "linki_doplaty",
+            },
+        )
+        self.assertGreater(wyniki["index"]["mediana_ms"], 0)
+        self.assertEqual(wyniki["webhook"]["powiadomienia"], 2)
+        json.dumps(wyniki)
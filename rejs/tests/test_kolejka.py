@@ -0,0 +1,268 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.db import IntegrityError, OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rejs import kolejka
+from rejs.forms import ZgloszenieForm
+from rejs.models import Rejs, Zgloszenie
+
+
+def dane_formularza(nr, **zmiany):
+    dane = {
+        "imie": "Jan",
+        "nazwisko": f"Kowalski{nr}",
+        "plec": "mezczyzna",
+        "email": f"jan{nr}@test.pl",
+        "telefon": "123456789",
+        "data_urodzenia": "01.01.2000",
+        "adres": "Chrzanowa 1a",
+        "kod_pocztowy": "00-001",
+        "miejscowosc": "Warszawa",
+        "wzrok": "WIDZI",
+        "obecnosc": "tak",
+        "rozmiar_koszulki": "M",
+        "rodo": "on",
+    }
+    dane.update(zmiany)
+    return dane
+
+
+class KatalogKolejkiMixin:
+    def setUp(self):
+        super().setUp()
+        self.katalog = tempfile.mkdtemp()
+        self.ustawienia = override_settings(
+            SURGE_QUEUE_DIR=self.katalog, RATE_LIMITS={}
+        )
+        self.ustawienia.enable()
+        self.rejs = Rejs.objects.create(
+            nazwa="Popularny rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            tryb_kolejki=True,
+        )
+
+    def tearDown(self):
+        self.ustawienia.disable()
+        shutil.rmtree(self.katalog, ignore_errors=True)
+        super().tearDown()
+
+    def zglos(self, client, nr, **zmiany):
+        return client.post(
+            reverse("zgloszenie_utworz", kwargs={"rejs_id": self.rejs.id}),
+            dane_formularza(nr, **zmiany),
+        )
+
+
+class KolejkaZgloszenTests(KatalogKolejkiMixin, TestCase):
+    def test_submission_is_queued_not_saved(self):
+        response = self.zglos(self.client, 1)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Zgloszenie.objects.count(), 0)
+        self.assertEqual(kolejka.dlugosc(), 1)
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "rejs/zgloszenie_oczekujace.html")
+
+    def test_drain_creates_applications_in_order(self):
+        tokeny = [self.zglos(self.client, nr)["Location"] for nr in range(5)]
+
+        self.assertEqual(kolejka.przetworz(rozmiar_partii=3), (3, 0))
+        self.assertEqual(kolejka.przetworz(rozmiar_partii=3), (2, 0))
+        self.assertEqual(kolejka.przetworz(), (0, 0))
+
+        nazwiska = list(
+            Zgloszenie.objects.order_by("id").values_list("nazwisko", flat=True)
+        )
+        self.assertEqual(nazwiska, [f"Kowalski{nr}" for nr in range(5)])
+        for url in tokeny:
+            response = self.client.get(url)
+            self.assertTemplateUsed(response, "rejs/zgloszenie_details.html")
+
+    def test_returned_files_keep_their_place_in_queue(self):
+        for nr in range(3):
+            self.zglos(self.client, nr)
+        zajete = kolejka._zajmij(1)
+        with open(zajete[0]) as f:
+            self.assertEqual(zajete[0].name, f"{json.load(f)['token']}.json")
+
+        kolejka._oddaj(zajete)
+
+        self.assertEqual(kolejka.przetworz(rozmiar_partii=1), (1, 0))
+        self.assertEqual(Zgloszenie.objects.get().nazwisko, "Kowalski0")
+
+    def test_duplicate_in_queue_is_rejected(self):
+        self.zglos(self.client, 1)
+        url = self.zglos(self.client, 1, imie="JAN")["Location"]
+
+        with self.assertLogs("rejs.kolejka", "WARNING"):
+            self.assertEqual(kolejka.przetworz(), (1, 1))
+        self.assertEqual(Zgloszenie.objects.count(), 1)
+
+        response = self.client.get(url)
+        self.assertTrue(response.context["odrzucone"])
+        self.assertContains(response, "istnieje już zgłoszenie")
+
+    def test_abandoned_files_are_recovered(self):
+        self.zglos(self.client, 1)
+        # proces zajął plik i przerwał pracę
+        plik = kolejka._zajmij(1)[0]
+        stary = time.time() - 3600
+        os.utime(plik, (stary, stary))
+
+        self.assertEqual(kolejka.przywroc_porzucone(), 1)
+        self.assertEqual(kolejka.przetworz(), (1, 0))
+        self.assertEqual(Zgloszenie.objects.count(), 1)
+
+    def test_reprocessed_file_is_not_duplicated(self):
+        self.zglos(self.client, 1)
+        nowe = os.path.join(self.katalog, kolejka.NOWE)
+        nazwa = os.listdir(nowe)[0]
+        kopia = shutil.copy(os.path.join(nowe, nazwa), self.katalog)
+        kolejka.przetworz()
+
+        # awaria po zapisie do bazy, a przed usunięciem pliku
+        shutil.move(kopia, os.path.join(nowe, nazwa))
+
+        self.assertEqual(kolejka.przetworz(), (1, 0))
+        self.assertEqual(Zgloszenie.objects.count(), 1)
+
+    def test_poison_entries_are_rejected_and_batch_goes_on(self):
+        self.zglos(self.client, 1)
+        nowe = os.path.join(self.katalog, kolejka.NOWE)
+        with open(os.path.join(nowe, "zepsuty.json"), "w") as f:
+            f.write("{nie json")
+        with open(os.path.join(nowe, "bez-rejsu.json"), "w") as f:
+            json.dump({"token": str(uuid.uuid4()), "dane": {}}, f)
+        # trafiają przed prawidłowe zgłoszenie
+        for nr, nazwa in enumerate(("zepsuty.json", "bez-rejsu.json")):
+            os.utime(os.path.join(nowe, nazwa), (nr, nr))
+
+        with self.assertLogs("rejs.kolejka", "WARNING"):
+            self.assertEqual(kolejka.przetworz(), (1, 2))
+
+        self.assertEqual(Zgloszenie.objects.count(), 1)
+        self.assertEqual(kolejka.dlugosc(), 0)
+        self.assertEqual(os.listdir(os.path.join(self.katalog, kolejka.W_TOKU)), [])
+        odrzucone = os.path.join(self.katalog, kolejka.ODRZUCONE)
+        with open(os.path.join(odrzucone, "bez-rejsu.json")) as f:
+            wpis = json.load(f)
+        self.assertEqual(wpis["powod"], kolejka.POWOD_BLEDU)
+        self.assertIn("KeyError", wpis["blad"])
+        with open(os.path.join(odrzucone, "zepsuty.json")) as f:
+            self.assertEqual(json.load(f)["tresc"], "{nie json")
+
+    def test_unexpected_database_error_rolls_back_only_its_entry(self):
+        self.zglos(self.client, 1)
+        self.zglos(self.client, 2)
+        zapisz = ZgloszenieForm.zapisz
+
+        def blad_dla_pierwszego(form, rejs, token=None):
+            if form.cleaned_data["nazwisko"] == "Kowalski1":
+                zapisz(form, rejs, token=token)
+                raise IntegrityError("CHECK constraint failed")
+            return zapisz(form, rejs, token=token)
+
+        with patch.object(ZgloszenieForm, "zapisz", blad_dla_pierwszego):
+            with self.assertLogs("rejs.kolejka", "WARNING"):
+                self.assertEqual(kolejka.przetworz(), (1, 1))
+
+        self.assertEqual(
+            list(Zgloszenie.objects.values_list("nazwisko", flat=True)), ["Kowalski2"]
+        )
+
+    def test_unknown_token_is_404(self):
+        response = self.client.get(
+            reverse("zgloszenie_details", kwargs={"token": uuid.uuid4()})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class KolejkaBlokadaTests(KatalogKolejkiMixin, TransactionTestCase):
+    def test_locked_database_is_retried(self):
+        self.zglos(self.client, 1)
+        zapisz_wpis = kolejka._zapisz_wpis
+        proby = []
+
+        def zablokowana(wpis, rejsy):
+            proby.append(1)
+            if len(proby) == 1:
+                raise OperationalError("database is locked")
+            return zapisz_wpis(wpis, rejsy)
+
+        with patch("rejs.kolejka._zapisz_wpis", zablokowana):
+            self.assertEqual(kolejka.przetworz(), (1, 0))
+        self.assertEqual(len(proby), 2)
+        self.assertEqual(Zgloszenie.objects.count(), 1)
+
+    @override_settings(DB_LOCK_RETRIES=0)
+    def test_files_go_back_to_queue_when_lock_persists(self):
+        self.zglos(self.client, 1)
+
+        blokada = OperationalError("database is locked")
+        with patch("rejs.kolejka._zapisz_wpis", side_effect=blokada):
+            with self.assertRaises(OperationalError):
+                kolejka.przetworz()
+
+        self.assertEqual(kolejka.dlugosc(), 1)
+        self.assertEqual(kolejka.przetworz(), (1, 0))
+
+
+class KolejkaObciazenieTests(KatalogKolejkiMixin, TransactionTestCase):
+    """Test obciążeniowy: równoległe zgłoszenia w trybie kolejki nie giną."""
+
+    LICZBA = 200
+    WATKI = 20
+
+    def test_no_submission_is_lost(self):
+        tokeny = []
+        bledy = []
+        blokada = threading.Lock()
+        start = threading.Barrier(self.WATKI)
+
+        def wysylaj(numery):
+            client = Client()
+            start.wait()
+            try:
+                for nr in numery:
+                    response = self.zglos(client, nr)
+                    with blokada:
+                        if response.status_code == 302:
+                            tokeny.append(response["Location"].rstrip("/").split("/")[-1])
+                        else:
+                            bledy.append(response.status_code)
+            finally:
+                connection.close()
+
+        watki = [
+            threading.Thread(target=wysylaj, args=(range(i, self.LICZBA, self.WATKI),))
+            for i in range(self.WATKI)
+        ]
+        for w in watki:
+            w.start()
+        for w in watki:
+            w.join()
+
+        self.assertEqual(bledy, [])
+        self.assertEqual(len(tokeny), self.LICZBA)
+
+        while kolejka.przetworz(rozmiar_partii=50) != (0, 0):
+            pass
+
+        zapisane = {str(t) for t in Zgloszenie.objects.values_list("token", flat=True)}
+        self.assertEqual(zapisane, set(tokeny))
+        self.assertEqual(kolejka.dlugosc(), 0)
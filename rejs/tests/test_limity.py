@@ -0,0 +1,98 @@
+import uuid
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rejs.models import PlatnoscPayU, Rejs, Zgloszenie
+
+
+@override_settings(
+    RATE_LIMITS={
+        "zgloszenie_details": {"ip": (3, 60)},
+        "zaplac": {"ip": (100, 60), "token": (2, 60)},
+    },
+    RATE_LIMIT_IP_HEADER="",
+)
+class LimitZapytanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+        )
+        self.url = reverse("zgloszenie_details", kwargs={"token": self.zgl.token})
+
+    def test_over_limit_returns_429_with_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+
+    def test_limit_is_per_ip(self):
+        for _ in range(3):
+            self.client.get(self.url)
+
+        response = self.client.get(self.url, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 200)
+
+    def test_bucket_refills_over_time(self):
+        with patch("rejs.limity.time.time", return_value=1000.0):
+            for _ in range(3):
+                self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+        with patch("rejs.limity.time.time", return_value=1020.0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+    def test_zaplac_rejected_before_payu(self):
+        url = reverse("zaplac", args=[self.zgl.token, "zaliczka"])
+        with patch("rejs.views_payu.PayUClient") as payu:
+            payu.return_value.create_order.return_value = {
+                "orderId": "X",
+                "redirectUri": "https://payu.example/pay",
+            }
+            for nr in range(2):
+                response = self.client.get(url, REMOTE_ADDR=f"10.0.0.{nr}")
+                self.assertEqual(response.status_code, 302)
+
+            response = self.client.get(url, REMOTE_ADDR="10.0.0.9")
+
+        self.assertEqual(response.status_code, 429)
+        # drugie kliknięcie używa ponownie tego samego zamówienia
+        self.assertEqual(payu.return_value.create_order.call_count, 1)
+        self.assertEqual(PlatnoscPayU.objects.count(), 1)
+
+    def test_unknown_token_counts_separately(self):
+        url = reverse("zaplac", args=[uuid.uuid4(), "zaliczka"])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+    @override_settings(RATE_LIMIT_IP_HEADER="HTTP_X_FORWARDED_FOR")
+    def test_forwarded_header_uses_proxy_entry(self):
+        for _ in range(3):
+            self.client.get(self.url, HTTP_X_FORWARDED_FOR="1.1.1.1, 10.0.0.5")
+
+        response = self.client.get(self.url, HTTP_X_FORWARDED_FOR="2.2.2.2, 10.0.0.5")
+        self.assertEqual(response.status_code, 429)
+        response = self.client.get(self.url, HTTP_X_FORWARDED_FOR="10.0.0.6")
+        self.assertEqual(response.status_code, 200)
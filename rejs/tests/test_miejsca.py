@@ -0,0 +1,195 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core import mail
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rejs.miejsca import przelicz_miejsca, uzupelnij_z_listy_rezerwowej, zajmij_miejsce
+from rejs.models import Rejs, Zgloszenie
+
+
+def utworz_rejs(**kwargs):
+    dane = {
+        "nazwa": "Testowy rejs",
+        "od": date.today() + timedelta(days=30),
+        "do": date.today() + timedelta(days=40),
+        "start": "Gdynia",
+        "koniec": "Gdańsk",
+    }
+    dane.update(kwargs)
+    return Rejs.objects.create(**dane)
+
+
+def utworz_zgloszenie(rejs, nr, **kwargs):
+    dane = {
+        "imie": "Jan",
+        "nazwisko": f"Kowalski{nr}",
+        "email": f"jan{nr}@test.pl",
+        "telefon": "123456789",
+        "data_urodzenia": date(2000, 1, 1),
+        "kod_pocztowy": "00-001",
+        "rodo": True,
+        "rejs": rejs,
+    }
+    dane.update(kwargs)
+    return Zgloszenie.objects.create(**dane)
+
+
+def dane_formularza(nr):
+    return {
+        "imie": "Jan",
+        "nazwisko": f"Kowalski{nr}",
+        "plec": "mezczyzna",
+        "email": f"jan{nr}@test.pl",
+        "telefon": "123456789",
+        "data_urodzenia": "01.01.2000",
+        "adres": "Chrzanowa 1a",
+        "kod_pocztowy": "00-001",
+        "miejscowosc": "Warszawa",
+        "wzrok": "WIDZI",
+        "obecnosc": "tak",
+        "rozmiar_koszulki": "M",
+        "rodo": "on",
+    }
+
+
+@override_settings(RATE_LIMITS={})
+class LimitMiejscTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.rejs = utworz_rejs(liczba_miejsc=2)
+
+    def zglos(self, nr):
+        self.client.post(
+            reverse("zgloszenie_utworz", kwargs={"rejs_id": self.rejs.id}),
+            dane_formularza(nr),
+        )
+        return Zgloszenie.objects.get(nazwisko=f"Kowalski{nr}")
+
+    def test_applicants_past_limit_go_to_waitlist(self):
+        statusy = [self.zglos(nr).status for nr in range(4)]
+
+        self.assertEqual(
+            statusy,
+            [
+                Zgloszenie.STATUS_NIEZAKWALIFIKOWANY,
+                Zgloszenie.STATUS_NIEZAKWALIFIKOWANY,
+                Zgloszenie.STATUS_REZERWOWA,
+                Zgloszenie.STATUS_REZERWOWA,
+            ],
+        )
+        self.rejs.refresh_from_db()
+        self.assertEqual(self.rejs.zajete_miejsca, 2)
+
+    def test_waitlist_position(self):
+        for nr in range(4):
+            self.zglos(nr)
+
+        self.assertEqual(
+            Zgloszenie.objects.get(nazwisko="Kowalski3").pozycja_na_liscie_rezerwowej, 2
+        )
+        self.assertIsNone(
+            Zgloszenie.objects.get(nazwisko="Kowalski0").pozycja_na_liscie_rezerwowej
+        )
+
+    def test_rejection_promotes_first_from_waitlist(self):
+        for nr in range(4):
+            self.zglos(nr)
+        mail.outbox.clear()
+
+        odrzucone = Zgloszenie.objects.get(nazwisko="Kowalski0")
+        odrzucone.status = Zgloszenie.STATUS_ODRZUCONE
+        odrzucone.save()
+
+        awansowane = Zgloszenie.objects.get(nazwisko="Kowalski2")
+        self.assertEqual(awansowane.status, Zgloszenie.STATUS_NIEZAKWALIFIKOWANY)
+        self.assertEqual(
+            Zgloszenie.objects.get(nazwisko="Kowalski3").status,
+            Zgloszenie.STATUS_REZERWOWA,
+        )
+        self.rejs.refresh_from_db()
+        self.assertEqual(self.rejs.zajete_miejsca, 2)
+        self.assertTrue(
+            any(m.subject.startswith("Zwolniło się miejsce") for m in mail.outbox)
+        )
+
+    def test_rejection_without_waitlist_frees_seat(self):
+        zgl = self.zglos(0)
+        zgl.status = Zgloszenie.STATUS_ODRZUCONE
+        zgl.save()
+
+        self.rejs.refresh_from_db()
+        self.assertEqual(self.rejs.zajete_miejsca, 0)
+
+    def test_raising_limit_fills_from_waitlist(self):
+        for nr in range(4):
+            self.zglos(nr)
+
+        Rejs.objects.filter(pk=self.rejs.pk).update(liczba_miejsc=3)
+        awansowani = uzupelnij_z_listy_rezerwowej(self.rejs.pk)
+
+        self.assertEqual([z.nazwisko for z in awansowani], ["Kowalski2"])
+        self.rejs.refresh_from_db()
+        self.assertEqual(self.rejs.zajete_miejsca, 3)
+
+    def test_waitlisted_cannot_pay_deposit(self):
+        for nr in range(3):
+            zgl = self.zglos(nr)
+
+        response = self.client.get(reverse("zaplac", args=[zgl.token, "zaliczka"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_saving_rejs_keeps_counter(self):
+        rejs = Rejs.objects.get(pk=self.rejs.pk)
+        self.zglos(0)
+
+        rejs.nazwa = "Nowa nazwa"
+        rejs.save()
+
+        rejs.refresh_from_db()
+        self.assertEqual(rejs.zajete_miejsca, 1)
+
+    def test_przelicz_miejsca(self):
+        utworz_zgloszenie(self.rejs, 1)
+        utworz_zgloszenie(self.rejs, 2, status=Zgloszenie.STATUS_ODRZUCONE)
+        Rejs.objects.filter(pk=self.rejs.pk).update(zajete_miejsca=7)
+
+        przelicz_miejsca(Rejs.objects.filter(pk=self.rejs.pk))
+
+        self.rejs.refresh_from_db()
+        self.assertEqual(self.rejs.zajete_miejsca, 1)
+
+
+class RownoczesneZajmowanieMiejscTests(TransactionTestCase):
+    def test_concurrent_claims_never_exceed_limit(self):
+        rejs = utworz_rejs(liczba_miejsc=10)
+        wyniki = []
+        start = threading.Barrier(40)
+
+        def zajmij():
+            start.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        wyniki.append(zajmij_miejsce(rejs.pk))
+                        return
+                    except OperationalError:
+                        # współdzielona baza testowa SQLite w pamięci
+                        # nie czeka na blokadę
+                        time.sleep(0.005)
+            finally:
+                connection.close()
+
+        watki = [threading.Thread(target=zajmij) for _ in range(40)]
+        for w in watki:
+            w.start()
+        for w in watki:
+            w.join()
+
+        self.assertEqual(len(wyniki), 40)
+        self.assertEqual(wyniki.count(True), 10)
+        rejs.refresh_from_db()
+        self.assertEqual(rejs.zajete_miejsca, 10)
@@ -0,0 +1,116 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from rejs import payu
+from rejs.payu import PayUClient
+
+USTAWIENIA_PAYU = {
+    "ENV": "sandbox",
+    "CLIENT_ID": "123",
+    "CLIENT_SECRET": "abc",
+    "POS_ID": "123",
+    "WEBHOOK_SECRET": "abc",
+    "TIMEOUT": 3,
+}
+
+
+def odpowiedz(status=200, dane=None):
+    r = MagicMock(status_code=status)
+    r.json.return_value = dane or {}
+    return r
+
+
+@override_settings(PAYU=USTAWIENIA_PAYU)
+class PayUClientTests(SimpleTestCase):
+    def setUp(self):
+        payu.wyczysc_pamiec()
+        self.addCleanup(payu.wyczysc_pamiec)
+        self.sesja = payu.sesja()
+        self.post = patch.object(self.sesja, "post").start()
+        self.request = patch.object(self.sesja, "request").start()
+        self.addCleanup(patch.stopall)
+        self.post.return_value = odpowiedz(
+            dane={"access_token": "T1", "expires_in": 43199}
+        )
+        self.request.return_value = odpowiedz(dane={"orders": [{"status": "PENDING"}]})
+
+    def test_session_is_shared(self):
+        self.assertIs(PayUClient().session, PayUClient().session)
+
+    def test_token_is_reused_between_calls(self):
+        PayUClient().get_order("A")
+        PayUClient().get_order("B")
+
+        self.assertEqual(self.post.call_count, 1)
+        self.assertEqual(self.request.call_count, 2)
+        naglowki = self.request.call_args.kwargs["headers"]
+        self.assertEqual(naglowki["Authorization"], "Bearer T1")
+        self.assertEqual(self.request.call_args.kwargs["timeout"], 3)
+
+    def test_token_renewed_before_expiry(self):
+        with patch("rejs.payu.time.monotonic", return_value=1000.0):
+            PayUClient().get_token()
+        # ważny jeszcze 30 s, ale to już mniej niż zapas
+        with patch("rejs.payu.time.monotonic", return_value=1000.0 + 43199 - 30):
+            PayUClient().get_token()
+
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_unauthorized_refreshes_token_once(self):
+        self.post.side_effect = [
+            odpowiedz(dane={"access_token": "T1", "expires_in": 43199}),
+            odpowiedz(dane={"access_token": "T2", "expires_in": 43199}),
+        ]
+        self.request.side_effect = [
+            odpowiedz(401),
+            odpowiedz(dane={"orders": []}),
+        ]
+
+        self.assertEqual(PayUClient().get_order("A"), {"orders": []})
+        self.assertEqual(
+            self.request.call_args.kwargs["headers"]["Authorization"], "Bearer T2"
+        )
+
+    def test_unauthorized_keeps_token_already_replaced_by_other_thread(self):
+        self.post.side_effect = [
+            odpowiedz(dane={"access_token": "T1", "expires_in": 43199}),
+            odpowiedz(dane={"access_token": "T2", "expires_in": 43199}),
+        ]
+        client = PayUClient()
+        self.assertEqual(client.get_token(), "T1")
+        # drugi wątek dostał 401 na T1 i już odnowił token
+        self.assertEqual(client.get_token(odrzucony="T1"), "T2")
+
+        self.assertEqual(client.get_token(odrzucony="T1"), "T2")
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_concurrent_callers_fetch_one_token(self):
+        def wolny_token(*args, **kwargs):
+            time.sleep(0.05)
+            return odpowiedz(dane={"access_token": "T1", "expires_in": 43199})
+
+        self.post.side_effect = wolny_token
+        tokeny = []
+        start = threading.Barrier(10)
+
+        def pobierz():
+            start.wait()
+            tokeny.append(PayUClient().get_token())
+
+        watki = [threading.Thread(target=pobierz) for _ in range(10)]
+        for w in watki:
+            w.start()
+        for w in watki:
+            w.join()
+
+        self.assertEqual(tokeny, ["T1"] * 10)
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_post_is_not_retried_on_server_error(self):
+        adapter = self.sesja.get_adapter("https://secure.snd.payu.com")
+        retry = adapter.max_retries
+        self.assertIn("GET", retry.allowed_methods)
+        self.assertNotIn("POST", retry.allowed_methods)
@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core import mail
+from django.db import IntegrityError, OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rejs import powiadomienia
+from rejs.models import PlatnoscPayU, Rejs, Wplata, Zgloszenie
+
+PAYU_ZAWSZE_PYTAJ = {**settings.PAYU, "STATUS_INTERVAL": 0, "STATUS_LONGPOLL": 0}
+
+
+def utworz_platnosc(order_id="ORDER_1"):
+    rejs = Rejs.objects.create(
+        nazwa="Testowy rejs",
+        od=date.today() + timedelta(days=30),
+        do=date.today() + timedelta(days=40),
+        start="Gdynia",
+        koniec="Gdańsk",
+        zaliczka=500,
+    )
+    zgl = Zgloszenie.objects.create(
+        imie="Jan",
+        nazwisko="Kowalski",
+        email="jan@test.pl",
+        telefon="123456789",
+        data_urodzenia=date(2000, 1, 1),
+        kod_pocztowy="00-001",
+        rodo=True,
+        rejs=rejs,
+    )
+    return PlatnoscPayU.objects.create(
+        zgloszenie=zgl,
+        typ="zaliczka",
+        kwota=500,
+        payu_order_id=order_id,
+        status=PlatnoscPayU.STATUS_PENDING,
+    )
+
+
+class UnikalnoscTests(TestCase):
+    def test_payu_order_id_is_unique(self):
+        platnosc = utworz_platnosc()
+        with self.assertRaises(IntegrityError):
+            PlatnoscPayU.objects.create(
+                zgloszenie=platnosc.zgloszenie,
+                typ="zaliczka",
+                kwota=500,
+                payu_order_id="ORDER_1",
+            )
+
+    def test_orders_without_id_are_allowed(self):
+        platnosc = utworz_platnosc(order_id=None)
+        PlatnoscPayU.objects.create(
+            zgloszenie=platnosc.zgloszenie, typ="zaliczka", kwota=500
+        )
+
+        self.assertEqual(PlatnoscPayU.objects.filter(payu_order_id=None).count(), 2)
+
+    def test_wplata_source_is_unique_per_kind(self):
+        zgl = utworz_platnosc().zgloszenie
+        Wplata.objects.create(
+            zgloszenie=zgl, kwota=500, rodzaj=Wplata.RODZAJ_PAYU, zrodlo_id="X"
+        )
+        # ręczne wpłaty bez źródła mogą się powtarzać
+        Wplata.objects.create(zgloszenie=zgl, kwota=100, rodzaj="wplata")
+        Wplata.objects.create(zgloszenie=zgl, kwota=100, rodzaj="wplata", zrodlo_id="")
+
+        with self.assertRaises(IntegrityError):
+            Wplata.objects.create(
+                zgloszenie=zgl, kwota=500, rodzaj=Wplata.RODZAJ_PAYU, zrodlo_id="X"
+            )
+
+
+@override_settings(RATE_LIMITS={}, PAYU=PAYU_ZAWSZE_PYTAJ)
+class RownoczesneKsiegowanieTests(TransactionTestCase):
+    """Webhook i powrót z PayU w tym samym momencie księgują jedną wpłatę."""
+
+    WATKI = 12
+
+    def test_webhook_and_browser_return_credit_once(self):
+        platnosc = utworz_platnosc()
+        zamowienie = {"orderId": "ORDER_1", "status": "COMPLETED"}
+        body = json.dumps({"order": zamowienie}).encode()
+        podpis = hmac.new(
+            settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+        ).hexdigest()
+        url_statusu = reverse(
+            "payu_status", args=[platnosc.zgloszenie.token, platnosc.id]
+        )
+        mail.outbox.clear()
+
+        def webhook(client):
+            client.post(
+                "/payu/webhook/",
+                data=body,
+                content_type="application/json",
+                HTTP_OPENPAYU_SIGNATURE=f"sender=payu;signature=sha256={podpis}",
+            )
+            powiadomienia.przetworz()
+
+        def powrot(client):
+            client.get(url_statusu)
+
+        bledy = []
+        start = threading.Barrier(self.WATKI)
+
+        def uruchom(sciezka):
+            client = Client()
+            start.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        sciezka(client)
+                        return
+                    except OperationalError:
+                        # współdzielona baza testowa SQLite w pamięci
+                        # nie czeka na blokadę
+                        time.sleep(0.005)
+                bledy.append("nie udało się w 200 próbach")
+            except Exception as e:
+                bledy.append(e)
+            finally:
+                connection.close()
+
+        # odłożone przez blokadę bazy powiadomienia nie są tu istotne
+        with (
+            patch("rejs.platnosci.PayUClient") as payu,
+            patch("rejs.powiadomienia.logger"),
+        ):
+            payu.return_value.get_order.return_value = {
+                "orders": [{"status": "COMPLETED"}]
+            }
+            watki = [
+                threading.Thread(target=uruchom, args=(webhook if i % 2 else powrot,))
+                for i in range(self.WATKI)
+            ]
+            for w in watki:
+                w.start()
+            for w in watki:
+                w.join()
+
+        self.assertEqual(bledy, [])
+        self.assertEqual(Wplata.objects.filter(zrodlo_id="ORDER_1").count(), 1)
+        platnosc.refresh_from_db()
+        self.assertEqual(platnosc.status, PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(len(mail.outbox), 1)
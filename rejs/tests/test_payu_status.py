@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import requests
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rejs.models import PlatnoscPayU, Rejs, Wplata, Zgloszenie
+from rejs.views_payu import MAKS_LONGPOLL
+
+PAYU_BEZ_CZEKANIA = {**settings.PAYU, "STATUS_INTERVAL": 30, "STATUS_LONGPOLL": 0}
+
+
+@override_settings(RATE_LIMITS={}, PAYU=PAYU_BEZ_CZEKANIA)
+class StatusPlatnosciTests(TestCase):
+    def setUp(self):
+        rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            zaliczka=500,
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs,
+        )
+        self.platnosc = PlatnoscPayU.objects.create(
+            zgloszenie=self.zgl,
+            typ="zaliczka",
+            kwota=500,
+            payu_order_id="ORDER_1",
+            status=PlatnoscPayU.STATUS_PENDING,
+        )
+        self.payu = patch("rejs.platnosci.PayUClient").start()
+        self.addCleanup(patch.stopall)
+        self.get_order = self.payu.return_value.get_order
+        self.get_order.return_value = {"orders": [{"status": "COMPLETED"}]}
+
+    def url(self, nazwa):
+        return reverse(nazwa, args=[self.zgl.token, self.platnosc.id])
+
+    def test_continue_renders_local_state_without_payu(self):
+        response = self.client.get(self.url("payu_continue"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["status"], PlatnoscPayU.STATUS_PENDING)
+        self.assertContains(response, self.url("payu_status"))
+        self.get_order.assert_not_called()
+
+    def test_continue_shows_completed_when_payu_is_down(self):
+        self.platnosc.status = PlatnoscPayU.STATUS_COMPLETED
+        self.platnosc.save()
+        self.get_order.side_effect = requests.ConnectionError
+
+        response = self.client.get(self.url("payu_continue"))
+
+        self.assertContains(response, "Dziękujemy za płatność")
+        self.assertNotContains(response, self.url("payu_status"))
+
+    def test_stale_status_is_fetched_and_applied(self):
+        response = self.client.get(self.url("payu_status"), {"status": "PENDING"})
+
+        self.assertEqual(response.json(), {"status": "COMPLETED", "zakonczona": True})
+        self.get_order.assert_called_once_with("ORDER_1")
+        wplaty = Wplata.objects.filter(zrodlo_id="ORDER_1", rodzaj=Wplata.RODZAJ_PAYU)
+        self.assertEqual(wplaty.count(), 1)
+
+    def test_payu_asked_at_most_once_per_interval(self):
+        self.get_order.return_value = {"orders": [{"status": "PENDING"}]}
+
+        for _ in range(3):
+            response = self.client.get(self.url("payu_status"), {"status": "PENDING"})
+            self.assertEqual(response.json()["status"], "PENDING")
+
+        self.assertEqual(self.get_order.call_count, 1)
+
+        PlatnoscPayU.objects.filter(pk=self.platnosc.pk).update(
+            sprawdzona=timezone.now() - timedelta(seconds=31)
+        )
+        self.client.get(self.url("payu_status"))
+        self.assertEqual(self.get_order.call_count, 2)
+
+    @override_settings(PAYU={**PAYU_BEZ_CZEKANIA, "STATUS_LONGPOLL": 60})
+    def test_long_poll_wait_is_capped(self):
+        self.get_order.return_value = {"orders": [{"status": "PENDING"}]}
+        zegar = [0.0]
+
+        with patch("rejs.views_payu.time") as czas:
+            czas.monotonic.side_effect = lambda: zegar[0]
+            czas.sleep.side_effect = lambda s: zegar.__setitem__(0, zegar[0] + s)
+            response = self.client.get(self.url("payu_status"), {"status": "PENDING"})
+
+        self.assertEqual(response.json()["status"], "PENDING")
+        self.assertEqual(zegar[0], MAKS_LONGPOLL)
+
+    def test_payu_error_returns_local_state(self):
+        self.get_order.side_effect = requests.Timeout
+
+        with self.assertLogs("rejs.platnosci", "WARNING"):
+            response = self.client.get(self.url("payu_status"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "PENDING", "zakonczona": False})
+
+    def test_completed_payment_is_not_fetched_again(self):
+        self.platnosc.status = PlatnoscPayU.STATUS_COMPLETED
+        self.platnosc.save()
+
+        self.client.get(self.url("payu_status"))
+
+        self.get_order.assert_not_called()
+
+    def test_status_needs_matching_token(self):
+        inne = Zgloszenie.objects.create(
+            imie="Anna",
+            nazwisko="Nowak",
+            email="anna@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.zgl.rejs,
+        )
+        response = self.client.get(
+            reverse("payu_status", args=[inne.token, self.platnosc.id])
+        )
+        self.assertEqual(response.status_code, 404)
@@ -6,7 +6,8 @@ from datetime import date
 from django.test import TestCase, Client
 from django.conf import settings
 
-from rejs.models import Rejs, Zgloszenie, PlatnoscPayU, Wplata
+from rejs import powiadomienia
+from rejs.models import Rejs, Zgloszenie, PlatnoscPayU, PowiadomieniePayU, Wplata
 
 
 class PayUWebhookTests(TestCase):
@@ -71,6 +72,7 @@ class PayUWebhookTests(TestCase):
         )
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(powiadomienia.przetworz(), (1, 0))
 
         self.platnosc.refresh_from_db()
         self.assertEqual(
@@ -102,6 +104,7 @@ class PayUWebhookTests(TestCase):
         )
 
         self.assertEqual(response.status_code, 403)
+        self.assertEqual(PowiadomieniePayU.objects.count(), 0)
         self.assertEqual(Wplata.objects.count(), 0)
 
     def test_webhook_is_idempotent(self):
@@ -128,6 +131,7 @@ class PayUWebhookTests(TestCase):
             content_type="application/json",
             HTTP_OPENPAYU_SIGNATURE=signature,
         )
+        powiadomienia.przetworz()
 
         self.assertEqual(
             Wplata.objects.filter(
@@ -0,0 +1,219 @@
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rejs import platnosci
+from rejs.models import PlatnoscPayU, Rejs, Zgloszenie, Zmiana
+from rejs.platnosci import wygas_platnosci
+
+
+def utworz_zgloszenie():
+    rejs = Rejs.objects.create(
+        nazwa="Testowy rejs",
+        od=date.today() + timedelta(days=30),
+        do=date.today() + timedelta(days=40),
+        start="Gdynia",
+        koniec="Gdańsk",
+        cena=1500,
+        zaliczka=500,
+    )
+    return Zgloszenie.objects.create(
+        imie="Jan",
+        nazwisko="Kowalski",
+        email="jan@test.pl",
+        telefon="123456789",
+        status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+        data_urodzenia=date(2000, 1, 1),
+        kod_pocztowy="00-001",
+        rodo=True,
+        rejs=rejs,
+    )
+
+
+class ZamowieniaPayUMixin:
+    def setUp(self):
+        super().setUp()
+        self.zgl = utworz_zgloszenie()
+        self.numer = 0
+        self.blokada = threading.Lock()
+        payu = patch("rejs.views_payu.PayUClient").start()
+        self.addCleanup(patch.stopall)
+        self.create_order = payu.return_value.create_order
+        self.create_order.side_effect = self.nowe_zamowienie
+
+    def nowe_zamowienie(self, **kwargs):
+        with self.blokada:
+            self.numer += 1
+            numer = self.numer
+        return {"orderId": f"ORDER_{numer}", "redirectUri": f"https://payu.test/{numer}"}
+
+    def zaplac(self, typ="zaliczka", client=None):
+        adres = reverse("zaplac", args=[self.zgl.token, typ])
+        return (client or self.client).get(adres)
+
+
+@override_settings(RATE_LIMITS={})
+class PonowneUzycieZamowieniaTests(ZamowieniaPayUMixin, TestCase):
+    def test_second_click_reuses_pending_order(self):
+        pierwsza = self.zaplac()
+        druga = self.zaplac()
+
+        self.assertEqual(pierwsza["Location"], "https://payu.test/1")
+        self.assertEqual(druga["Location"], "https://payu.test/1")
+        self.assertEqual(self.create_order.call_count, 1)
+        self.assertEqual(PlatnoscPayU.objects.count(), 1)
+
+    def test_different_type_gets_own_order(self):
+        self.zaplac("zaliczka")
+        self.zaplac("reszta")
+
+        self.assertEqual(self.create_order.call_count, 2)
+
+    def test_changed_amount_gets_new_order(self):
+        self.zaplac()
+        self.zgl.rejs.zaliczka = 600
+        self.zgl.rejs.save()
+
+        self.assertEqual(self.zaplac()["Location"], "https://payu.test/2")
+
+    def test_order_close_to_expiry_is_not_reused(self):
+        self.zaplac()
+        PlatnoscPayU.objects.update(utworzona=timezone.now() - timedelta(minutes=26))
+
+        self.assertEqual(self.zaplac()["Location"], "https://payu.test/2")
+
+    def test_payu_error_marks_payment_failed(self):
+        self.create_order.side_effect = requests.ConnectionError
+
+        response = self.zaplac()
+
+        self.assertTemplateUsed(response, "payu/error.html")
+        self.assertEqual(PlatnoscPayU.objects.get().status, PlatnoscPayU.STATUS_FAILED)
+
+        self.create_order.side_effect = self.nowe_zamowienie
+        self.assertEqual(self.zaplac()["Location"], "https://payu.test/1")
+
+    def test_malformed_payu_response_marks_payment_failed(self):
+        self.create_order.side_effect = [
+            {"status": {"statusCode": "ERROR"}},
+            ValueError(),
+        ]
+
+        self.assertTemplateUsed(self.zaplac(), "payu/error.html")
+        self.assertTemplateUsed(self.zaplac(), "payu/error.html")
+
+        self.assertEqual(
+            list(PlatnoscPayU.objects.values_list("status", flat=True)),
+            [PlatnoscPayU.STATUS_FAILED] * 2,
+        )
+        self.create_order.side_effect = self.nowe_zamowienie
+        self.assertEqual(self.zaplac()["Location"], "https://payu.test/1")
+
+
+class WygasaniePlatnosciTests(TestCase):
+    def setUp(self):
+        self.zgl = utworz_zgloszenie()
+
+    def platnosc(self, status, minut_temu):
+        p = PlatnoscPayU.objects.create(
+            zgloszenie=self.zgl, typ="zaliczka", kwota=500, status=status
+        )
+        PlatnoscPayU.objects.filter(pk=p.pk).update(
+            utworzona=timezone.now() - timedelta(minutes=minut_temu)
+        )
+        return p
+
+    def test_stale_open_payments_expire_in_bulk(self):
+        stare = [
+            self.platnosc(PlatnoscPayU.STATUS_NEW, 60),
+            self.platnosc(PlatnoscPayU.STATUS_PENDING, 45),
+        ]
+        swieza = self.platnosc(PlatnoscPayU.STATUS_PENDING, 5)
+        zaplacona = self.platnosc(PlatnoscPayU.STATUS_COMPLETED, 60)
+        Zmiana.objects.all().delete()
+
+        # SELECT, UPDATE i INSERT do kanału zmian (plus savepoint)
+        with self.assertNumQueries(5):
+            self.assertEqual(wygas_platnosci(), 2)
+
+        statusy = dict(PlatnoscPayU.objects.values_list("pk", "status"))
+        self.assertEqual(statusy[stare[0].pk], PlatnoscPayU.STATUS_EXPIRED)
+        self.assertEqual(statusy[stare[1].pk], PlatnoscPayU.STATUS_EXPIRED)
+        self.assertEqual(statusy[swieza.pk], PlatnoscPayU.STATUS_PENDING)
+        self.assertEqual(statusy[zaplacona.pk], PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(
+            sorted(Zmiana.objects.values_list("obiekt_id", flat=True)),
+            sorted(p.pk for p in stare),
+        )
+
+    def test_command(self):
+        self.platnosc(PlatnoscPayU.STATUS_PENDING, 60)
+
+        wyjscie = StringIO()
+        call_command("wygas_platnosci", stdout=wyjscie)
+
+        self.assertIn("Wygaszone płatności: 1", wyjscie.getvalue())
+        self.assertEqual(PlatnoscPayU.objects.get().status, PlatnoscPayU.STATUS_EXPIRED)
+
+
+@override_settings(RATE_LIMITS={})
+class RownoczesneKlikniecieTests(ZamowieniaPayUMixin, TransactionTestCase):
+    def test_locked_database_is_retried(self):
+        zajmij = platnosci.zajmij_platnosc
+        proby = []
+
+        def zablokowana(*args):
+            proby.append(args)
+            if len(proby) == 1:
+                raise OperationalError("database is locked")
+            return zajmij(*args)
+
+        with patch("rejs.views_payu.zajmij_platnosc", side_effect=zablokowana):
+            self.assertEqual(self.zaplac()["Location"], "https://payu.test/1")
+
+        self.assertEqual(len(proby), 2)
+        self.assertEqual(PlatnoscPayU.objects.get().status, PlatnoscPayU.STATUS_PENDING)
+
+    def test_concurrent_clicks_create_one_order(self):
+        wolne = self.nowe_zamowienie
+
+        def wolne_zamowienie(**kwargs):
+            time.sleep(0.2)
+            return wolne(**kwargs)
+
+        self.create_order.side_effect = wolne_zamowienie
+        adresy = []
+        start = threading.Barrier(8)
+
+        def kliknij():
+            client = Client()
+            start.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        adresy.append(self.zaplac(client=client)["Location"])
+                        return
+                    except OperationalError:
+                        # współdzielona baza testowa SQLite w pamięci
+                        # nie czeka na blokadę
+                        time.sleep(0.005)
+            finally:
+                connection.close()
+
+        watki = [threading.Thread(target=kliknij) for _ in range(8)]
+        for w in watki:
+            w.start()
+        for w in watki:
+            w.join()
+
+        self.assertEqual(adresy, ["https://payu.test/1"] * 8)
+        self.assertEqual(PlatnoscPayU.objects.count(), 1)
@@ -0,0 +1,119 @@
+import re
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rejs import powiadomienia
+from rejs.models import PlatnoscPayU, PowiadomieniePayU, Rejs, Wplata, Zgloszenie
+from rejs.reports.builder import RaportRejsuBuilder
+
+# "SCAN rejs_zgloszenie" bez "USING ... INDEX" to przejście całej tabeli
+PELNY_SKAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+
+
+@skipUnless(
+    connection.vendor == "sqlite", "Plan zapytania sprawdzany tylko dla SQLite."
+)
+class PlanyZapytanTests(TestCase):
+    """
+    Gorące ścieżki wykonują się naprawdę, a każde ich zapytanie przechodzi
+    przez EXPLAIN QUERY PLAN - test pada, gdy wróci pełny skan tabeli.
+    """
+
+    def setUp(self):
+        self.rejs = Rejs.objects.create(
+            nazwa="Rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+            status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+        )
+        Wplata.objects.create(zgloszenie=self.zgl, kwota=500, rodzaj="wplata")
+
+    def plany(self, funkcja):
+        """{sql: [wiersze planu]} dla zapytań SELECT wykonanych przez ``funkcja``."""
+        with CaptureQueriesContext(connection) as zapytania:
+            funkcja()
+        plany = {}
+        with connection.cursor() as kursor:
+            for zapytanie in zapytania:
+                if zapytanie["sql"].startswith("SELECT"):
+                    kursor.execute("EXPLAIN QUERY PLAN " + zapytanie["sql"])
+                    plany[zapytanie["sql"]] = [
+                        wiersz[3] for wiersz in kursor.fetchall()
+                    ]
+        self.assertTrue(plany)
+        return plany
+
+    def assertBezPelnegoSkanu(self, plany, tabele):
+        for sql, plan in plany.items():
+            for krok in plan:
+                skan = PELNY_SKAN.match(krok)
+                if skan and skan.group(2) in tabele:
+                    self.fail(f"Pełny skan {skan.group(2)}:\n{sql}\n" + "\n".join(plan))
+
+    def assertIndeks(self, plany, indeks):
+        self.assertTrue(
+            any(indeks in krok for plan in plany.values() for krok in plan),
+            f"Żadne zapytanie nie używa {indeks}:\n{plany}",
+        )
+
+    def test_index_page(self):
+        plany = self.plany(lambda: self.client.get(reverse("index")))
+
+        self.assertIndeks(plany, "rejs_rekrutacja_od")
+        self.assertBezPelnegoSkanu(plany, {"rejs_rejs"})
+
+    def test_crew_list(self):
+        builder = RaportRejsuBuilder(
+            self.rejs, User.objects.create_superuser("admin", "a@test.pl", "haslo")
+        )
+        plany = self.plany(builder.build_crew_list)
+
+        self.assertIndeks(plany, "zgloszenie_rejs_status")
+        self.assertBezPelnegoSkanu(
+            plany, {"rejs_zgloszenie", "rejs_dane_dodatkowe", "rejs_wachta"}
+        )
+
+    def test_payment_balance(self):
+        plany = self.plany(
+            lambda: (self.zgl.suma_wplat, list(Zgloszenie.objects.z_saldem()))
+        )
+
+        self.assertIndeks(plany, "COVERING INDEX wplata_zgloszenie_rodzaj")
+        self.assertBezPelnegoSkanu(plany, {"rejs_wplata"})
+
+    def test_payu_notification_queue(self):
+        PlatnoscPayU.objects.create(
+            zgloszenie=self.zgl,
+            typ="zaliczka",
+            kwota=500,
+            payu_order_id="A",
+            status=PlatnoscPayU.STATUS_PENDING,
+        )
+        PowiadomieniePayU.objects.create(
+            payu_order_id="A", status_payu="PENDING", tresc="{}"
+        )
+
+        plany = self.plany(powiadomienia.przetworz)
+
+        self.assertIndeks(plany, "powiadomienie_do_zrobienia")
+        self.assertBezPelnegoSkanu(
+            plany, {"rejs_platnoscpayu", "rejs_powiadomieniepayu", "rejs_zgloszenie"}
+        )
@@ -0,0 +1,173 @@
+import hashlib
+import hmac
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rejs import powiadomienia
+from rejs.models import PlatnoscPayU, PowiadomieniePayU, Rejs, Wplata, Zgloszenie
+
+
+class SkrzynkaPowiadomienTests(TestCase):
+    def setUp(self):
+        rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            zaliczka=500,
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs,
+        )
+        for order_id in ("A", "B"):
+            PlatnoscPayU.objects.create(
+                zgloszenie=self.zgl,
+                typ="zaliczka",
+                kwota=500,
+                payu_order_id=order_id,
+                status=PlatnoscPayU.STATUS_PENDING,
+            )
+        mail.outbox.clear()
+
+    def wyslij(self, order_id, status):
+        body = json.dumps({"order": {"orderId": order_id, "status": status}}).encode()
+        podpis = hmac.new(
+            settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            "/payu/webhook/",
+            data=body,
+            content_type="application/json",
+            HTTP_OPENPAYU_SIGNATURE=f"sender=payu;signature=sha256={podpis}",
+        )
+
+    def status(self, order_id):
+        return PlatnoscPayU.objects.get(payu_order_id=order_id).status
+
+    def test_webhook_only_stores_payload(self):
+        with self.assertNumQueries(1):
+            response = self.wyslij("A", "COMPLETED")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PowiadomieniePayU.objects.get().status_payu, "COMPLETED")
+        self.assertEqual(self.status("A"), PlatnoscPayU.STATUS_PENDING)
+        self.assertEqual(Wplata.objects.count(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_payload_without_order_is_rejected(self):
+        body = b'{"refund": {}}'
+        podpis = hmac.new(
+            settings.PAYU["WEBHOOK_SECRET"].encode(), body, hashlib.sha256
+        ).hexdigest()
+        response = self.client.post(
+            "/payu/webhook/",
+            data=body,
+            content_type="application/json",
+            HTTP_OPENPAYU_SIGNATURE=f"signature=sha256={podpis}",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PowiadomieniePayU.objects.count(), 0)
+
+    def test_worker_applies_status_and_sends_email(self):
+        self.wyslij("A", "COMPLETED")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(powiadomienia.przetworz(), (1, 0))
+            # SMTP nie trzyma blokady zapisu - mail dopiero po zatwierdzeniu
+            self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(self.status("A"), PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(Wplata.objects.get().zrodlo_id, "A")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(PowiadomieniePayU.objects.get().przetworzone)
+
+    def test_failure_holds_back_later_notifications_of_same_order(self):
+        self.wyslij("A", "PENDING")
+        self.wyslij("A", "COMPLETED")
+        self.wyslij("B", "COMPLETED")
+
+        with patch(
+            "rejs.powiadomienia.zastosuj_status",
+            side_effect=[RuntimeError("baza"), None],
+        ) as zastosuj, self.assertLogs("rejs.powiadomienia", "WARNING"):
+            self.assertEqual(powiadomienia.przetworz(), (1, 1))
+
+        self.assertEqual(
+            [wywolanie.args[1] for wywolanie in zastosuj.call_args_list],
+            ["PENDING", "COMPLETED"],
+        )
+        self.assertEqual(zastosuj.call_args.args[0].payu_order_id, "B")
+
+        # przed upływem przerwy nic się nie dzieje
+        self.assertEqual(powiadomienia.przetworz(), (0, 0))
+
+        PowiadomieniePayU.objects.update(nastepna_proba=timezone.now())
+        self.assertEqual(powiadomienia.przetworz(), (2, 0))
+        self.assertEqual(self.status("A"), PlatnoscPayU.STATUS_COMPLETED)
+
+    def test_notification_before_order_id_is_saved_is_retried(self):
+        self.wyslij("C", "COMPLETED")
+
+        with self.assertLogs("rejs.powiadomienia", "WARNING"):
+            self.assertEqual(powiadomienia.przetworz(), (0, 1))
+        powiadomienie = PowiadomieniePayU.objects.get()
+        self.assertEqual(powiadomienie.proby, 1)
+        self.assertEqual(powiadomienie.blad, "Nieznane zamówienie")
+
+        PlatnoscPayU.objects.filter(payu_order_id="B").update(payu_order_id="C")
+        PowiadomieniePayU.objects.update(nastepna_proba=timezone.now())
+
+        self.assertEqual(powiadomienia.przetworz(), (1, 0))
+        self.assertEqual(self.status("C"), PlatnoscPayU.STATUS_COMPLETED)
+
+    def test_gives_up_after_max_attempts(self):
+        self.wyslij("C", "COMPLETED")
+        PowiadomieniePayU.objects.update(proby=powiadomienia.MAKS_PROB - 1)
+
+        with self.assertLogs("rejs.powiadomienia", "ERROR"):
+            powiadomienia.przetworz()
+
+        self.assertIsNotNone(PowiadomieniePayU.objects.get().przetworzone)
+        self.assertEqual(powiadomienia.przetworz(), (0, 0))
+
+    def test_pruning_removes_old_processed_notifications(self):
+        teraz = timezone.now()
+        stare = PowiadomieniePayU.objects.create(
+            payu_order_id="A", tresc="{}", przetworzone=teraz - timedelta(days=31)
+        )
+        PowiadomieniePayU.objects.create(
+            payu_order_id="A", tresc="{}", przetworzone=teraz - timedelta(days=1)
+        )
+        PowiadomieniePayU.objects.create(payu_order_id="B", tresc="{}")
+        PowiadomieniePayU.objects.create(
+            payu_order_id="C",
+            tresc="{}",
+            przetworzone=teraz - timedelta(days=31),
+            blad="Nieznane zamówienie",
+        )
+
+        out = StringIO()
+        call_command(
+            "przytnij_powiadomienia", "--dni", "30", "--partia", "1", stdout=out
+        )
+
+        self.assertIn("Usunięte powiadomienia: 1", out.getvalue())
+        self.assertEqual(PowiadomieniePayU.objects.count(), 3)
+        self.assertFalse(PowiadomieniePayU.objects.filter(pk=stare.pk).exists())
@@ -0,0 +1,202 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rejs.models import PlatnoscPayU, Rejs, Wplata, Zgloszenie
+from rejs.platnosci import wygas_platnosci
+from rejs.przypomnienia import wyslij_linki_reszty
+
+
+@override_settings(RATE_LIMITS={})
+class LinkiDoplatyTests(TestCase):
+    def setUp(self):
+        self.rejs = Rejs.objects.create(
+            nazwa="Rejs letni",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            cena=1500,
+            zaliczka=500,
+        )
+        self.zaliczka = self.zgloszenie("Zaliczka", wplaty=[("wplata", 500)])
+        self.ze_zwrotem = self.zgloszenie(
+            "Zwrot", wplaty=[("payu", 600), ("zwrot", 100)]
+        )
+        self.zgloszenie("Oplacone", wplaty=[("wplata", 1500)])
+        self.zgloszenie(
+            "Niezakwalifikowane", status=Zgloszenie.STATUS_NIEZAKWALIFIKOWANY
+        )
+        mail.outbox.clear()
+
+        payu = patch("rejs.przypomnienia.PayUClient").start()
+        self.addCleanup(patch.stopall)
+        self.create_order = payu.return_value.create_order
+        self.create_order.side_effect = self.zamowienie
+
+    def zamowienie(self, **kwargs):
+        nr = self.create_order.call_count
+        return {"orderId": f"O{nr}", "redirectUri": f"https://payu.test/pay/O{nr}"}
+
+    def zgloszenie(self, nazwisko, wplaty=(), status=Zgloszenie.STATUS_ZAKWALIFIKOWANY):
+        zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko=nazwisko,
+            email=f"{nazwisko.lower()}@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+            status=status,
+        )
+        for rodzaj, kwota in wplaty:
+            Wplata.objects.create(zgloszenie=zgl, rodzaj=rodzaj, kwota=kwota)
+        return zgl
+
+    def test_balance_annotation_matches_properties(self):
+        for zgl in Zgloszenie.objects.z_saldem():
+            self.assertEqual(zgl.wplacono, zgl.suma_wplat)
+            self.assertEqual(zgl.pozostalo, zgl.do_zaplaty)
+
+    def test_links_are_created_and_mailed(self):
+        wynik = wyslij_linki_reszty(self.rejs, na_sekunde=0)
+
+        self.assertEqual((wynik["nowe"], wynik["maile"]), (2, 2))
+        platnosci = PlatnoscPayU.objects.order_by("zgloszenie_id")
+        self.assertEqual(
+            [p.zgloszenie for p in platnosci], [self.zaliczka, self.ze_zwrotem]
+        )
+        for platnosc in platnosci:
+            self.assertEqual(
+                (platnosc.typ, platnosc.kwota), ("reszta", Decimal("1000"))
+            )
+            self.assertEqual(platnosc.status, PlatnoscPayU.STATUS_PENDING)
+            self.assertGreater(platnosc.wazna_do, timezone.now() + timedelta(days=6))
+        self.assertEqual(
+            self.create_order.call_args.kwargs["waznosc"],
+            settings.PAYU["LINK_VALIDITY"],
+        )
+        linki = {m.to[0]: m.body for m in mail.outbox}
+        platnosc = platnosci.get(zgloszenie=self.zaliczka)
+        self.assertIn(platnosc.redirect_uri, linki["zaliczka@test.pl"])
+        self.assertIn("pozostało do zapłaty: 1000 zł", linki["zaliczka@test.pl"])
+
+    def test_query_count_does_not_grow_with_participants(self):
+        with CaptureQueriesContext(connection) as dwa:
+            wyslij_linki_reszty(self.rejs, na_sekunde=0)
+        PlatnoscPayU.objects.all().delete()
+        for nr in range(6):
+            self.zgloszenie(f"Nowe{nr}", wplaty=[("wplata", 500)])
+
+        with CaptureQueriesContext(connection) as osiem:
+            self.assertEqual(wyslij_linki_reszty(self.rejs, na_sekunde=0)["maile"], 8)
+
+        self.assertEqual(len(osiem), len(dwa))
+
+    def test_second_round_resends_the_same_links(self):
+        wyslij_linki_reszty(self.rejs, na_sekunde=0)
+        Wplata.objects.create(zgloszenie=self.ze_zwrotem, rodzaj="wplata", kwota=200)
+
+        wynik = wyslij_linki_reszty(self.rejs, na_sekunde=0)
+
+        # zmieniona kwota - nowe zamówienie, reszta bez zmian
+        self.assertEqual((wynik["nowe"], wynik["ponowione"]), (1, 1))
+        self.assertEqual(self.create_order.call_count, 3)
+        self.assertEqual(
+            PlatnoscPayU.objects.filter(zgloszenie=self.ze_zwrotem).latest("id").kwota,
+            Decimal("800"),
+        )
+
+    def test_payu_error_skips_the_mail(self):
+        self.create_order.side_effect = [
+            requests.ConnectionError(),
+            {"orderId": "O1", "redirectUri": "https://payu.test/pay/O1"},
+        ]
+
+        with self.assertLogs("rejs.przypomnienia", "WARNING"):
+            wynik = wyslij_linki_reszty(self.rejs, watki=1, na_sekunde=0)
+
+        self.assertEqual((wynik["nowe"], wynik["bledy"], wynik["maile"]), (1, 1, 1))
+        self.assertEqual(
+            PlatnoscPayU.objects.filter(status=PlatnoscPayU.STATUS_FAILED).count(), 1
+        )
+
+    def test_prepared_link_outlives_order_validity(self):
+        wyslij_linki_reszty(self.rejs, na_sekunde=0)
+        PlatnoscPayU.objects.update(utworzona=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(wygas_platnosci(), 0)
+        with patch("rejs.views_payu.PayUClient") as payu:
+            response = self.client.get(
+                reverse(
+                    "zaplac", kwargs={"token": self.zaliczka.token, "typ": "reszta"}
+                )
+            )
+        payu.assert_not_called()
+        platnosc = PlatnoscPayU.objects.get(zgloszenie=self.zaliczka)
+        self.assertRedirects(
+            response, platnosc.redirect_uri, fetch_redirect_response=False
+        )
+
+        PlatnoscPayU.objects.update(wazna_do=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(wygas_platnosci(), 2)
+
+    def test_admin_action(self):
+        admin = User.objects.create_superuser("admin", "admin@test.pl", "haslo")
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            reverse("admin:rejs_rejs_changelist"),
+            {"action": "wyslij_linki_doplaty", "_selected_action": [self.rejs.pk]},
+            follow=True,
+        )
+
+        self.assertContains(response, "Wysłane maile: 2. Nowe zamówienia PayU: 2")
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_admin_action_is_capped_and_continues_without_duplicates(self):
+        admin = User.objects.create_superuser("admin", "admin@test.pl", "haslo")
+        self.client.force_login(admin)
+
+        def akcja():
+            return self.client.post(
+                reverse("admin:rejs_rejs_changelist"),
+                {"action": "wyslij_linki_doplaty", "_selected_action": [self.rejs.pk]},
+                follow=True,
+            )
+
+        with patch("rejs.admin.MAKS_NOWYCH_W_ADMINIE", 1):
+            self.assertContains(akcja(), "Osoby wciąż bez linku: 1")
+            self.assertEqual(len(mail.outbox), 1)
+            response = akcja()
+            self.assertNotContains(response, "bez linku")
+            self.assertEqual(
+                sorted(m.to[0] for m in mail.outbox),
+                ["zaliczka@test.pl", "zwrot@test.pl"],
+            )
+
+            # wszyscy mają link - dopiero teraz ponowne wysłanie
+            self.assertContains(akcja(), "ponownie wysłane linki: 2")
+        self.assertEqual(self.create_order.call_count, 2)
+
+    def test_command_sends_whole_cruise(self):
+        out = StringIO()
+        call_command(
+            "wyslij_linki_doplaty", str(self.rejs.pk), "--na-sekunde", "0", stdout=out
+        )
+
+        self.assertIn("Wysłane maile: 2, nowe zamówienia PayU: 2", out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
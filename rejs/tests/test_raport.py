@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from rejs.models import Dane_Dodatkowe, Rejs, Wplata, Zgloszenie
+from rejs.reports.builder import RaportRejsuBuilder
+from rejs.szyfry import odszyfruj_wiele, szyfruj
+
+
+class OdszyfrowanieHurtoweTests(TestCase):
+    def setUp(self):
+        self.rejs = Rejs.objects.create(
+            nazwa="Rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        for nr, nazwisko in enumerate(["Zieliński", "Adamska", "Nowak"]):
+            zgl = Zgloszenie.objects.create(
+                imie="Jan",
+                nazwisko=nazwisko,
+                email=f"{nr}@test.pl",
+                telefon="123456789",
+                data_urodzenia=date(2000, 1, 1),
+                kod_pocztowy="00-001",
+                rodo=True,
+                rejs=self.rejs,
+                status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+            )
+            if nazwisko != "Nowak":
+                Dane_Dodatkowe.objects.create(
+                    zgloszenie=zgl,
+                    poz1=f"0021011234{nr}",
+                    poz2="paszport",
+                    poz3=f"DOK{nr}",
+                    pos4=f"Miasto{nr}",
+                    pos5="polskie",
+                    pos6=date(2030, 1, 1),
+                )
+        user = User.objects.create_superuser("admin", "a@test.pl", "haslo")
+        self.builder = RaportRejsuBuilder(self.rejs, user)
+
+    def test_pool_keeps_row_order(self):
+        wartosci = [f"wartosc{nr}" for nr in range(50)]
+        szyfrogramy = [szyfruj(w) for w in wartosci] + [None]
+
+        self.assertEqual(
+            odszyfruj_wiele(szyfrogramy, procesy=2, partia=7, minimum=0),
+            wartosci + [None],
+        )
+
+    def test_crew_list_decrypts_in_bulk(self):
+        with patch("rejs.models.odszyfruj") as odszyfruj_pola:
+            wiersze = self.builder.build_crew_list()
+        odszyfruj_pola.assert_not_called()
+
+        self.assertEqual(
+            [
+                (w["family_name"], w["place_of_birth"], w["document_number"])
+                for w in wiersze
+            ],
+            [
+                ("Adamska", "Miasto1", "DOK1"),
+                ("Nowak", "", ""),
+                ("Zieliński", "Miasto0", "DOK0"),
+            ],
+        )
+        self.assertEqual(wiersze[0]["document_expiry"], date(2030, 1, 1))
+        self.assertEqual(wiersze[1]["document_expiry"], "")
+
+    def test_sensitive_data_decrypts_in_bulk(self):
+        with patch("rejs.models.odszyfruj") as odszyfruj_pola:
+            wiersze = self.builder.build_dane_wrazliwe()
+        odszyfruj_pola.assert_not_called()
+
+        self.assertEqual(
+            sorted((w["nazwisko"], w["pesel"], w["typ_dokumentu"]) for w in wiersze),
+            [
+                ("Adamska", "00210112341", "paszport"),
+                ("Zieliński", "00210112340", "paszport"),
+            ],
+        )
+
+    def test_crew_balance_matches_model(self):
+        zgl = Zgloszenie.objects.get(nazwisko="Nowak")
+        Wplata.objects.create(zgloszenie=zgl, kwota=500, rodzaj="wplata")
+        Wplata.objects.create(zgloszenie=zgl, kwota=100, rodzaj="zwrot")
+
+        with self.assertNumQueries(1):
+            wiersze = self.builder.build_zaloga()
+
+        for wiersz in wiersze:
+            z = Zgloszenie.objects.get(nazwisko=wiersz["nazwisko"])
+            self.assertEqual(
+                (wiersz["suma_wplat"], wiersz["do_zaplaty"]),
+                (z.suma_wplat, z.do_zaplaty),
+            )
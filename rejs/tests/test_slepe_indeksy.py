@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rejs.forms import Dane_DodatkoweForm
+from rejs.models import Dane_Dodatkowe, Rejs, Zgloszenie, indeks_slepy
+from rejs.szyfrowanie import przelicz_indeksy
+
+
+class SlepeIndeksyTests(TestCase):
+    def setUp(self):
+        self.rejs = self.nowy_rejs("Rejs letni")
+        self.dane = self.dane_dodatkowe(
+            self.zgloszenie(self.rejs), "00210112345", "ABC 123456"
+        )
+
+    def nowy_rejs(self, nazwa):
+        return Rejs.objects.create(
+            nazwa=nazwa,
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+
+    def zgloszenie(self, rejs):
+        return Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko=f"Kowalski{Zgloszenie.objects.count()}",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs,
+            status=Zgloszenie.STATUS_ZAKWALIFIKOWANY,
+        )
+
+    def dane_dodatkowe(self, zgl, pesel, dokument):
+        return Dane_Dodatkowe.objects.create(
+            zgloszenie=zgl,
+            poz1=pesel,
+            poz2="paszport",
+            poz3=dokument,
+            pos4="Gdynia",
+            pos5="polskie",
+            pos6=date(2030, 1, 1),
+        )
+
+    def test_index_is_keyed_and_normalised(self):
+        self.assertEqual(self.dane.poz3_indeks, indeks_slepy("dokument", "abc-123456"))
+        self.assertNotEqual(
+            indeks_slepy("pesel", "123"), indeks_slepy("dokument", "123")
+        )
+        with override_settings(DJANGO_BLIND_INDEX_KEY="inny"):
+            self.assertNotEqual(
+                self.dane.poz1_indeks, indeks_slepy("pesel", "00210112345")
+            )
+
+    def test_lookup_uses_index_without_decrypting(self):
+        with patch("rejs.models.odszyfruj") as odszyfruj:
+            znalezione = list(
+                Dane_Dodatkowe.objects.po_dokumencie("abc123456").values_list(
+                    "pk", flat=True
+                )
+            )
+        odszyfruj.assert_not_called()
+        self.assertEqual(znalezione, [self.dane.pk])
+        # na małej tabeli PostgreSQL woli skan sekwencyjny
+        if connection.vendor == "sqlite":
+            self.assertIn(
+                "dane_dodatkowe_poz1_indeks",
+                Dane_Dodatkowe.objects.po_peselu("00210112345").explain(),
+            )
+
+    def test_update_fields_keep_index_in_sync(self):
+        self.dane.poz1 = "99010112345"
+        self.dane.save(update_fields=["poz1"])
+
+        self.assertTrue(Dane_Dodatkowe.objects.po_peselu("99010112345").exists())
+        self.assertFalse(Dane_Dodatkowe.objects.po_peselu("00210112345").exists())
+
+    def test_repeated_documents_are_found(self):
+        inny_rejs = self.nowy_rejs("Rejs jesienny")
+        powtorka = self.dane_dodatkowe(
+            self.zgloszenie(inny_rejs), "11111111111", "abc123456"
+        )
+        self.dane_dodatkowe(self.zgloszenie(inny_rejs), "22222222222", "XYZ")
+
+        self.assertEqual(
+            sorted(Dane_Dodatkowe.objects.powtorzone().values_list("pk", flat=True)),
+            [self.dane.pk, powtorka.pk],
+        )
+
+    def test_form_rejects_same_pesel_on_the_same_cruise(self):
+        dane = {
+            "poz1": "00210112345",
+            "poz2": "paszport",
+            "poz3": "NOWY1",
+            "pos4": "Gdynia",
+            "pos5": "polskie",
+            "pos6": "2030-01-01",
+        }
+        nowe = Dane_Dodatkowe(zgloszenie=self.zgloszenie(self.rejs))
+        form = Dane_DodatkoweForm(dane, instance=nowe)
+        self.assertEqual(list(form.errors), ["poz1"])
+
+        inny_rejs = self.nowy_rejs("Rejs jesienny")
+        nowe = Dane_Dodatkowe(zgloszenie=self.zgloszenie(inny_rejs))
+        form = Dane_DodatkoweForm(dane, instance=nowe)
+        self.assertTrue(form.is_valid())
+
+    def test_admin_search_by_pesel(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "a@test.pl", "haslo")
+        )
+
+        response = self.client.get(
+            reverse("admin:rejs_dane_dodatkowe_changelist"), {"q": "00210112345"}
+        )
+
+        self.assertEqual(list(response.context["cl"].result_list), [self.dane])
+
+    def test_indexes_are_recomputed_after_key_change(self):
+        with override_settings(DJANGO_BLIND_INDEX_KEY="nowy"):
+            self.assertFalse(Dane_Dodatkowe.objects.po_peselu("00210112345").exists())
+            wyjscie = StringIO()
+            call_command("przelicz_indeksy", stdout=wyjscie)
+
+            self.assertIn("Przeliczone indeksy: 1", wyjscie.getvalue())
+            self.assertTrue(Dane_Dodatkowe.objects.po_peselu("00210112345").exists())
+            self.assertTrue(Dane_Dodatkowe.objects.po_dokumencie("ABC123456").exists())
+            self.assertEqual(przelicz_indeksy(), 0)
+
+
+class KluczIndeksowTests(SimpleTestCase):
+    def test_key_is_required_without_debug(self):
+        env = {**os.environ, "DEBUG": "False", "DJANGO_BLIND_INDEX_KEY": ""}
+        wynik = subprocess.run(
+            [sys.executable, "-c", "import django; django.setup()"],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertNotEqual(wynik.returncode, 0)
+        self.assertIn(
+            "ImproperlyConfigured: Ustaw DJANGO_BLIND_INDEX_KEY", wynik.stderr
+        )
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# to, co ładuje każdy proces: migrate, testy, worker WWW
+START = "import django; django.setup(); import zm_zgloszenia.urls"
+
+# ładowane dopiero przy pierwszym szyfrowaniu / eksporcie raportu
+LENIWE = ("cryptography", "openpyxl", "concurrent.futures.process")
+
+# lokalnie najlepszy z trzech pomiarów to ok. 300-350 ms; budżet z niewielkim
+# zapasem, żeby wyraźne spowolnienie startu wywracało test
+BUDZET_MS = 500
+
+
+def importy():
+    """{moduł: własny czas importu w ms} z ``python -X importtime`` dla START."""
+    wynik = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", START],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    czasy = {}
+    for linia in wynik.stderr.splitlines():
+        if not linia.startswith("import time:") or "cumulative" in linia:
+            continue
+        _, wlasny, _, modul = linia.replace("|", ":", 2).split(":")
+        czasy[modul.strip()] = int(wlasny) / 1000
+    return czasy
+
+
+class CzasStartuTests(SimpleTestCase):
+    def test_heavy_modules_are_imported_lazily(self):
+        zaladowane = [m for m in importy() if m.startswith(LENIWE)]
+
+        self.assertEqual(zaladowane, [])
+
+    def test_startup_import_budget(self):
+        # najlepszy z trzech pomiarów - pojedynczy bywa zaszumiony
+        najlepszy = min(sum(importy().values()) for _ in range(3))
+
+        self.assertLess(najlepszy, BUDZET_MS)
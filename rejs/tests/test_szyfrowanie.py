@@ -0,0 +1,158 @@
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from rejs.models import Dane_Dodatkowe, PostepRotacji, Rejs, Zgloszenie
+from rejs.szyfrowanie import na_starych_kluczach, rotuj
+from rejs.szyfry import (
+    BladSzyfrowania,
+    odszyfruj,
+    pierscien_kluczy,
+    szyfr,
+    token_na_bajty,
+)
+
+NOWY_KLUCZ = Fernet.generate_key().decode()
+
+
+class DaneSzyfrowaneMixin:
+    def setUp(self):
+        rejs = Rejs.objects.create(
+            nazwa="Rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        for nr in range(3):
+            zgl = Zgloszenie.objects.create(
+                imie="Jan",
+                nazwisko=f"Kowalski{nr}",
+                email=f"jan{nr}@test.pl",
+                telefon="123456789",
+                data_urodzenia=date(2000, 1, 1),
+                kod_pocztowy="00-001",
+                rodo=True,
+                rejs=rejs,
+            )
+            Dane_Dodatkowe.objects.create(
+                zgloszenie=zgl,
+                poz1=f"0020101234{nr}",
+                poz2="paszport",
+                poz3=f"ABC{nr}",
+                pos4="Gdynia",
+                pos5="polskie",
+                pos6=date(2030, 1, 1),
+            )
+        pierscien = override_settings(
+            DJANGO_FIELD_ENCRYPTION_KEY=f"{NOWY_KLUCZ},{settings.DJANGO_FIELD_ENCRYPTION_KEY}"
+        )
+        pierscien.enable()
+        self.addCleanup(pierscien.disable)
+
+    def pesele(self):
+        return sorted(Dane_Dodatkowe.objects.values_list("poz1", flat=True))
+
+
+class RotacjaKluczaTests(DaneSzyfrowaneMixin, TestCase):
+    def test_old_rows_are_readable_and_rotated(self):
+        self.assertEqual(self.pesele(), ["00201012340", "00201012341", "00201012342"])
+        self.assertEqual(na_starych_kluczach()["rejs.dane_dodatkowe"], 3)
+
+        self.assertEqual(rotuj(partia=2)["rejs.dane_dodatkowe"], 3)
+
+        self.assertEqual(na_starych_kluczach(), {})
+        with override_settings(DJANGO_FIELD_ENCRYPTION_KEY=NOWY_KLUCZ):
+            self.assertEqual(
+                self.pesele(), ["00201012340", "00201012341", "00201012342"]
+            )
+            self.assertEqual(Dane_Dodatkowe.objects.order_by("pk").first().poz3, "ABC0")
+
+    def test_interrupted_rotation_resumes(self):
+        bulk_update = Dane_Dodatkowe.objects.bulk_update
+        wywolania = []
+
+        def przerwij_w_drugiej_partii(*args, **kwargs):
+            wywolania.append(1)
+            if len(wywolania) == 2:
+                raise KeyboardInterrupt
+            return bulk_update(*args, **kwargs)
+
+        with (
+            patch.object(
+                Dane_Dodatkowe.objects, "bulk_update", przerwij_w_drugiej_partii
+            ),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            rotuj(partia=1)
+
+        postep = PostepRotacji.objects.get()
+        self.assertEqual((postep.przetworzone, postep.zakonczona), (1, None))
+        self.assertEqual(na_starych_kluczach()["rejs.dane_dodatkowe"], 2)
+
+        self.assertEqual(rotuj(partia=1)["rejs.dane_dodatkowe"], 2)
+        self.assertEqual(rotuj(partia=1), {})
+        self.assertEqual(na_starych_kluczach(), {})
+
+    def test_command(self):
+        wyjscie = StringIO()
+        call_command("rotuj_klucze", "--sprawdz", stdout=wyjscie)
+        self.assertIn("Wiersze na starych kluczach: 3", wyjscie.getvalue())
+
+        wyjscie = StringIO()
+        call_command("rotuj_klucze", stdout=wyjscie)
+        self.assertIn("rejs.dane_dodatkowe: przepisane wiersze: 3", wyjscie.getvalue())
+        self.assertIn("stare klucze można usunąć", wyjscie.getvalue())
+
+
+class SzyfryTests(DaneSzyfrowaneMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as kursor:
+            kursor.execute("SELECT poz1 FROM rejs_dane_dodatkowe")
+            self.surowe = [bytes(wiersz[0]) for wiersz in kursor.fetchall()]
+
+    def test_rows_are_stored_as_raw_bytes_with_cipher_prefix(self):
+        token = pierscien_kluczy().encrypt(b"00201012340")
+
+        self.assertEqual({s[:1] for s in self.surowe}, {b"\x01"})
+        self.assertLess(len(self.surowe[0]), len(token) * 3 // 4 + 2)
+        self.assertEqual(odszyfruj(token_na_bajty(token.decode())), "00201012340")
+
+    @override_settings(DJANGO_FIELD_CIPHER="aes-gcm")
+    def test_switching_cipher_keeps_old_rows_readable_until_rotated(self):
+        self.assertEqual(self.pesele(), ["00201012340", "00201012341", "00201012342"])
+        self.assertEqual(na_starych_kluczach()["rejs.dane_dodatkowe"], 3)
+
+        rotuj()
+
+        self.assertEqual(na_starych_kluczach(), {})
+        self.assertEqual(self.pesele(), ["00201012340", "00201012341", "00201012342"])
+        with connection.cursor() as kursor:
+            kursor.execute("SELECT poz1 FROM rejs_dane_dodatkowe")
+            nowe = [bytes(wiersz[0]) for wiersz in kursor.fetchall()]
+        self.assertEqual({s[:1] for s in nowe}, {b"\x02"})
+        self.assertLess(len(nowe[0]), len(self.surowe[0]))
+
+    def test_aes_gcm_rejects_tampered_and_foreign_key_data(self):
+        szyfrogram = szyfr("aes-gcm").szyfruj(b"ABC123")
+        self.assertEqual(odszyfruj(szyfrogram), "ABC123")
+
+        with self.assertRaises(BladSzyfrowania):
+            odszyfruj(szyfrogram[:-1] + bytes([szyfrogram[-1] ^ 1]))
+        inny_klucz = Fernet.generate_key().decode()
+        with override_settings(DJANGO_FIELD_ENCRYPTION_KEY=inny_klucz):
+            with self.assertRaises(BladSzyfrowania):
+                odszyfruj(szyfrogram)
+
+    def test_benchmark_command(self):
+        wyjscie = StringIO()
+        call_command("benchmark_szyfrowania", "--wiersze", "10", stdout=wyjscie)
+
+        self.assertIn("aes-gcm-binarny", wyjscie.getvalue())
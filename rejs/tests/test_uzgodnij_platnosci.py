@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rejs.models import PlatnoscPayU, Rejs, Wplata, Zgloszenie
+from rejs.platnosci import uzgodnij_platnosci
+
+
+class UzgadnianiePlatnosciTests(TestCase):
+    def setUp(self):
+        rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs,
+        )
+        self.w_payu = {}
+        payu = patch("rejs.platnosci.PayUClient").start()
+        self.addCleanup(patch.stopall)
+        self.get_order = payu.return_value.get_order
+        self.get_order.side_effect = self.odpowiedz_payu
+
+    def odpowiedz_payu(self, order_id):
+        status = self.w_payu[order_id]
+        if isinstance(status, Exception):
+            raise status
+        return {"orders": [{"orderId": order_id, "status": status}]}
+
+    def platnosc(
+        self, order_id, w_payu, status=PlatnoscPayU.STATUS_PENDING, minut_temu=60
+    ):
+        p = PlatnoscPayU.objects.create(
+            zgloszenie=self.zgl,
+            typ="zaliczka",
+            kwota=500,
+            payu_order_id=order_id,
+            status=status,
+        )
+        PlatnoscPayU.objects.filter(pk=p.pk).update(
+            utworzona=timezone.now() - timedelta(minutes=minut_temu)
+        )
+        self.w_payu[order_id] = w_payu
+        return p
+
+    def status(self, order_id):
+        return PlatnoscPayU.objects.get(payu_order_id=order_id).status
+
+    def test_stuck_orders_are_reconciled(self):
+        self.platnosc("A", "COMPLETED")
+        self.platnosc("B", "CANCELED")
+        self.platnosc("C", "PENDING")
+        self.platnosc("D", requests.Timeout())
+        self.platnosc("E", "COMPLETED", status=PlatnoscPayU.STATUS_NEW)
+
+        with self.assertLogs("rejs.platnosci", "WARNING"):
+            wynik = uzgodnij_platnosci(partia=2)
+
+        self.assertEqual(wynik["sprawdzone"], 5)
+        self.assertEqual(wynik["zakonczone"], 2)
+        self.assertEqual(wynik["nieudane"], 1)
+        self.assertEqual(wynik["bez_zmian"], 1)
+        self.assertEqual(wynik["bledy"], 1)
+        self.assertEqual(self.status("A"), PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(self.status("B"), PlatnoscPayU.STATUS_FAILED)
+        self.assertEqual(self.status("D"), PlatnoscPayU.STATUS_PENDING)
+        self.assertEqual(
+            sorted(Wplata.objects.values_list("zrodlo_id", flat=True)), ["A", "E"]
+        )
+
+    def test_recent_and_finished_orders_are_skipped(self):
+        self.platnosc("A", "COMPLETED", minut_temu=5)
+        self.platnosc("B", "COMPLETED", status=PlatnoscPayU.STATUS_FAILED)
+
+        self.assertEqual(uzgodnij_platnosci()["sprawdzone"], 0)
+        self.get_order.assert_not_called()
+
+    def test_order_with_long_valid_link_is_checked_hourly(self):
+        waznosc = timezone.now() + timedelta(days=6)
+        self.platnosc("A", "PENDING", minut_temu=60 * 24)
+        self.platnosc("B", "COMPLETED", minut_temu=60 * 24)
+        PlatnoscPayU.objects.update(wazna_do=waznosc)
+
+        self.assertEqual(uzgodnij_platnosci()["sprawdzone"], 2)
+        # zapłacona pierwszego dnia, bez webhooka - nie czeka na wygaśnięcie linku
+        self.assertEqual(self.status("B"), PlatnoscPayU.STATUS_COMPLETED)
+
+        self.assertEqual(uzgodnij_platnosci()["sprawdzone"], 0)
+        PlatnoscPayU.objects.update(sprawdzona=timezone.now() - timedelta(minutes=61))
+        self.assertEqual(uzgodnij_platnosci()["sprawdzone"], 1)
+
+    def test_expired_order_is_only_credited(self):
+        self.platnosc("A", "COMPLETED", status=PlatnoscPayU.STATUS_EXPIRED)
+        self.platnosc("B", "CANCELED", status=PlatnoscPayU.STATUS_EXPIRED)
+        self.platnosc(
+            "C",
+            "COMPLETED",
+            status=PlatnoscPayU.STATUS_EXPIRED,
+            minut_temu=60 * 24 * 30,
+        )
+
+        uzgodnij_platnosci()
+
+        self.assertEqual(self.status("A"), PlatnoscPayU.STATUS_COMPLETED)
+        self.assertEqual(self.status("B"), PlatnoscPayU.STATUS_EXPIRED)
+        self.assertEqual(self.status("C"), PlatnoscPayU.STATUS_EXPIRED)
+
+    def test_concurrency_is_bounded(self):
+        for nr in range(12):
+            self.platnosc(f"O{nr}", "PENDING")
+        aktywne = []
+        maks = []
+        blokada = threading.Lock()
+
+        def wolne_payu(order_id):
+            with blokada:
+                aktywne.append(order_id)
+                maks.append(len(aktywne))
+            time.sleep(0.02)
+            with blokada:
+                aktywne.remove(order_id)
+            return self.odpowiedz_payu(order_id)
+
+        self.get_order.side_effect = wolne_payu
+        wynik = uzgodnij_platnosci(watki=3, na_sekunde=0)
+
+        self.assertEqual(wynik["sprawdzone"], 12)
+        self.assertLessEqual(max(maks), 3)
+
+    def test_command_prints_summary(self):
+        self.platnosc("A", "COMPLETED")
+
+        wyjscie = StringIO()
+        call_command("uzgodnij_platnosci", "--na-sekunde", "0", stdout=wyjscie)
+
+        self.assertIn("Sprawdzone: 1, zakończone: 1", wyjscie.getvalue())
@@ -0,0 +1,215 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rejs.models import PrzelewBankowy, Rejs, Wplata, Zgloszenie, Zmiana
+from rejs.wyciagi import (
+    Indeks,
+    Przelew,
+    czytaj_csv,
+    czytaj_mt940,
+    czytaj_wyciag,
+    importuj,
+)
+
+CSV = """Data operacji;Kwota;Tytuł;Nadawca;Identyfikator
+2026-05-02;500,00;Zgłoszenie {kowalski} Jan Kowalski;JAN KOWALSKI;TX1
+02.05.2026;1 000,00;dopłata rejs;Łucja Żak;TX2
+2026-05-03;-120,50;opłata za konto;BANK;TX3
+"""
+
+MT940 = """:20:WYCIAG
+:25:PL61109010140000071219812874
+:28C:1
+:60F:C260501PLN0,00
+:61:2605020502C500,00NTRFNONREF//BANKREF1
+:86:020~00TRF~20Zgloszenie 17 Jan~21Kowalski~32JAN KOWALSKI~33GDYNIA
+:61:2605030503D99,00NTRFNONREF
+:86:020~20Prowizja
+:62F:C260503PLN401,00
+"""
+
+
+class WyciagiTests(TestCase):
+    def setUp(self):
+        self.rejs = Rejs.objects.create(
+            nazwa="Rejs letni",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+            cena=1500,
+            zaliczka=500,
+        )
+        self.kowalski = self.zgloszenie("Jan", "Kowalski")
+        self.zak = self.zgloszenie(
+            "Łucja", "Żak", status=Zgloszenie.STATUS_ZAKWALIFIKOWANY
+        )
+        Wplata.objects.create(zgloszenie=self.zak, rodzaj="wplata", kwota=500)
+        mail.outbox.clear()
+
+    def zgloszenie(
+        self, imie, nazwisko, status=Zgloszenie.STATUS_NIEZAKWALIFIKOWANY, rejs=None
+    ):
+        return Zgloszenie.objects.create(
+            imie=imie,
+            nazwisko=nazwisko,
+            email=f"{Zgloszenie.objects.count()}@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=rejs or self.rejs,
+            status=status,
+        )
+
+    def przelew(self, tytul, kwota, nadawca=""):
+        return Przelew("X", date(2026, 5, 2), Decimal(kwota), tytul, nadawca)
+
+    def test_csv_is_read_with_polish_formats(self):
+        dane = CSV.format(kowalski=self.kowalski.pk).encode("cp1250")
+
+        przelewy = czytaj_csv(dane)
+
+        self.assertEqual(len(przelewy), 2)
+        self.assertEqual(przelewy[1].data, date(2026, 5, 2))
+        self.assertEqual(przelewy[1].kwota, Decimal("1000.00"))
+        self.assertEqual(przelewy[1].nadawca, "Łucja Żak")
+        self.assertEqual(przelewy[0].id_transakcji, "TX1")
+
+    def test_identical_lines_without_id_get_distinct_ids(self):
+        dane = "data,kwota,tytul\n2026-05-02,500,zaliczka\n2026-05-02,500,zaliczka\n"
+
+        przelewy = czytaj_csv(dane)
+
+        self.assertEqual(len({p.id_transakcji for p in przelewy}), 2)
+        self.assertEqual(przelewy[0].id_transakcji, czytaj_csv(dane)[0].id_transakcji)
+
+    def test_mt940_credits_are_read(self):
+        (przelew,) = czytaj_mt940(MT940)
+
+        self.assertEqual(przelew.id_transakcji, "BANKREF1")
+        self.assertEqual(przelew.kwota, Decimal("500.00"))
+        self.assertEqual(przelew.tytul, "Zgloszenie 17 JanKowalski")
+        self.assertEqual(przelew.nadawca, "JAN KOWALSKIGDYNIA")
+        self.assertEqual(len(czytaj_wyciag(MT940.encode())), 1)
+
+    def test_matching_rules(self):
+        indeks = Indeks.z_bazy()
+        tokenem = f"rejs {str(self.zak.token)[:8]}"
+
+        self.assertEqual(
+            indeks.dopasuj(self.przelew(f"Zgłoszenie nr {self.kowalski.pk}", "1")),
+            (None, [self.kowalski.pk]),
+        )
+        self.assertEqual(
+            indeks.dopasuj(
+                self.przelew(f"Zgloszenie {self.kowalski.pk} J. Kowalski", "500")
+            ),
+            (self.kowalski, []),
+        )
+        self.assertEqual(indeks.dopasuj(self.przelew(tokenem, "3")), (self.zak, []))
+        # imię i nazwisko z nadawcy, kwota równa pozostałej do zapłaty
+        self.assertEqual(
+            indeks.dopasuj(self.przelew("dopłata", "1000", "ŁUCJA ŻAK")), (self.zak, [])
+        )
+        self.assertEqual(indeks.dopasuj(self.przelew("darowizna", "50")), (None, []))
+
+    def test_namesakes_go_to_review(self):
+        drugi = self.zgloszenie("Jan", "Kowalski")
+        self.zgloszenie("Jan", "Kowalski", rejs=Rejs.objects.create(
+            nazwa="Dawny rejs",
+            od=date.today() - timedelta(days=400),
+            do=date.today() - timedelta(days=390),
+            start="Gdynia",
+            koniec="Gdańsk",
+        ))
+
+        zgl, kandydaci = Indeks.z_bazy().dopasuj(
+            self.przelew("zaliczka Jan Kowalski", "500")
+        )
+
+        self.assertIsNone(zgl)
+        self.assertEqual(sorted(kandydaci), [self.kowalski.pk, drugi.pk])
+
+    def test_import_books_matches_in_bulk_and_skips_reimport(self):
+        dane = CSV.format(kowalski=self.kowalski.pk)
+        Zmiana.objects.all().delete()
+
+        with patch(
+            "rejs.mailers.get_connection", wraps=mail.get_connection
+        ) as polaczenie:
+            wynik = importuj(czytaj_csv(dane))
+
+        self.assertEqual((wynik["zaksiegowane"], wynik["do_sprawdzenia"]), (2, 0))
+        self.assertEqual(self.zak.suma_wplat, Decimal("1500"))
+        self.assertEqual(
+            Wplata.objects.get(zgloszenie=self.kowalski).zrodlo_id, "bank-TX1"
+        )
+        self.assertEqual(Zmiana.objects.filter(model="wplata").count(), 2)
+        polaczenie.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+
+        wynik = importuj(czytaj_csv(dane))
+        self.assertEqual(wynik["pominiete"], 2)
+        self.assertEqual(Wplata.objects.count(), 3)
+
+    def test_queries_are_per_batch_not_per_line(self):
+        def wyciag(liczba):
+            return [
+                Przelew(
+                    f"T{liczba}-{nr}",
+                    date(2026, 5, 2),
+                    Decimal("500"),
+                    f"Jan Kowalski {nr}",
+                    "",
+                )
+                for nr in range(liczba)
+            ]
+
+        with CaptureQueriesContext(connection) as zapytania:
+            self.assertEqual(importuj(wyciag(400), maile=False)["zaksiegowane"], 400)
+
+        # kilka zapytań na partię bulk_create (limit parametrów SQLite), nie na linię
+        self.assertLess(len(zapytania), 20)
+
+    def test_review_queue_in_admin(self):
+        importuj([self.przelew("wpłata", "700", "J. Nowak")])
+        przelew = PrzelewBankowy.objects.get()
+        self.assertEqual(przelew.status, PrzelewBankowy.STATUS_DO_SPRAWDZENIA)
+        self.client.force_login(
+            User.objects.create_superuser("admin", "a@test.pl", "haslo")
+        )
+
+        self.client.post(
+            reverse("admin:rejs_przelewbankowy_change", args=[przelew.pk]),
+            {"zgloszenie": self.kowalski.pk},
+        )
+
+        przelew.refresh_from_db()
+        self.assertEqual(przelew.status, PrzelewBankowy.STATUS_ZAKSIEGOWANY)
+        self.assertEqual(przelew.wplata.zgloszenie, self.kowalski)
+        self.assertEqual(przelew.wplata.kwota, Decimal("700"))
+
+    def test_command(self):
+        with TemporaryDirectory() as katalog:
+            plik = Path(katalog) / "wyciag.sta"
+            plik.write_text(
+                MT940.replace("Zgloszenie 17", f"Zgloszenie {self.kowalski.pk}")
+            )
+            wyjscie = StringIO()
+            call_command("importuj_wyciag", str(plik), "--bez-maili", stdout=wyjscie)
+
+        self.assertIn("Przelewy: 1, zaksięgowane: 1", wyjscie.getvalue())
+        self.assertEqual(mail.outbox, [])
@@ -0,0 +1,190 @@
+import json
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core import signing
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from rejs.models import PlatnoscPayU, Rejs, Wachta, Wplata, Zgloszenie, Zmiana
+from rejs.zmiany import dekoduj_kursor, koduj_kursor, przytnij
+
+
+@override_settings(CHANGE_FEED_TOKEN="sekret")
+class ZmianyFeedTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.rejs = Rejs.objects.create(
+            nazwa="Testowy rejs",
+            od=date(2025, 6, 1),
+            do=date(2025, 6, 10),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.zgloszenie = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko="Kowalski",
+            email="jan@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            wzrok="WIDZI",
+            obecnosc="tak",
+            adres="Chrzanowa 1a",
+            miejscowosc="Warszawa",
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+        )
+
+    def pobierz(self, kursor=""):
+        response = self.client.get(
+            "/api/zmiany/",
+            {"kursor": kursor},
+            HTTP_AUTHORIZATION="Bearer sekret",
+        )
+        self.assertEqual(response.status_code, 200)
+        linie = b"".join(response.streaming_content).decode().splitlines()
+        wpisy = [json.loads(linia) for linia in linie]
+        return wpisy[:-1], wpisy[-1]
+
+    def test_requires_token(self):
+        response = self.client.get("/api/zmiany/")
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(CHANGE_FEED_TOKEN="")
+    def test_disabled_without_token(self):
+        response = self.client.get("/api/zmiany/", HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            "/api/zmiany/",
+            {"kursor": "123"},
+            HTTP_AUTHORIZATION="Bearer sekret",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_initial_feed_contains_saved_objects(self):
+        zmiany, koniec = self.pobierz()
+
+        self.assertEqual(len(zmiany), 1)
+        self.assertEqual(zmiany[0]["model"], "zgloszenie")
+        self.assertEqual(zmiany[0]["id"], self.zgloszenie.pk)
+        self.assertEqual(zmiany[0]["dane"]["nazwisko"], "Kowalski")
+        self.assertFalse(koniec["wiecej"])
+
+    def test_cursor_returns_only_newer_changes(self):
+        _, koniec = self.pobierz()
+
+        Wplata.objects.create(zgloszenie=self.zgloszenie, kwota=500, rodzaj="wplata")
+        zmiany, koniec = self.pobierz(koniec["kursor"])
+
+        self.assertEqual([z["model"] for z in zmiany], ["wplata"])
+        self.assertEqual(zmiany[0]["dane"]["kwota"], "500.00")
+
+        zmiany, _ = self.pobierz(koniec["kursor"])
+        self.assertEqual(zmiany, [])
+
+    def test_multiple_updates_are_collapsed(self):
+        _, koniec = self.pobierz()
+
+        self.zgloszenie.imie = "Janusz"
+        self.zgloszenie.save()
+        self.zgloszenie.imie = "Jan Maria"
+        self.zgloszenie.save()
+
+        zmiany, _ = self.pobierz(koniec["kursor"])
+        self.assertEqual(len(zmiany), 1)
+        self.assertEqual(zmiany[0]["dane"]["imie"], "Jan Maria")
+
+    def test_deletes_are_reported(self):
+        wachta = Wachta.objects.create(rejs=self.rejs, nazwa="Alfa")
+        _, koniec = self.pobierz()
+
+        wachta_id = wachta.pk
+        wachta.delete()
+
+        zmiany, _ = self.pobierz(koniec["kursor"])
+        self.assertIn(
+            {"model": "wachta", "id": wachta_id, "operacja": "usuniecie"},
+            [{k: z[k] for k in ("model", "id", "operacja")} for z in zmiany],
+        )
+
+    def test_management_command_persists_cursor(self):
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as katalog:
+            plik = Path(katalog) / "kursor"
+
+            out = StringIO()
+            call_command("zmiany", plik_kursora=str(plik), stdout=out)
+            self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+            out = StringIO()
+            call_command("zmiany", plik_kursora=str(plik), stdout=out)
+            self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+    def test_check_timestamp_is_not_in_payload(self):
+        PlatnoscPayU.objects.create(
+            zgloszenie=self.zgloszenie, typ="zaliczka", kwota=500, payu_order_id="A"
+        )
+
+        zmiany, _ = self.pobierz()
+
+        dane = next(z["dane"] for z in zmiany if z["model"] == "platnoscpayu")
+        self.assertEqual(dane["payu_order_id"], "A")
+        self.assertNotIn("sprawdzona", dane)
+
+    def test_pruning_rejects_cursors_from_before_it(self):
+        _, stary = self.pobierz()
+        for nr in range(3):
+            Wachta.objects.create(rejs=self.rejs, nazwa=f"Wachta {nr}")
+        zmiany, aktualny = self.pobierz(stary["kursor"])
+        self.assertEqual(len(zmiany), 3)
+        Zmiana.objects.update(data=timezone.now() - timedelta(days=100))
+        Wachta.objects.create(rejs=self.rejs, nazwa="Nowa")
+
+        out = StringIO()
+        call_command("przytnij_zmiany", "--dni", "90", "--partia", "2", stdout=out)
+
+        # ostatni ze starych zostaje jako granica przyciętych wpisów
+        self.assertIn("Usunięte wpisy: 3", out.getvalue())
+        self.assertEqual(Zmiana.objects.count(), 2)
+        zmiany, _ = self.pobierz(aktualny["kursor"])
+        self.assertEqual([z["dane"]["nazwa"] for z in zmiany], ["Nowa"])
+
+        response = self.client.get(
+            "/api/zmiany/",
+            {"kursor": stary["kursor"]},
+            HTTP_AUTHORIZATION="Bearer sekret",
+        )
+        self.assertEqual(response.status_code, 410)
+        with self.assertRaises(CommandError):
+            call_command("zmiany", kursor=stary["kursor"], stdout=StringIO())
+
+    def test_pruning_stops_at_first_recent_entry(self):
+        for nazwa in ("Alfa", "Beta", "Gamma"):
+            Wachta.objects.create(rejs=self.rejs, nazwa=nazwa)
+        pierwszy, drugi, trzeci, czwarty = Zmiana.objects.order_by("id")
+        Zmiana.objects.filter(pk__in=[pierwszy.pk, drugi.pk, czwarty.pk]).update(
+            data=timezone.now() - timedelta(days=100)
+        )
+
+        self.assertEqual(przytnij(dni=90), 1)
+        self.assertEqual(
+            list(Zmiana.objects.order_by("id").values_list("id", flat=True)),
+            [drugi.pk, trzeci.pk, czwarty.pk],
+        )
+        self.assertEqual(len(self.pobierz(koduj_kursor((0, drugi.pk)))[0]), 2)
+
+    def test_cursor_from_before_transaction_ids_is_accepted(self):
+        Wachta.objects.create(rejs=self.rejs, nazwa="Alfa")
+        pierwszy = Zmiana.objects.order_by("id").first()
+
+        stary = signing.dumps(pierwszy.pk, salt="rejs.zmiany.kursor")
+
+        self.assertEqual(dekoduj_kursor(stary), (0, pierwszy.pk))
+        zmiany, _ = self.pobierz(stary)
+        self.assertEqual([z["dane"]["nazwa"] for z in zmiany], ["Alfa"])
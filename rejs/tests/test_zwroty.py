@@ -0,0 +1,197 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+
+from rejs import zwroty
+from rejs.models import PlatnoscPayU, Rejs, Wplata, Zgloszenie, Zmiana, ZwrotPayU
+
+
+class ZwrotyPayUTests(TestCase):
+    def setUp(self):
+        self.rejs = Rejs.objects.create(
+            nazwa="Odwołany rejs",
+            od=date.today() + timedelta(days=30),
+            do=date.today() + timedelta(days=40),
+            start="Gdynia",
+            koniec="Gdańsk",
+        )
+        self.platnosci = [
+            self.platnosc(nr, PlatnoscPayU.STATUS_COMPLETED) for nr in range(3)
+        ]
+        self.platnosc(3, PlatnoscPayU.STATUS_PENDING)
+        mail.outbox.clear()
+
+        payu = patch("rejs.zwroty.PayUClient").start()
+        self.addCleanup(patch.stopall)
+        self.client_payu = payu.return_value
+        self.client_payu.refund.side_effect = lambda order_id, **kw: {
+            "refund": {"refundId": f"R-{order_id}", "extRefundId": kw["ext_refund_id"]}
+        }
+        self.client_payu.get_refunds.return_value = {"refunds": []}
+
+    def platnosc(self, nr, status):
+        zgl = Zgloszenie.objects.create(
+            imie="Jan",
+            nazwisko=f"Kowalski{nr}",
+            email=f"jan{nr}@test.pl",
+            telefon="123456789",
+            data_urodzenia=date(2000, 1, 1),
+            kod_pocztowy="00-001",
+            rodo=True,
+            rejs=self.rejs,
+        )
+        platnosc = PlatnoscPayU.objects.create(
+            zgloszenie=zgl,
+            typ="zaliczka",
+            kwota=500,
+            payu_order_id=f"O{nr}",
+            status=status,
+        )
+        if status == PlatnoscPayU.STATUS_COMPLETED:
+            Wplata.objects.create(
+                zgloszenie=zgl, kwota=500, rodzaj=Wplata.RODZAJ_PAYU, zrodlo_id=f"O{nr}"
+            )
+        return platnosc
+
+    def test_cancel_creates_refunds_for_completed_payments(self):
+        self.assertEqual(zwroty.odwolaj_rejs(self.rejs), 3)
+        self.assertEqual(zwroty.odwolaj_rejs(self.rejs), 0)
+
+        self.rejs.refresh_from_db()
+        self.assertTrue(self.rejs.odwolany)
+        self.assertFalse(self.rejs.aktywna_rekrutacja)
+        self.assertEqual(
+            sorted(ZwrotPayU.objects.values_list("platnosc__payu_order_id", flat=True)),
+            ["O0", "O1", "O2"],
+        )
+
+    def test_refunds_are_booked_in_bulk_and_mailed_once(self):
+        zwroty.odwolaj_rejs(self.rejs)
+        Zmiana.objects.all().delete()
+
+        wynik = zwroty.zlec_zwroty(na_sekunde=0)
+
+        self.assertEqual(wynik["zlecone"], 3)
+        zwrocone = Wplata.objects.filter(rodzaj="zwrot").values_list(
+            "zrodlo_id", flat=True
+        )
+        self.assertEqual(sorted(zwrocone), ["R-O0", "R-O1", "R-O2"])
+        for platnosc in self.platnosci:
+            self.assertEqual(platnosc.zgloszenie.suma_wplat, Decimal("0"))
+        # bez maili z sygnału - idą jedną rundą
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Zmiana.objects.filter(model="wplata").count(), 3)
+
+        with patch(
+            "rejs.mailers.get_connection", wraps=mail.get_connection
+        ) as polaczenie:
+            self.assertEqual(zwroty.wyslij_powiadomienia(), 3)
+        polaczenie.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertTrue(mail.outbox[0].subject.startswith("Zwrot wpłaconych środków"))
+
+        self.assertEqual(zwroty.wyslij_powiadomienia(), 0)
+
+    def test_failed_refund_is_retried_on_next_run(self):
+        zwroty.odwolaj_rejs(self.rejs)
+        udane = self.client_payu.refund.side_effect
+
+        def awaria_dla_o1(order_id, **kw):
+            if order_id == "O1":
+                raise requests.HTTPError("500")
+            return udane(order_id, **kw)
+
+        self.client_payu.refund.side_effect = awaria_dla_o1
+        with self.assertLogs("rejs.zwroty", "WARNING"):
+            wynik = zwroty.zlec_zwroty(na_sekunde=0)
+        self.assertEqual((wynik["zlecone"], wynik["bledy"]), (2, 1))
+        zwrot = ZwrotPayU.objects.get(platnosc__payu_order_id="O1")
+        self.assertEqual((zwrot.status, zwrot.proby), (ZwrotPayU.STATUS_BLAD, 1))
+
+        self.client_payu.refund.side_effect = udane
+        self.assertEqual(zwroty.zlec_zwroty(na_sekunde=0)["zlecone"], 1)
+        self.assertEqual(Wplata.objects.filter(rodzaj="zwrot").count(), 3)
+
+    def test_interrupted_refund_is_found_in_payu(self):
+        zwroty.odwolaj_rejs(self.rejs)
+        # przerwane uruchomienie: zwrot zlecony w PayU, ale niezapisany u nas
+        ZwrotPayU.objects.filter(platnosc__payu_order_id="O0").update(
+            status=ZwrotPayU.STATUS_ZLECANY
+        )
+        self.client_payu.get_refunds.return_value = {
+            "refunds": [
+                {
+                    "refundId": "R-WCZESNIEJ",
+                    "extRefundId": f"zwrot-{self.platnosci[0].pk}",
+                }
+            ]
+        }
+
+        zwroty.zlec_zwroty(na_sekunde=0)
+
+        zlecone = [c.args[0] for c in self.client_payu.refund.call_args_list]
+        self.assertEqual(sorted(zlecone), ["O1", "O2"])
+        self.assertEqual(
+            ZwrotPayU.objects.get(platnosc__payu_order_id="O0").refund_id, "R-WCZESNIEJ"
+        )
+
+    def test_timed_out_refund_is_found_in_payu_on_retry(self):
+        zwroty.odwolaj_rejs(self.rejs)
+        udane = self.client_payu.refund.side_effect
+        przyjete = []
+
+        def timeout_dla_o1(order_id, **kw):
+            if order_id == "O1":
+                # PayU przyjęło zwrot, ale odpowiedź nie dotarła
+                przyjete.append(
+                    {"refundId": "R-PO-TIMEOUT", "extRefundId": kw["ext_refund_id"]}
+                )
+                raise requests.Timeout("read timeout")
+            return udane(order_id, **kw)
+
+        self.client_payu.refund.side_effect = timeout_dla_o1
+        self.client_payu.get_refunds.side_effect = lambda order_id: {
+            "refunds": przyjete if order_id == "O1" else []
+        }
+        with self.assertLogs("rejs.zwroty", "WARNING"):
+            zwroty.zlec_zwroty(na_sekunde=0)
+        self.assertEqual(
+            ZwrotPayU.objects.get(platnosc__payu_order_id="O1").status,
+            ZwrotPayU.STATUS_BLAD,
+        )
+
+        wynik = zwroty.zlec_zwroty(na_sekunde=0)
+
+        self.assertEqual(wynik["zlecone"], 1)
+        zlecone = [c.args[0] for c in self.client_payu.refund.call_args_list]
+        self.assertEqual(zlecone.count("O1"), 1)
+        zwrot = ZwrotPayU.objects.get(platnosc__payu_order_id="O1")
+        self.assertEqual(
+            (zwrot.status, zwrot.refund_id), (ZwrotPayU.STATUS_ZLECONY, "R-PO-TIMEOUT")
+        )
+        self.assertTrue(
+            Wplata.objects.filter(rodzaj="zwrot", zrodlo_id="R-PO-TIMEOUT").exists()
+        )
+        self.assertEqual(zwroty.wyslij_powiadomienia(), 3)
+
+    def test_command_cancels_and_refunds(self):
+        wyjscie = StringIO()
+        call_command(
+            "zwroty_payu",
+            "--rejs",
+            str(self.rejs.pk),
+            "--odwolaj",
+            "--na-sekunde",
+            "0",
+            stdout=wyjscie,
+        )
+
+        self.assertIn(
+            "Zlecone zwroty: 3, błędy: 0, wysłane maile: 3", wyjscie.getvalue()
+        )
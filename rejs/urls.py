@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
-from .views_payu import zaplac, payu_webhook, payu_continue
+from .views_payu import zaplac, payu_webhook, payu_continue, payu_status
+from .views_zmiany import zmiany_feed
 
 urlpatterns = [
 	path("", views.index, name="index"),
@@ -29,5 +30,14 @@ urlpatterns += [
 	payu_continue,
 	name="payu_continue",
 ),
+	path(
+		"payu/status/<uuid:token>/<int:platnosc_id>/",
+		payu_status,
+		name="payu_status",
+	),
 
 ]
+
+urlpatterns += [
+	path("api/zmiany/", zmiany_feed, name="zmiany_feed"),
+]
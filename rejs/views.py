@@ -1,7 +1,10 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.timezone import localdate
+from . import kolejka
+from .baza import ponawiaj_przy_blokadzie
 from .forms import Dane_DodatkoweForm, ZgloszenieForm
-from .models import Rejs, Zgloszenie
+from .models import Dane_Dodatkowe, Rejs, Zgloszenie
 
 
 def index(request):
@@ -13,6 +16,7 @@ def index(request):
 	return render(request, "rejs/index.html", {"rejsy": rejsy})
 
 
+@ponawiaj_przy_blokadzie
 def zgloszenie_utworz(request, rejs_id):
 	rejs = get_object_or_404(Rejs, id=rejs_id)
 	if not rejs.aktywna_rekrutacja or rejs.od < localdate():
@@ -20,24 +24,27 @@ def zgloszenie_utworz(request, rejs_id):
 	if request.method == "POST":
 		form = ZgloszenieForm(request.POST, initial={"rejs": rejs})
 		if form.is_valid():
-			zgl = form.save(commit=False)
-			zgl.rejs = rejs
-			zgl.save()
-			return redirect("zgloszenie_details", token=zgl.token)
+			if rejs.tryb_kolejki:
+				token = kolejka.dodaj(rejs, form)
+				return redirect("zgloszenie_details", token=token)
+			zgl = form.zapisz(rejs)
+			if zgl is not None:
+				return redirect("zgloszenie_details", token=zgl.token)
 	else:
 		form = ZgloszenieForm(initial={"rejs": rejs})
 
 	return render(request, "rejs/zgloszenie_form.html", {"form": form, "rejs": rejs})
 
+@ponawiaj_przy_blokadzie
 def dane_dodatkowe_form(request, token):
 	zgloszenie = get_object_or_404(Zgloszenie, token=token)
 	rejs = zgloszenie.rejs
 	if request.method == "POST":
-		form = Dane_DodatkoweForm(request.POST)
+		form = Dane_DodatkoweForm(
+			request.POST, instance=Dane_Dodatkowe(zgloszenie=zgloszenie)
+		)
 		if form.is_valid():
-			dane = form.save(commit=False)
-			dane.zgloszenie = zgloszenie
-			dane.save()
+			form.save()
 			return redirect(zgloszenie.get_absolute_url())
 	else:
 			form = Dane_DodatkoweForm()
@@ -49,7 +56,14 @@ def dane_dodatkowe_form(request, token):
 	})
 
 def zgloszenie_details(request, token):
-	zgloszenie = get_object_or_404(Zgloszenie, token=token)
+	try:
+		zgloszenie = Zgloszenie.objects.get(token=token)
+	except Zgloszenie.DoesNotExist:
+		# zgłoszenie przyjęte w trybie kolejki może jeszcze czekać na zapis
+		stan = kolejka.stan(token)
+		if stan is None:
+			raise Http404()
+		return render(request, "rejs/zgloszenie_oczekujace.html", stan)
 	if zgloszenie.status in ["QUALIFIED", "Zakwalifikowany"] and not hasattr(zgloszenie, "dane_dodatkowe"):
 		return redirect('dane_dodatkowe_form', token=token)
 	return render(request, "rejs/zgloszenie_details.html", {"zgloszenie": zgloszenie})
@@ -1,65 +1,44 @@
-import json
-from django.http import Http404, HttpResponse, HttpResponseForbidden
+import time
+
+import requests
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.csrf import csrf_exempt
 
 from rejs.payu import PayUClient
-from .models import PlatnoscPayU, Wplata, Zgloszenie
+from .baza import ponawiaj_przy_blokadzie
+from .models import PlatnoscPayU, Zgloszenie
+from .platnosci import STATUSY_KONCOWE, czekaj_na_link, odswiez_z_payu, zajmij_platnosc
+from .powiadomienia import odbierz
 from .payu_verify import verify_payu_signature
 
+# górna granica long pollingu payu_status w sekundach - każde czekające
+# żądanie trzyma jeden proces gunicorna
+MAKS_LONGPOLL = 5
+
 
 @csrf_exempt
+@ponawiaj_przy_blokadzie
 def payu_webhook(request):
 	# 1️⃣ weryfikacja podpisu
 	if not verify_payu_signature(request):
 		return HttpResponseForbidden("Invalid signature")
 
-	data = json.loads(request.body)
-	order = data.get("order")
-
-	if not order:
+	# 2️⃣ tylko zapis do skrzynki - status stosuje komenda przetworz_powiadomienia
+	if odbierz(request.body) is None:
 		return HttpResponse("NO ORDER", status=400)
 
-	order_id = order["orderId"]
-	status = order["status"]
-
-	try:
-		platnosc = PlatnoscPayU.objects.select_related("zgloszenie").get(
-			payu_order_id=order_id
-		)
-	except PlatnoscPayU.DoesNotExist:
-		return HttpResponse("UNKNOWN ORDER", status=404)
-
-	# 2️⃣ idempotencja
-	if platnosc.status == PlatnoscPayU.STATUS_COMPLETED:
-		return HttpResponse("OK")
-
-	# 3️⃣ obsługa statusów
-	if status == PlatnoscPayU.STATUS_COMPLETED:
-		platnosc.status = PlatnoscPayU.STATUS_COMPLETED
-		platnosc.save()
-
-		Wplata.objects.get_or_create(
-			zgloszenie=platnosc.zgloszenie,
-			zrodlo_id=order_id,
-			defaults={
-				"kwota": platnosc.kwota,
-				"rodzaj": Wplata.RODZAJ_PAYU,
-				"opis": f"PayU – {platnosc.typ}",
-			}
-		)
-
-	elif status in ("FAILED", "CANCELED"):
-		platnosc.status = PlatnoscPayU.STATUS_FAILED
-		platnosc.save()
-
 	return HttpResponse("OK")
 
 
+@ponawiaj_przy_blokadzie
 def zaplac(request, token, typ):
 	zgl = get_object_or_404(Zgloszenie, token=token)
 
 	if typ == "zaliczka":
+		if zgl.status == Zgloszenie.STATUS_REZERWOWA:
+			raise Http404()
 		kwota = zgl.rejs.zaliczka
 
 	elif typ == "reszta":
@@ -70,29 +49,49 @@ def zaplac(request, token, typ):
 	else:
 		raise Http404()
 
-	platnosc = PlatnoscPayU.objects.create(
-		zgloszenie=zgl,
-		kwota=kwota,
-		typ=typ,
-	)
+	platnosc, nowa = zajmij_platnosc(zgl, typ, kwota)
 
-	client = PayUClient()
-	result = client.create_order(
-		kwota=kwota,
-		opis=f"{zgl.rejs.nazwa} – {typ}",
-		email=zgl.email,
-		notify_url=request.build_absolute_uri("/payu/webhook/"),
-		continue_url=request.build_absolute_uri(
-		f"/payu/continue/{zgl.token}/{platnosc.id}/"
-)
+	# ponowne kliknięcie - ten sam link do PayU zamiast nowego zamówienia
+	if not nowa:
+		if czekaj_na_link(platnosc):
+			return redirect(platnosc.redirect_uri)
+		return render(request, "payu/error.html", {
+			"message": (
+				"Płatność jest właśnie przygotowywana. Spróbuj ponownie za chwilę."
+			)
+		})
 
-	)
+	client = PayUClient()
+	try:
+		result = client.create_order(
+			kwota=kwota,
+			opis=f"{zgl.rejs.nazwa} – {typ}",
+			email=zgl.email,
+			notify_url=request.build_absolute_uri("/payu/webhook/"),
+			continue_url=request.build_absolute_uri(
+				f"/payu/continue/{zgl.token}/{platnosc.id}/"
+			),
+		)
+		platnosc.payu_order_id = result["orderId"]
+		platnosc.redirect_uri = result["redirectUri"]
+	except (requests.RequestException, KeyError, ValueError):
+		# FAILED zwalnia płatność - kolejne kliknięcie zajmie nową zamiast czekać
+		platnosc.status = PlatnoscPayU.STATUS_FAILED
+		_zapisz(platnosc, ["status"])
+		return render(request, "payu/error.html", {
+			"message": "Nie udało się połączyć z PayU. Spróbuj ponownie za chwilę."
+		})
 
-	platnosc.payu_order_id = result["orderId"]
 	platnosc.status = PlatnoscPayU.STATUS_PENDING
-	platnosc.save()
+	_zapisz(platnosc, ["payu_order_id", "redirect_uri", "status"])
+
+	return redirect(platnosc.redirect_uri)
 
-	return redirect(result["redirectUri"])
+
+@ponawiaj_przy_blokadzie
+def _zapisz(platnosc, pola):
+	# zamówienie w PayU już jest - przy blokadzie powtarzamy sam zapis, nie cały widok
+	platnosc.save(update_fields=pola)
 
 
 @csrf_exempt
@@ -110,38 +109,45 @@ def payu_continue(request, token, platnosc_id):
 			"message": "Brak powiązania z PayU."
 		})
 
-	client = PayUClient()
-
-	try:
-		data = client.get_order(platnosc.payu_order_id)
-	except Exception:
-		return render(request, "payu/error.html", {
-			"message": "Nie udało się pobrać statusu płatności z PayU."
-		})
-
-	order = data["orders"][0]
-	status = order["status"]
-
-	# 🔁 synchronizacja statusu
-	if platnosc.status != status:
-		platnosc.status = status
-		platnosc.save()
-
-	# 💰 wpłata – IDEMPOTENTNIE
-	if status == PlatnoscPayU.STATUS_COMPLETED:
-		Wplata.objects.get_or_create(
-			zgloszenie=zgloszenie,
-			zrodlo_id=platnosc.payu_order_id,
-			defaults={
-				"kwota": platnosc.kwota,
-				"rodzaj": Wplata.RODZAJ_PAYU,
-				"opis": f"PayU – {platnosc.typ}",
-			}
-		)
-
+	# bez pytania PayU - status dociąga strona przez payu_status
 	return render(request, "payu/summary.html", {
-		"status": status,
+		"status": platnosc.status,
 		"kwota": platnosc.kwota,
 		"order_id": platnosc.payu_order_id,
 		"zgloszenie": zgloszenie,
+		"platnosc": platnosc,
+		"zakonczona": platnosc.status in STATUSY_KONCOWE,
+	})
+
+
+def payu_status(request, token, platnosc_id):
+	"""
+	Status płatności jako JSON, dla strony powrotu z PayU.
+
+	Long polling: z parametrem ``status`` odpowiedź czeka (maks.
+	``PAYU["STATUS_LONGPOLL"]`` s, nie dłużej niż ``MAKS_LONGPOLL``), aż status
+	w bazie będzie inny niż podany. Czekanie zajmuje proces serwera, więc jest
+	krótkie - strona i tak pyta ponownie co 2 s.
+	"""
+	platnosc = get_object_or_404(
+		PlatnoscPayU.objects.select_related("zgloszenie"),
+		id=platnosc_id,
+		zgloszenie__token=token,
+	)
+	znany = request.GET.get("status")
+	czekanie = min(settings.PAYU.get("STATUS_LONGPOLL", 3), MAKS_LONGPOLL)
+	koniec = time.monotonic() + czekanie
+
+	while True:
+		odswiez_z_payu(platnosc)
+		if platnosc.status != znany or platnosc.status in STATUSY_KONCOWE:
+			break
+		if time.monotonic() >= koniec:
+			break
+		time.sleep(1)
+		platnosc.refresh_from_db(fields=["status", "sprawdzona"])
+
+	return JsonResponse({
+		"status": platnosc.status,
+		"zakonczona": platnosc.status in STATUSY_KONCOWE,
 	})
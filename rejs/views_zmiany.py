@@ -0,0 +1,47 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .zmiany import (
+	DOMYSLNY_LIMIT,
+	KursorPrzedawniony,
+	NieprawidlowyKursor,
+	dekoduj_kursor,
+	ndjson,
+	pobierz_zmiany,
+)
+
+
+def _autoryzowany(request):
+	oczekiwany = settings.CHANGE_FEED_TOKEN
+	naglowek = request.headers.get("Authorization", "")
+	if not naglowek.startswith("Bearer "):
+		return False
+	return hmac.compare_digest(naglowek[len("Bearer "):].encode(), oczekiwany.encode())
+
+
+@require_GET
+def zmiany_feed(request):
+	# bez skonfigurowanego tokena kanał jest wyłączony
+	if not settings.CHANGE_FEED_TOKEN:
+		raise Http404()
+	if not _autoryzowany(request):
+		return HttpResponse("Unauthorized", status=401)
+
+	try:
+		od = dekoduj_kursor(request.GET.get("kursor", ""))
+		limit = int(request.GET.get("limit", DOMYSLNY_LIMIT))
+	except (NieprawidlowyKursor, ValueError):
+		return HttpResponse("Nieprawidłowy kursor lub limit.", status=400)
+
+	try:
+		zmiany = pobierz_zmiany(od, limit)
+	except KursorPrzedawniony as e:
+		return HttpResponse(str(e), status=410)
+
+	return StreamingHttpResponse(
+		ndjson(zmiany),
+		content_type="application/x-ndjson; charset=utf-8",
+	)
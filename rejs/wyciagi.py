@@ -0,0 +1,408 @@
+"""
+Import wyciągów bankowych (CSV, MT940) i dopasowanie przelewów do zgłoszeń.
+
+Zgłoszenia są wczytywane raz, jednym zapytaniem z saldem, do słowników:
+numer zgłoszenia, fragment tokenu i nazwisko. Każda linia wyciągu to kilka
+odczytów z tych słowników zamiast zapytań do bazy. Przelew dopasowany
+jednoznacznie (numer lub token z tytułu, albo imię i nazwisko z kwotą równą
+zaliczce, reszcie lub cenie) staje się wpłatą - wszystkie jednym
+``bulk_create``. Pozostałe trafiają do kolejki "Do sprawdzenia" w panelu admina.
+"""
+
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from .mailers import build_simple_mail, send_mass_simple_mail
+from .models import PrzelewBankowy, Wplata, Zgloszenie
+from .zmiany import zapisz_zmiany
+
+# zgłoszenia rejsów zakończonych dawniej nie biorą udziału w dopasowaniu
+DNI_PO_REJSIE = 90
+
+_NUMER = re.compile(r"zgloszeni[ea]\s*(?:nr\.?\s*)?(\d+)")
+_TOKEN = re.compile(r"\b([0-9a-f]{8})(?:-[0-9a-f]{4}){0,4}")
+
+
+class BladWyciagu(ValueError):
+	pass
+
+
+@dataclass
+class Przelew:
+	id_transakcji: str
+	data: date
+	kwota: Decimal
+	tytul: str
+	nadawca: str
+
+
+def normalizuj(tekst):
+	"""Małe litery bez polskich znaków - "Łukasz Żak" -> "lukasz zak"."""
+	tekst = (tekst or "").lower().replace("ł", "l")
+	tekst = unicodedata.normalize("NFKD", tekst)
+	return "".join(z for z in tekst if not unicodedata.combining(z))
+
+
+def _kwota(tekst):
+	tekst = tekst.strip().replace("\xa0", "").replace(" ", "")
+	if "," in tekst:
+		tekst = tekst.replace(".", "").replace(",", ".")
+	try:
+		return Decimal(tekst)
+	except InvalidOperation:
+		raise BladWyciagu(f"Nieprawidłowa kwota: {tekst!r}")
+
+
+def _data(tekst):
+	for format in ("%Y-%m-%d", "%d.%m.%Y", "%d-%m-%Y", "%Y.%m.%d"):
+		try:
+			return datetime.strptime(tekst.strip(), format).date()
+		except ValueError:
+			pass
+	raise BladWyciagu(f"Nieprawidłowa data: {tekst!r}")
+
+
+def _identyfikatory(przelewy):
+	"""Brakujące identyfikatory: skrót treści plus numer powtórzenia w pliku."""
+	powtorzenia = Counter()
+	for p in przelewy:
+		if p.id_transakcji:
+			continue
+		tresc = f"{p.data}|{p.kwota}|{p.tytul}|{p.nadawca}"
+		powtorzenia[tresc] += 1
+		skrot = hashlib.sha256(f"{tresc}|{powtorzenia[tresc]}".encode()).hexdigest()
+		p.id_transakcji = f"sha-{skrot[:48]}"
+	return przelewy
+
+
+# ---------- CSV ----------
+
+KOLUMNY_CSV = {
+	"data": (
+		"data",
+		"data operacji",
+		"data ksiegowania",
+		"data transakcji",
+		"data waluty",
+	),
+	"kwota": ("kwota", "kwota operacji", "kwota transakcji"),
+	"tytul": ("tytul", "tytul operacji", "tytulem", "opis", "opis operacji"),
+	"nadawca": (
+		"nadawca",
+		"kontrahent",
+		"nazwa kontrahenta",
+		"zleceniodawca",
+		"dane kontrahenta",
+	),
+	"id_transakcji": (
+		"id",
+		"identyfikator",
+		"id transakcji",
+		"numer referencyjny",
+		"referencja",
+	),
+}
+
+
+def _dekoduj(dane):
+	if isinstance(dane, str):
+		return dane
+	try:
+		return dane.decode("utf-8-sig")
+	except UnicodeDecodeError:
+		# eksporty polskich banków bywają w Windows-1250
+		return dane.decode("cp1250")
+
+
+def czytaj_csv(dane):
+	"""Wpływy z wyciągu CSV z nagłówkiem (kolumny rozpoznawane po nazwie)."""
+	tekst = _dekoduj(dane)
+	try:
+		dialekt = csv.Sniffer().sniff(tekst.split("\n", 1)[0], delimiters=";,\t")
+	except csv.Error:
+		dialekt = csv.excel
+	wiersze = csv.reader(io.StringIO(tekst), dialekt)
+	naglowek = [normalizuj(n).strip() for n in next(wiersze, [])]
+	kolumny = {}
+	for pole, nazwy in KOLUMNY_CSV.items():
+		for nr, nazwa in enumerate(naglowek):
+			if nazwa in nazwy:
+				kolumny[pole] = nr
+				break
+	brakujace = {"data", "kwota", "tytul"} - kolumny.keys()
+	if brakujace:
+		raise BladWyciagu(f"Brak kolumn w wyciągu CSV: {', '.join(sorted(brakujace))}")
+
+	przelewy = []
+	for wiersz in wiersze:
+		if not any(wiersz):
+			continue
+
+		def pole(nazwa):
+			nr = kolumny.get(nazwa)
+			return wiersz[nr].strip() if nr is not None and nr < len(wiersz) else ""
+
+		kwota = _kwota(pole("kwota"))
+		if kwota <= 0:
+			continue
+		przelewy.append(
+			Przelew(
+				id_transakcji=pole("id_transakcji")[:64],
+				data=_data(pole("data")),
+				kwota=kwota,
+				tytul=pole("tytul"),
+				nadawca=pole("nadawca")[:255],
+			)
+		)
+	return _identyfikatory(przelewy)
+
+
+# ---------- MT940 ----------
+
+_MT940_61 = re.compile(
+	r"(?P<data>\d{6})(?:\d{4})?(?P<znak>R?[CD])[A-Z]?(?P<kwota>\d+,\d*)"
+	r"[NSF][A-Z0-9]{3}(?P<ref>[^/\n]*)(?://(?P<ref_banku>[^\n]*))?"
+)
+_MT940_POLE = re.compile(r"^:(\d{2}[A-Z]?):", re.MULTILINE)
+_MT940_PODPOLE = re.compile(r"[~^<](\d{2})")
+
+
+def _opis_86(tekst):
+	"""Tytuł i nadawca z pola :86:.
+
+	Podpola ~20-~25 i ~32-~33, jak w polskich bankach.
+	"""
+	tekst = tekst.replace("\r", "").replace("\n", "")
+	czesci = _MT940_PODPOLE.split(tekst)
+	if len(czesci) < 3:
+		return tekst.strip(), ""
+	podpola = defaultdict(str)
+	for kod, wartosc in zip(czesci[1::2], czesci[2::2]):
+		podpola[int(kod)] += wartosc
+	tytul = "".join(podpola[k] for k in range(20, 26)).strip()
+	nadawca = "".join(podpola[k] for k in (32, 33)).strip()
+	return tytul, nadawca
+
+
+def czytaj_mt940(dane):
+	"""Wpływy (uznania) z wyciągu MT940."""
+	tekst = _dekoduj(dane)
+	pola = _MT940_POLE.split(tekst)
+	przelewy = []
+	biezacy = None
+	for kod, wartosc in zip(pola[1::2], pola[2::2]):
+		if kod == "61":
+			biezacy = None
+			dopasowanie = _MT940_61.match(wartosc.strip())
+			if dopasowanie is None:
+				raise BladWyciagu(f"Nieprawidłowe pole :61: {wartosc.strip()!r}")
+			if dopasowanie["znak"] not in ("C", "RD"):
+				continue
+			ref = (dopasowanie["ref_banku"] or "").strip() or dopasowanie["ref"].strip()
+			if ref in ("", "NONREF"):
+				ref = ""
+			biezacy = Przelew(
+				id_transakcji=ref[:64],
+				data=datetime.strptime(dopasowanie["data"], "%y%m%d").date(),
+				kwota=_kwota(dopasowanie["kwota"]),
+				tytul="",
+				nadawca="",
+			)
+			przelewy.append(biezacy)
+		elif kod == "86" and biezacy is not None:
+			biezacy.tytul, nadawca = _opis_86(wartosc)
+			biezacy.nadawca = nadawca[:255]
+			biezacy = None
+	return _identyfikatory(przelewy)
+
+
+def czytaj_wyciag(dane, format=None):
+	"""Czyta wyciąg; bez ``format`` rozpoznaje MT940 po polach ``:20:``/``:61:``."""
+	if format is None:
+		poczatek = _dekoduj(dane[:2000])
+		format = "mt940" if re.search(r"^:(20|61):", poczatek, re.MULTILINE) else "csv"
+	if format == "mt940":
+		return czytaj_mt940(dane)
+	if format == "csv":
+		return czytaj_csv(dane)
+	raise BladWyciagu(f"Nieznany format wyciągu: {format}")
+
+
+# ---------- dopasowanie ----------
+
+class Indeks:
+	"""Słowniki do dopasowania przelewów, zbudowane jednym zapytaniem."""
+
+	def __init__(self, zgloszenia):
+		self.po_numerze = {}
+		self.po_tokenie = {}
+		self.po_nazwisku = defaultdict(list)
+		for zgl in zgloszenia:
+			self.po_numerze[zgl.pk] = zgl
+			self.po_tokenie[str(zgl.token)[:8]] = zgl
+			self.po_nazwisku[normalizuj(zgl.nazwisko)].append(zgl)
+
+	@classmethod
+	def z_bazy(cls):
+		granica = date.today() - timedelta(days=DNI_PO_REJSIE)
+		return cls(
+			Zgloszenie.objects
+			.z_saldem()
+			.filter(rejs__do__gte=granica, rejs__odwolany=False)
+			.exclude(status=Zgloszenie.STATUS_ODRZUCONE)
+			.select_related("rejs")
+		)
+
+	@staticmethod
+	def pasuje_kwota(zgl, kwota):
+		return kwota in (zgl.rejs.zaliczka, zgl.pozostalo, zgl.rejs.cena)
+
+	def _po_osobie(self, slowa):
+		return [
+			zgl
+			for slowo in slowa
+			for zgl in self.po_nazwisku.get(slowo, ())
+			if normalizuj(zgl.imie) in slowa
+		]
+
+	def dopasuj(self, przelew):
+		"""Zwraca (zgłoszenie albo None, lista id kandydatów)."""
+		tytul = normalizuj(przelew.tytul)
+		slowa = set(re.findall(r"[a-z0-9]+", f"{tytul} {normalizuj(przelew.nadawca)}"))
+		osoby = self._po_osobie(slowa)
+
+		for numer in _NUMER.findall(tytul):
+			zgl = self.po_numerze.get(int(numer))
+			# numer łatwo pomylić - wystarczy zgodna osoba albo kwota
+			if zgl and (zgl in osoby or self.pasuje_kwota(zgl, przelew.kwota)):
+				return zgl, []
+		for fragment in _TOKEN.findall(tytul):
+			if fragment in self.po_tokenie:
+				return self.po_tokenie[fragment], []
+
+		osoby = list(dict.fromkeys(osoby))
+		z_kwota = [zgl for zgl in osoby if self.pasuje_kwota(zgl, przelew.kwota)]
+		if len(z_kwota) == 1:
+			return z_kwota[0], []
+		kandydaci = z_kwota or osoby
+		for numer in _NUMER.findall(tytul):
+			if int(numer) in self.po_numerze:
+				kandydaci.append(self.po_numerze[int(numer)])
+		return None, list(dict.fromkeys(zgl.pk for zgl in kandydaci))
+
+
+def _utworz_wplaty(przelewy):
+	"""Wpłaty dla przelewów z przypisanym zgłoszeniem, jednym ``bulk_create``."""
+	wplaty = Wplata.objects.bulk_create(
+		[
+			Wplata(
+				zgloszenie_id=p.zgloszenie_id,
+				kwota=p.kwota,
+				rodzaj="wplata",
+				zrodlo_id=f"bank-{p.id_transakcji}",
+				opis=f"Przelew {p.data}: {p.tytul}"[:255],
+			)
+			for p in przelewy
+		]
+	)
+	for przelew, wplata in zip(przelewy, wplaty):
+		przelew.wplata = wplata
+		przelew.status = PrzelewBankowy.STATUS_ZAKSIEGOWANY
+	# bulk_create pomija sygnały - ręcznie do kanału zmian
+	zapisz_zmiany(Wplata, [w.pk for w in wplaty])
+	return wplaty
+
+
+def zaksieguj(przelewy, maile=True):
+	"""Księguje zapisane przelewy, którym przypisano zgłoszenie. Zwraca liczbę wpłat."""
+	przelewy = [p for p in przelewy if p.zgloszenie_id and p.wplata_id is None]
+	if not przelewy:
+		return 0
+	with transaction.atomic():
+		wplaty = _utworz_wplaty(przelewy)
+		PrzelewBankowy.objects.bulk_update(przelewy, ["wplata", "status"])
+	if maile:
+		_wyslij_potwierdzenia(wplaty)
+	return len(wplaty)
+
+
+def _wyslij_potwierdzenia(wplaty, partia=200):
+	"""Te same maile co sygnał wplata_post_save, jedną rundą przez jedno połączenie."""
+	wplaty = Wplata.objects.filter(pk__in=[w.pk for w in wplaty]).select_related(
+		"zgloszenie__rejs"
+	)
+	maile = []
+	for wplata in wplaty:
+		zgl = wplata.zgloszenie
+		link = settings.SITE_URL + reverse(
+			"zgloszenie_details", kwargs={"token": zgl.token}
+		)
+		maile.append(
+			build_simple_mail(
+				f"Zarejestrowaliśmy nową wpłatę {zgl.imie} {zgl.nazwisko}",
+				zgl.email,
+				"emails/wplata",
+				{"zgl": zgl, "wplata": wplata, "link": link},
+			)
+		)
+	for start in range(0, len(maile), partia):
+		send_mass_simple_mail(maile[start:start + partia])
+
+
+def importuj(przelewy, maile=True):
+	"""
+	Zapisuje przelewy z wyciągu, dopasowuje je i księguje jednoznaczne.
+
+	Przelewy już zaimportowane (ten sam ``id_transakcji``) są pomijane.
+	Zwraca Counter: zaksiegowane, do_sprawdzenia, pominiete (duplikaty).
+	"""
+	wynik = Counter()
+	znane = set()
+	ids = [p.id_transakcji for p in przelewy]
+	for start in range(0, len(ids), 500):
+		znane.update(
+			PrzelewBankowy.objects
+			.filter(id_transakcji__in=ids[start:start + 500])
+			.values_list("id_transakcji", flat=True)
+		)
+
+	indeks = Indeks.z_bazy()
+	nowe = []
+	for przelew in przelewy:
+		if przelew.id_transakcji in znane:
+			wynik["pominiete"] += 1
+			continue
+		znane.add(przelew.id_transakcji)
+		zgl, kandydaci = indeks.dopasuj(przelew)
+		nowe.append(
+			PrzelewBankowy(
+				id_transakcji=przelew.id_transakcji,
+				data=przelew.data,
+				kwota=przelew.kwota,
+				tytul=przelew.tytul,
+				nadawca=przelew.nadawca,
+				zgloszenie=zgl,
+				kandydaci=kandydaci,
+			)
+		)
+
+	with transaction.atomic():
+		# najpierw wpłaty - przelewy zapisujemy od razu z nimi, bez drugiego UPDATE
+		wplaty = _utworz_wplaty([p for p in nowe if p.zgloszenie_id])
+		PrzelewBankowy.objects.bulk_create(nowe, batch_size=500)
+	wynik["zaksiegowane"] = len(wplaty)
+	wynik["do_sprawdzenia"] = len(nowe) - len(wplaty)
+	if maile and wplaty:
+		_wyslij_potwierdzenia(wplaty)
+	return wynik
@@ -0,0 +1,245 @@
+"""
+Kanał zmian (change feed) dla systemów zewnętrznych.
+
+Zmiany w zgłoszeniach, wpłatach, płatnościach PayU i wachtach są zapisywane
+w tabeli ``Zmiana`` (sygnały w rejs/signals.py). Odbiorca przechowuje
+nieprzezroczysty kursor i przy kolejnej synchronizacji pobiera tylko wpisy
+nowsze od niego, jako NDJSON (jeden obiekt JSON w linii).
+
+Kursor to para (``Zmiana.transakcja``, ``Zmiana.id``). Odbiorca nie może
+dostać wpisu, przed którym w kolejności kursora zatwierdzi się jeszcze
+inny - ten inny byłby pominięty na zawsze. SQLite ma jednego piszącego
+naraz, więc ``transakcja`` jest tam zawsze 0 i wystarcza ``id``.
+PostgreSQL przydziela ``id`` przy INSERT, nie przy zatwierdzeniu, dlatego
+każdy wpis dostaje identyfikator swojej transakcji, a ``pobierz_zmiany``
+zwraca tylko wpisy transakcji starszych niż najstarsza wciąż otwarta
+(``pg_snapshot_xmin``). Wszystko, co zatwierdzi się później, ma większy
+identyfikator transakcji, więc trafi za kursor. Piszący na siebie nie
+czekają; wpisy długiej transakcji (i nowsze od niej) pojawiają się
+w kanale dopiero po jej zatwierdzeniu.
+
+Dziennik przycina komenda ``przytnij_zmiany`` (wpisy starsze niż okres
+przechowywania). Kursor sprzed przyciętych wpisów jest odrzucany
+(``KursorPrzedawniony``, HTTP 410) - odbiorca musi wtedy pobrać pełny stan
+i zacząć od pustego kursora.
+"""
+
+import json
+from datetime import timedelta
+from itertools import takewhile
+
+from django.core import serializers, signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PlatnoscPayU, Wachta, Wplata, Zgloszenie, Zmiana
+from .postgres import jest_postgres
+
+MODELE = {
+	"zgloszenie": Zgloszenie,
+	"wplata": Wplata,
+	"platnoscpayu": PlatnoscPayU,
+	"wachta": Wachta,
+}
+
+# pola pomijane w danych: zmieniane przez update() bez wpisu w dzienniku
+# i bez znaczenia dla odbiorców
+POMIJANE = {
+	"platnoscpayu": ("sprawdzona",),
+}
+
+DOMYSLNY_LIMIT = 1000
+MAKS_LIMIT = 10000
+
+_SALT = "rejs.zmiany.kursor"
+# kursor pustego odbiorcy: (transakcja, id)
+POCZATEK = (0, 0)
+
+
+class NieprawidlowyKursor(ValueError):
+	pass
+
+
+class KursorPrzedawniony(NieprawidlowyKursor):
+	"""Kursor wskazuje na wpisy usunięte już przez ``przytnij_zmiany``."""
+
+
+def nazwa_modelu(model):
+	return model._meta.model_name
+
+
+def zapisz_zmiany(model, ids, operacja=Zmiana.OPERACJA_ZAPIS):
+	"""Rejestruje zmiany wielu obiektów jednym INSERT-em.
+
+	Używają go sygnały, a ręcznie - miejsca, gdzie sygnały nie działają
+	(bulk_create, update()).
+	"""
+	nazwa = nazwa_modelu(model)
+	if nazwa not in MODELE:
+		return
+	zmiany = [Zmiana(model=nazwa, obiekt_id=pk, operacja=operacja) for pk in ids]
+	if not zmiany:
+		return
+	if not jest_postgres():
+		Zmiana.objects.bulk_create(zmiany)
+		return
+	# identyfikator transakcji i INSERT w tej samej transakcji
+	with transaction.atomic():
+		with connection.cursor() as kursor:
+			kursor.execute("SELECT pg_current_xact_id()::text::bigint")
+			transakcja = kursor.fetchone()[0]
+		for zmiana in zmiany:
+			zmiana.transakcja = transakcja
+		Zmiana.objects.bulk_create(zmiany)
+
+
+def _zakonczone():
+	"""
+	Filtr wpisów, których transakcje już się zakończyły, więc nic nie
+	zatwierdzi się przed nimi. Własna transakcja też się liczy - widzi swoje
+	wpisy (testy, zapis i odczyt w jednym żądaniu).
+	"""
+	if not jest_postgres():
+		return Q()
+	with connection.cursor() as kursor:
+		kursor.execute(
+			"SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, "
+			"pg_current_xact_id_if_assigned()::text::bigint"
+		)
+		horyzont, wlasna = kursor.fetchone()
+	filtr = Q(transakcja__lt=horyzont)
+	if wlasna is not None:
+		filtr |= Q(transakcja=wlasna)
+	return filtr
+
+
+def koduj_kursor(klucz):
+	return signing.dumps(list(klucz), salt=_SALT)
+
+
+def dekoduj_kursor(kursor):
+	"""Kursor jako para (transakcja, id); pusty to ``POCZATEK``."""
+	if not kursor:
+		return POCZATEK
+	try:
+		wartosc = signing.loads(kursor, salt=_SALT)
+	except signing.BadSignature as e:
+		raise NieprawidlowyKursor("Nieprawidłowy kursor.") from e
+	# kursory sprzed identyfikatorów transakcji to samo ``id``
+	if isinstance(wartosc, int):
+		wartosc = [0, wartosc]
+	if (
+		not isinstance(wartosc, list)
+		or len(wartosc) != 2
+		or not all(isinstance(v, int) and v >= 0 for v in wartosc)
+	):
+		raise NieprawidlowyKursor("Nieprawidłowy kursor.")
+	return tuple(wartosc)
+
+
+def _po(klucz):
+	transakcja, zmiana_id = klucz
+	return Q(transakcja__gt=transakcja) | Q(transakcja=transakcja, id__gt=zmiana_id)
+
+
+def pobierz_zmiany(od=POCZATEK, limit=DOMYSLNY_LIMIT):
+	"""
+	Zwraca generator słowników opisujących zmiany nowsze niż kursor ``od``.
+
+	Wiele zmian tego samego obiektu w obrębie strony jest łączonych w jedną
+	(ze stanem bieżącym). Ostatni element to zawsze
+	``{"kursor": ..., "wiecej": bool}`` - kursor do następnego wywołania.
+	"""
+	limit = max(1, min(limit, MAKS_LIMIT))
+	if od != POCZATEK:
+		najstarszy = (
+			Zmiana.objects
+			.order_by("transakcja", "id")
+			.values_list("transakcja", "id")
+			.first()
+		)
+		if najstarszy is not None and od < najstarszy:
+			raise KursorPrzedawniony(
+				"Kursor sprzed przyciętych zmian - pobierz pełny stan "
+				"i zacznij od pustego kursora."
+			)
+	wpisy = list(
+		Zmiana.objects
+		.filter(_zakonczone(), _po(od))
+		.order_by("transakcja", "id")
+		.values_list("transakcja", "id", "model", "obiekt_id", "operacja")[:limit + 1]
+	)
+	wiecej = len(wpisy) > limit
+	wpisy = wpisy[:limit]
+
+	ostatnie = {}
+	for transakcja, zmiana_id, model, obiekt_id, operacja in wpisy:
+		ostatnie.pop((model, obiekt_id), None)
+		ostatnie[(model, obiekt_id)] = ((transakcja, zmiana_id), operacja)
+
+	do_pobrania = {}
+	for (model, obiekt_id), (_, operacja) in ostatnie.items():
+		if operacja == Zmiana.OPERACJA_ZAPIS and model in MODELE:
+			do_pobrania.setdefault(model, []).append(obiekt_id)
+
+	obiekty = {
+		model: MODELE[model].objects.in_bulk(ids)
+		for model, ids in do_pobrania.items()
+	}
+
+	def generator():
+		for (model, obiekt_id), (klucz, operacja) in ostatnie.items():
+			wpis = {
+				"kursor": koduj_kursor(klucz),
+				"model": model,
+				"id": obiekt_id,
+				"operacja": operacja,
+			}
+			if operacja == Zmiana.OPERACJA_ZAPIS:
+				obiekt = obiekty.get(model, {}).get(obiekt_id)
+				if obiekt is None:
+					# usunięty później - wpis o usunięciu przyjdzie dalej
+					continue
+				dane = serializers.serialize("python", [obiekt])[0]["fields"]
+				for pole in POMIJANE.get(model, ()):
+					dane.pop(pole, None)
+				wpis["dane"] = dane
+			yield wpis
+
+		ostatni = wpisy[-1][:2] if wpisy else od
+		yield {"kursor": koduj_kursor(ostatni), "wiecej": wiecej}
+
+	return generator()
+
+
+def przytnij(dni=90, partia=10000):
+	"""
+	Usuwa wpisy starsze niż ``dni`` dni. Zwraca liczbę usuniętych.
+
+	Usuwa tylko ciągły początek dziennika (w kolejności kursora) i zostawia
+	ostatni ze starych wpisów - po najstarszym zachowanym ``pobierz_zmiany``
+	poznaje przedawnione kursory. Partiami, każda w osobnej krótkiej
+	transakcji.
+	"""
+	granica = timezone.now() - timedelta(days=dni)
+	zakonczone = Zmiana.objects.filter(_zakonczone()).order_by("transakcja", "id")
+	usuniete = 0
+	while True:
+		wpisy = list(zakonczone.values_list("id", "data")[:partia + 1])
+		# do pierwszego nowszego wpisu - bez dziur w środku dziennika
+		stare = [
+			zmiana_id for zmiana_id, _ in takewhile(lambda w: w[1] < granica, wpisy)
+		]
+		if len(stare) < 2:
+			break
+		usuniete += Zmiana.objects.filter(id__in=stare[:-1]).delete()[0]
+		if len(stare) < len(wpisy):
+			break
+	return usuniete
+
+
+def ndjson(wpisy):
+	for wpis in wpisy:
+		yield json.dumps(wpis, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
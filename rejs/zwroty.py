@@ -0,0 +1,202 @@
+"""
+Zwroty PayU po odwołaniu rejsu.
+
+``odwolaj_rejs`` zamyka rekrutację i zakłada ``ZwrotPayU`` dla każdej
+zakończonej płatności PayU rejsu. Komenda ``zwroty_payu`` zleca je w PayU
+równolegle (ograniczona pula wątków i tempo), a wyniki zapisuje w wątku
+głównym: wpłaty typu "zwrot" jednym ``bulk_create`` na partię, potem jedna
+runda maili przez jedno połączenie SMTP. Stan każdego zwrotu jest w bazie,
+więc przerwaną komendę wystarczy uruchomić ponownie.
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from .mailers import build_simple_mail, send_mass_simple_mail
+from .models import PlatnoscPayU, Rejs, Wplata, ZwrotPayU
+from .payu import PayUClient
+from .platnosci import Tempo
+from .zmiany import zapisz_zmiany
+
+logger = logging.getLogger(__name__)
+
+MAKS_PROB = 3
+
+
+def odwolaj_rejs(rejs):
+	"""Oznacza rejs jako odwołany i zakłada zwroty. Zwraca liczbę nowych zwrotów."""
+	with transaction.atomic():
+		# UPDATE blokuje wiersz rejsu do końca transakcji - równoległe odwołanie
+		# czeka i widzi już założone zwroty, więc konfliktów nie ma
+		Rejs.objects.filter(pk=rejs.pk).update(odwolany=True, aktywna_rekrutacja=False)
+		platnosci = PlatnoscPayU.objects.filter(
+			zgloszenie__rejs=rejs,
+			status=PlatnoscPayU.STATUS_COMPLETED,
+			zwrot__isnull=True,
+		).values_list("pk", flat=True)
+		nowe = ZwrotPayU.objects.bulk_create(
+			[ZwrotPayU(platnosc_id=pk) for pk in platnosci]
+		)
+	return len(nowe)
+
+
+def _zlec(client, tempo, zwrot):
+	"""Zleca zwrot w PayU (wątek puli). Zwraca refundId."""
+	platnosc = zwrot.platnosc
+	if zwrot.status != ZwrotPayU.STATUS_OCZEKUJE:
+		# poprzednie uruchomienie mogło zlecić zwrot i przerwać się przed zapisem,
+		# a PayU mogło przyjąć zwrot, na który nie doczekaliśmy się odpowiedzi
+		tempo.czekaj()
+		for refund in client.get_refunds(platnosc.payu_order_id).get("refunds", []):
+			if refund.get("extRefundId") == zwrot.ext_refund_id:
+				return refund["refundId"]
+	tempo.czekaj()
+	wynik = client.refund(
+		platnosc.payu_order_id,
+		kwota=platnosc.kwota,
+		opis=f"Zwrot – odwołany rejs {platnosc.zgloszenie.rejs.nazwa}",
+		ext_refund_id=zwrot.ext_refund_id,
+	)
+	return wynik["refund"]["refundId"]
+
+
+def _partia_do_zlecenia(rejs, rozmiar, pominiete):
+	zwroty = (
+		ZwrotPayU.objects
+		.filter(
+			status__in=[
+				ZwrotPayU.STATUS_OCZEKUJE,
+				ZwrotPayU.STATUS_ZLECANY,
+				ZwrotPayU.STATUS_BLAD,
+			]
+		)
+		.exclude(status=ZwrotPayU.STATUS_BLAD, proby__gte=MAKS_PROB)
+		.exclude(pk__in=pominiete)
+		.select_related("platnosc__zgloszenie__rejs")
+		.order_by("id")
+	)
+	if rejs is not None:
+		zwroty = zwroty.filter(platnosc__zgloszenie__rejs=rejs)
+	return list(zwroty[:rozmiar])
+
+
+def zlec_zwroty(rejs=None, watki=4, na_sekunde=5, partia=100):
+	"""
+	Zleca w PayU oczekujące zwroty i księguje je jako wpłaty "zwrot".
+
+	Zwraca Counter z liczbą zleconych zwrotów i błędów.
+	"""
+	client = PayUClient()
+	tempo = Tempo(na_sekunde)
+	wynik = Counter()
+	pominiete = set()
+
+	with ThreadPoolExecutor(max_workers=watki) as pula:
+		while True:
+			zwroty = _partia_do_zlecenia(rejs, partia, pominiete)
+			if not zwroty:
+				break
+
+			# najpierw zapis, że zlecamy - przy przerwaniu wiadomo,
+			# które sprawdzić w PayU
+			ZwrotPayU.objects.filter(pk__in=[z.pk for z in zwroty]).update(
+				status=ZwrotPayU.STATUS_ZLECANY
+			)
+
+			zadania = {pula.submit(_zlec, client, tempo, z): z for z in zwroty}
+			zlecone = []
+			bledne = []
+			for zadanie in as_completed(zadania):
+				zwrot = zadania[zadanie]
+				try:
+					zwrot.refund_id = zadanie.result()
+				except (requests.RequestException, KeyError, ValueError) as e:
+					zwrot.status = ZwrotPayU.STATUS_BLAD
+					zwrot.proby += 1
+					zwrot.blad = f"{type(e).__name__}: {e}"
+					bledne.append(zwrot)
+					# w tym uruchomieniu już go nie ponawiamy
+					pominiete.add(zwrot.pk)
+					logger.warning(
+						"Zwrot płatności PayU %s nieudany: %s",
+						zwrot.platnosc.payu_order_id,
+						zwrot.blad,
+					)
+				else:
+					zwrot.status = ZwrotPayU.STATUS_ZLECONY
+					zwrot.blad = ""
+					zlecone.append(zwrot)
+
+			_zapisz_partie(zlecone, bledne)
+			wynik["zlecone"] += len(zlecone)
+			wynik["bledy"] += len(bledne)
+	return wynik
+
+
+def _zapisz_partie(zlecone, bledne):
+	with transaction.atomic():
+		wplaty = Wplata.objects.bulk_create(
+			[
+				Wplata(
+					zgloszenie=z.platnosc.zgloszenie,
+					kwota=z.platnosc.kwota,
+					rodzaj="zwrot",
+					zrodlo_id=z.refund_id,
+					opis="Zwrot PayU – odwołany rejs",
+				)
+				for z in zlecone
+			]
+		)
+		for zwrot, wplata in zip(zlecone, wplaty):
+			zwrot.wplata = wplata
+		ZwrotPayU.objects.bulk_update(
+			zlecone + bledne, ["status", "refund_id", "wplata", "proby", "blad"]
+		)
+		# bulk_create pomija sygnały - ręcznie do kanału zmian
+		zapisz_zmiany(Wplata, [w.pk for w in wplaty])
+
+
+def wyslij_powiadomienia(rozmiar=200):
+	"""
+	Wysyła maile o zwrocie do osób, które ich jeszcze nie dostały.
+
+	Jedna runda na partię, przez jedno połączenie SMTP. Zwraca liczbę maili.
+	"""
+	wyslane = 0
+	while True:
+		zwroty = list(
+			ZwrotPayU.objects
+			.filter(
+				status=ZwrotPayU.STATUS_ZLECONY,
+				powiadomiony=False,
+				wplata__isnull=False,
+			)
+			.select_related("wplata__zgloszenie")
+			.order_by("id")[:rozmiar]
+		)
+		if not zwroty:
+			return wyslane
+		maile = []
+		for zwrot in zwroty:
+			zgl = zwrot.wplata.zgloszenie
+			link = settings.SITE_URL + reverse(
+				"zgloszenie_details", kwargs={"token": zgl.token}
+			)
+			maile.append(
+				build_simple_mail(
+					f"Zwrot wpłaconych środków {zgl.imie} {zgl.nazwisko}",
+					zgl.email,
+					"emails/wplata_zwrot",
+					{"zgl": zgl, "wplata": zwrot.wplata, "link": link},
+				)
+			)
+		wyslane += send_mass_simple_mail(maile)
+		ZwrotPayU.objects.filter(pk__in=[z.pk for z in zwroty]).update(
+			powiadomiony=True
+		)